@@ -19,13 +19,25 @@ except Exception as e:
     run_pipeline = None
     print(f"Pipeline import error: {e}")
 
+try:
+    from pipeline.providers.embeddings.embedder_factory import embedder_stats
+except Exception as e:
+    embedder_stats = None
+    print(f"Embedder stats import error: {e}")
+
+try:
+    from pipeline.utils.request_context import RequestContext
+except Exception as e:
+    RequestContext = None
+    print(f"Request context import error: {e}")
+
 try:
     from scripts.restore_sqlite_from_drive import restore_sqlite_if_missing
 except Exception as e:
     restore_sqlite_if_missing = None
     print(f"Restore import error: {e}")
 
-# ── Session manager (Supabase) ───────────────────────────────────────────────
+# ── Session manager (Supabase / SQLite) ─────────────────────────────────────
 try:
     from session_manager import (
         get_or_create_session,
@@ -35,6 +47,12 @@ try:
         save_to_cache,
         get_all_recent_activity,
         get_all_frequent_docs,
+        flush_pending_writes,
+        count_doc_sources,
+        writes,
+        store,
+        cache_sweeper,
+        cache_stats,
     )
     SESSION_ENABLED = True
     print("Session manager loaded successfully")
@@ -73,6 +91,8 @@ def startup_event():
         return
     try:
         print("STARTUP INIT BEGIN")
+        if SESSION_ENABLED:
+            cache_sweeper.start()
         if restore_sqlite_if_missing:
             restore_sqlite_if_missing()
             print("SQLite restored successfully")
@@ -82,6 +102,14 @@ def startup_event():
         print(f"STARTUP ERROR: {str(e)}")
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    # queued session / message / cache writes go out before exit
+    if SESSION_ENABLED:
+        cache_sweeper.stop()
+        flush_pending_writes()
+
+
 @app.get("/")
 def root():
     return {"status": "Backend running"}
@@ -92,6 +120,21 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/cache_stats")
+def get_cache_stats():
+    if not SESSION_ENABLED:
+        return {"error": "Session storage not configured"}
+    return cache_stats()
+
+
+@app.get("/metrics")
+def get_metrics():
+    # process-wide counters; per-request pipeline metrics are reset on each /chat
+    if embedder_stats is None:
+        return {"error": "Embedder not available"}
+    return {"embedder": embedder_stats()}
+
+
 # ==================================================
 # MODELS
 # ==================================================
@@ -141,6 +184,10 @@ def chat(request: QueryRequest):
         query_raw  = request.query.strip()
         session_id = request.session_id or "anonymous"
 
+        # one embedding of the query shared by cache lookup,
+        # retrieval and cache save
+        context = RequestContext(query_raw) if RequestContext else None
+
         if SESSION_ENABLED:
             try:
                 get_or_create_session(session_id)
@@ -150,7 +197,7 @@ def chat(request: QueryRequest):
         # Cache lookup
         if SESSION_ENABLED:
             try:
-                cached = check_cache(session_id, query_raw)
+                cached = check_cache(session_id, query_raw, context)
                 if cached and cached.get("answer"):
                     print(f"Cache hit for session={session_id} query='{query_raw[:60]}'")
                     sources = cached.get("sources", [])
@@ -180,7 +227,7 @@ def chat(request: QueryRequest):
                 "session_id": session_id,
             }
 
-        result  = run_pipeline(query_raw)
+        result  = run_pipeline(query_raw, context=context)
         answer  = None
         sources = []
 
@@ -214,11 +261,14 @@ def chat(request: QueryRequest):
 
             if SESSION_ENABLED and final_answer != "No response generated.":
                 try:
-                    save_to_cache(session_id, query_raw, final_answer, sources)
+                    save_to_cache(session_id, query_raw, final_answer, sources, context)
                     save_message(session_id, query_raw, final_answer, sources)
                 except Exception as e:
                     print(f"Post-pipeline save warning: {e}")
 
+            if context is not None:
+                print(f"Request {context.request_id}: {context.embed_calls} query embedding call(s)")
+
             return {
                 "response":   final_answer,
                 "sources":    sources,
@@ -276,17 +326,16 @@ def track_click(payload: ClickPayload):
 
     if SESSION_ENABLED:
         try:
-            from session_manager import supabase
             from datetime import datetime
-            supabase.table("doc_clicks").insert({
+            writes.insert("doc_clicks", {
                 "session_id": payload.session_id,
                 "file_id":    payload.file_id,
                 "file_name":  payload.file_name,
                 "url":        payload.url,
                 "clicked_at": datetime.utcnow().isoformat(),
-            }).execute()
+            })
         except Exception as e:
-            print(f"[track_click] Supabase insert warning: {e}")
+            print(f"[track_click] insert warning: {e}")
 
     print(f"[track_click] session={payload.session_id} file={payload.file_name}")
     return {"status": "tracked"}
@@ -304,23 +353,26 @@ def track_document(payload: TrackDocumentPayload):
 
     if SESSION_ENABLED:
         try:
-            from session_manager import supabase
             from datetime import datetime
 
             now = datetime.utcnow()
 
-            supabase.table("messages").insert({
+            sources = [{"name": payload.file_name, "url": payload.file_url}]
+
+            store.insert("messages", [{
                 "session_id": payload.session_id,
                 "query":      f"[document access] {payload.file_name}",
                 "answer":     "",
-                "sources":    [{"name": payload.file_name, "url": payload.file_url}],
+                "sources":    sources,
                 "timestamp":  now.isoformat(),
                 "date_key":   now.strftime("%Y-%m-%d"),
                 "query_hash": f"doc_access_{payload.file_name}_{now.timestamp()}",
-            }).execute()
+            }])
+
+            count_doc_sources(payload.session_id, sources)
 
         except Exception as e:
-            print(f"[track-document] Supabase insert error: {e}")
+            print(f"[track-document] insert error: {e}")
             return {"status": "error", "detail": str(e)}
 
     print(f"[track-document] session={payload.session_id} file={payload.file_name}")
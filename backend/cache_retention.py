@@ -0,0 +1,326 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+
+# ==============================
+# Answer cache retention
+#
+# A background sweep decides which entries go, in this order:
+#
+#   ttl          saved_at older than CACHE_TTL_SECONDS
+#   session_cap  more than CACHE_MAX_ENTRIES_PER_SESSION in a session
+#   bytes        whole table over CACHE_MAX_BYTES
+#
+# Within a session / the table, the least frequently hit entries go
+# first (hit_count), oldest saved_at breaking ties. Rows are deleted
+# from the store and then from the in-memory semantic index.
+#
+# The sweep starts from per-session totals aggregated in the store
+# (store.cache_usage()) and only reads the rows of sessions that are
+# over the cap or hold expired / unstamped entries; the table is
+# paged in LFU order only while it is over the byte budget. A store
+# that cannot aggregate (cache_usage() not deployed on Supabase)
+# gets the same totals from the whole table, page by page.
+#
+# saved_at is parsed, never compared as a string. Rows without one
+# predate retention: the sweep stamps them with the sweep time, so
+# they get a full TTL from then instead of being evicted unseen.
+# ==============================
+
+CACHE_MAX_ENTRIES_PER_SESSION = int(os.getenv("CACHE_MAX_ENTRIES_PER_SESSION", "200"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_SWEEP_INTERVAL = int(os.getenv("CACHE_SWEEP_INTERVAL", "300"))
+
+# query_embedding is not fetched by the sweep; bge-small float32
+EMBEDDING_BYTES = 384 * 4
+
+_META_COLUMNS = ("session_id", "query_hash", "query", "answer", "sources", "hit_count", "saved_at")
+
+
+def entry_bytes(row: dict) -> int:
+    sources = row.get("sources")
+    if not isinstance(sources, str):
+        sources = json.dumps(sources or [])
+    return (
+        len((row.get("query") or "").encode("utf-8"))
+        + len((row.get("answer") or "").encode("utf-8"))
+        + len(sources.encode("utf-8"))
+        + EMBEDDING_BYTES
+    )
+
+
+def parse_saved_at(value) -> Optional[datetime]:
+    """saved_at (ISO string, 'Z' suffix, offset or naive UTC) → naive UTC datetime."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def usage_from_rows(rows) -> List[dict]:
+    """Client-side store.cache_usage(): per-session totals of cache rows."""
+    usage: Dict[str, dict] = {}
+    for row in rows:
+        u = usage.setdefault(row["session_id"], {
+            "session_id": row["session_id"],
+            "entries": 0,
+            "bytes": 0,
+            "oldest_saved_at": None,
+            "missing_saved_at": 0,
+        })
+        u["entries"] += 1
+        u["bytes"] += entry_bytes(row) - EMBEDDING_BYTES
+
+        saved_at = parse_saved_at(row.get("saved_at"))
+        if saved_at is None:
+            u["missing_saved_at"] += 1
+        elif u["oldest_saved_at"] is None or saved_at < u["oldest_saved_at"]:
+            u["oldest_saved_at"] = saved_at
+
+    for u in usage.values():
+        if u["oldest_saved_at"] is not None:
+            u["oldest_saved_at"] = u["oldest_saved_at"].isoformat()
+    return list(usage.values())
+
+
+def _lfu_order(row: dict):
+    return (row.get("hit_count") or 0, parse_saved_at(row.get("saved_at")) or datetime.min)
+
+
+class RetentionPolicy:
+
+    def __init__(
+        self,
+        max_entries_per_session: int = CACHE_MAX_ENTRIES_PER_SESSION,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl_seconds: int = CACHE_TTL_SECONDS,
+    ):
+        self.max_entries_per_session = max_entries_per_session
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    def cutoff(self, now: datetime) -> Optional[datetime]:
+        return now - timedelta(seconds=self.ttl_seconds) if self.ttl_seconds > 0 else None
+
+    def needs_session_scan(self, usage: dict, now: datetime) -> bool:
+        """From a session's cache_usage() totals: anything to evict or stamp there?"""
+        cutoff = self.cutoff(now)
+        oldest = parse_saved_at(usage.get("oldest_saved_at"))
+        return bool(
+            (self.max_entries_per_session > 0 and (usage.get("entries") or 0) > self.max_entries_per_session)
+            or (cutoff is not None and oldest is not None and oldest < cutoff)
+            or usage.get("missing_saved_at")
+        )
+
+    def plan_session(self, rows: List[dict], now: datetime) -> Dict[str, List[dict]]:
+        """Rows of one session to evict, by reason (ttl, session_cap)."""
+
+        cutoff = self.cutoff(now)
+        evict = {"ttl": [], "session_cap": []}
+
+        kept = []
+        for row in rows:
+            saved_at = parse_saved_at(row.get("saved_at"))
+            if cutoff is not None and saved_at is not None and saved_at < cutoff:
+                evict["ttl"].append(row)
+            else:
+                kept.append(row)
+
+        over = len(kept) - self.max_entries_per_session
+        if self.max_entries_per_session > 0 and over > 0:
+            kept.sort(key=_lfu_order)
+            evict["session_cap"].extend(kept[:over])
+
+        return evict
+
+
+class CacheSweeper:
+    """
+    Runs RetentionPolicy over the store every `interval` seconds.
+    `on_evict(session_id, query_hashes)` keeps in-process state
+    (the semantic index) in step with the deletes.
+    """
+
+    # rows per page while evicting for the byte budget
+    PAGE_SIZE = 500
+
+    def __init__(
+        self,
+        store,
+        on_evict: Callable[[str, List[str]], None],
+        policy: Optional[RetentionPolicy] = None,
+        interval: int = CACHE_SWEEP_INTERVAL,
+    ):
+        self.store = store
+        self.on_evict = on_evict
+        self.policy = policy or RetentionPolicy()
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sweep_lock = threading.Lock()
+
+        self.stats = {
+            "sweeps": 0,
+            "evicted_ttl": 0,
+            "evicted_session_cap": 0,
+            "evicted_bytes": 0,
+            "stamped_saved_at": 0,
+            "bytes_freed": 0,
+            "entries": 0,
+            "bytes": 0,
+            "sessions_scanned": 0,
+            "last_sweep_ms": 0.0,
+        }
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(
+                target=self._run,
+                name="cache-sweeper",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[cache-sweeper] sweep failed: {e}")
+
+    def _scan_session(self, session_id: str, usage: dict, now: datetime) -> Dict[str, List[dict]]:
+        rows = self.store.select("cache", {"session_id": session_id}, columns=_META_COLUMNS)
+
+        if usage.get("missing_saved_at"):
+            stamp = now.isoformat()
+            self.store.update("cache", {"session_id": session_id, "saved_at": None}, {"saved_at": stamp})
+            for row in rows:
+                if not row.get("saved_at"):
+                    row["saved_at"] = stamp
+                    self.stats["stamped_saved_at"] += 1
+
+        return self.policy.plan_session(rows, now)
+
+    def _usage(self) -> List[dict]:
+        usage = self.store.cache_usage()
+        if usage is not None:
+            return usage
+
+        def pages():
+            offset = 0
+            while True:
+                page = self.store.select(
+                    "cache",
+                    columns=_META_COLUMNS,
+                    order=("session_id", "query_hash"),
+                    limit=self.PAGE_SIZE,
+                    offset=offset,
+                )
+                yield from page
+                if len(page) < self.PAGE_SIZE:
+                    return
+                offset += len(page)
+
+        return usage_from_rows(pages())
+
+    def _over_budget(self, total: int, evicted: set) -> List[dict]:
+        """Least frequently hit rows, page by page, until the table fits the byte budget."""
+
+        rows = []
+        offset = 0
+
+        while total > self.policy.max_bytes:
+            page = self.store.select(
+                "cache",
+                columns=_META_COLUMNS,
+                order=("hit_count", "saved_at"),
+                limit=self.PAGE_SIZE,
+                offset=offset,
+            )
+            if not page:
+                break
+            offset += len(page)
+
+            for row in page:
+                if total <= self.policy.max_bytes:
+                    break
+                if (row["session_id"], row["query_hash"]) in evicted:
+                    continue
+                rows.append(row)
+                total -= entry_bytes(row)
+
+        return rows
+
+    def sweep(self) -> Dict[str, int]:
+        with self._sweep_lock:
+            start = time.perf_counter()
+            now = datetime.utcnow()
+
+            usage = self._usage()
+
+            entries = sum(u.get("entries") or 0 for u in usage)
+            total = sum((u.get("bytes") or 0) + (u.get("entries") or 0) * EMBEDDING_BYTES for u in usage)
+
+            plan = {"ttl": [], "session_cap": [], "bytes": []}
+            scanned = 0
+
+            for u in usage:
+                if self.policy.needs_session_scan(u, now):
+                    scanned += 1
+                    for reason, rows in self._scan_session(u["session_id"], u, now).items():
+                        plan[reason].extend(rows)
+
+            evicted = {(row["session_id"], row["query_hash"]) for rows in plan.values() for row in rows}
+            freed = sum(entry_bytes(row) for rows in plan.values() for row in rows)
+
+            if self.policy.max_bytes > 0 and total - freed > self.policy.max_bytes:
+                plan["bytes"] = self._over_budget(total - freed, evicted)
+                freed += sum(entry_bytes(row) for row in plan["bytes"])
+
+            by_session: Dict[str, List[str]] = {}
+            for reason_rows in plan.values():
+                for row in reason_rows:
+                    by_session.setdefault(row["session_id"], []).append(row["query_hash"])
+
+            for session_id, hashes in by_session.items():
+                self.store.delete("cache", {"session_id": session_id}, "query_hash", hashes)
+                self.on_evict(session_id, hashes)
+
+            counts = {reason: len(reason_rows) for reason, reason_rows in plan.items()}
+            evicted_n = sum(counts.values())
+
+            self.stats["sweeps"] += 1
+            for reason, n in counts.items():
+                self.stats[f"evicted_{reason}"] += n
+            self.stats["bytes_freed"] += freed
+            self.stats["entries"] = entries - evicted_n
+            self.stats["bytes"] = total - freed
+            self.stats["sessions_scanned"] = scanned
+            self.stats["last_sweep_ms"] = (time.perf_counter() - start) * 1000
+
+            if evicted_n:
+                print(
+                    f"[cache-sweeper] evicted {evicted_n} "
+                    f"(ttl={counts['ttl']} session_cap={counts['session_cap']} bytes={counts['bytes']}) "
+                    f"| freed {freed / 1024:.1f} KB | {self.stats['entries']} entries left "
+                    f"| {self.stats['last_sweep_ms']:.0f} ms"
+                )
+
+            return counts
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ==============================
+# In-process semantic cache index
+#
+# One index per session: cached query embeddings as an
+# L2-normalized float32 matrix, so a lookup is one matmul.
+# Supabase stays the durable store; an index is loaded from
+# it on first access and kept current by write-through.
+#
+# Other API workers add and evict entries of the same session
+# in the store, so a loaded index is reloaded once it is older
+# than SEMANTIC_CACHE_REFRESH_SECONDS (0 = never). Entries this
+# worker added since the last load and the store does not have
+# yet (still in the write-behind queue) survive one reload.
+# ==============================
+
+SEMANTIC_CACHE_MAX_SESSIONS = int(os.getenv("SEMANTIC_CACHE_MAX_SESSIONS", "1000"))
+SEMANTIC_CACHE_REFRESH_SECONDS = float(os.getenv("SEMANTIC_CACHE_REFRESH_SECONDS", "60"))
+
+
+def _unit(vec: np.ndarray) -> Optional[np.ndarray]:
+    vec = np.asarray(vec, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    if vec.size == 0 or norm == 0:
+        return None
+    return vec / norm
+
+
+class SessionIndex:
+    """Cached entries of one session, keyed by query_hash."""
+
+    def __init__(self):
+        self.entries: Dict[str, dict] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+
+        # (dim, hashes, matrix) rebuilt lazily after a change
+        self._matrix: Optional[Tuple[int, List[str], np.ndarray]] = None
+
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.refreshing = False
+
+        # added by this worker since the last load
+        self._added = set()
+
+    def add(self, entry: dict, embedding: Optional[np.ndarray]):
+        query_hash = entry["query_hash"]
+        vector = _unit(embedding) if embedding is not None else None
+
+        with self.lock:
+            self.entries[query_hash] = entry
+            if self.loaded:
+                self._added.add(query_hash)
+
+            if vector is not None:
+                self._vectors[query_hash] = vector
+            else:
+                self._vectors.pop(query_hash, None)
+
+            self._matrix = None
+
+    def remove(self, query_hash: str):
+        with self.lock:
+            self.entries.pop(query_hash, None)
+            self._added.discard(query_hash)
+            if self._vectors.pop(query_hash, None) is not None:
+                self._matrix = None
+
+    def load(self, rows: List[Tuple[dict, Optional[np.ndarray]]]):
+        """Replace the contents with the store's rows."""
+        with self.lock:
+            carried = [
+                (self.entries[h], self._vectors.get(h))
+                for h in self._added if h in self.entries
+            ]
+
+            self.entries = {}
+            self._vectors = {}
+            self._matrix = None
+            self._added = set()
+            self.loaded = False
+
+            for entry, embedding in rows:
+                self.add(entry, embedding)
+
+            for entry, vector in carried:
+                if entry["query_hash"] not in self.entries:
+                    self.entries[entry["query_hash"]] = entry
+                    if vector is not None:
+                        self._vectors[entry["query_hash"]] = vector
+
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+
+    def begin_refresh(self, max_age: float) -> bool:
+        """True for the one caller that should reload a stale index."""
+        with self.lock:
+            if self.refreshing or time.monotonic() - self.loaded_at < max_age:
+                return False
+            self.refreshing = True
+            return True
+
+    def _matrix_for(self, dim: int) -> Tuple[List[str], Optional[np.ndarray]]:
+        if self._matrix is None or self._matrix[0] != dim:
+            # rows from another embedder (fallback vectors) never compare
+            hashes = [h for h, v in self._vectors.items() if v.shape[0] == dim]
+            matrix = (
+                np.stack([self._vectors[h] for h in hashes])
+                if hashes else None
+            )
+            self._matrix = (dim, hashes, matrix)
+        return self._matrix[1], self._matrix[2]
+
+    def nearest(self, embedding: np.ndarray) -> Tuple[Optional[dict], float]:
+        query = _unit(embedding)
+        if query is None:
+            return None, 0.0
+
+        with self.lock:
+            hashes, matrix = self._matrix_for(query.shape[0])
+            if matrix is None:
+                return None, 0.0
+
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            return self.entries.get(hashes[best]), float(scores[best])
+
+
+class SemanticCacheIndex:
+    """
+    LRU of SessionIndex objects, bounded by max_sessions.
+    `loader(session_id)` returns (entry, embedding) pairs from the
+    durable store and is called when a session is first needed
+    (or again after being evicted), and every refresh_seconds after.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], List[Tuple[dict, Optional[np.ndarray]]]],
+        max_sessions: int = SEMANTIC_CACHE_MAX_SESSIONS,
+        refresh_seconds: float = SEMANTIC_CACHE_REFRESH_SECONDS,
+    ):
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.refresh_seconds = refresh_seconds
+
+        self._sessions: "OrderedDict[str, SessionIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> SessionIndex:
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                index = SessionIndex()
+                self._sessions[session_id] = index
+            self._sessions.move_to_end(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        return index
+
+    def session(self, session_id: str) -> SessionIndex:
+        """Index for a session, loaded from the store on first use."""
+        index = self._get(session_id)
+
+        if not index.loaded:
+            with index.lock:
+                if not index.loaded:
+                    index.load(self.loader(session_id))
+
+        elif self.refresh_seconds > 0 and index.begin_refresh(self.refresh_seconds):
+            # the stale index keeps serving other requests meanwhile
+            try:
+                index.load(self.loader(session_id))
+            except Exception as e:
+                print(f"[semantic-cache] refresh of {session_id} failed: {e}")
+                # keep the loaded copy for another interval
+                index.loaded_at = time.monotonic()
+            finally:
+                index.refreshing = False
+
+        return index
+
+    def remove(self, session_id: str, query_hashes: List[str]):
+        """Drop evicted entries; sessions not in memory reload without them."""
+        with self._lock:
+            index = self._sessions.get(session_id)
+        if index is not None:
+            for query_hash in query_hashes:
+                index.remove(query_hash)
+
+    def invalidate(self, session_id: Optional[str] = None):
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "entries": sum(len(i.entries) for i in self._sessions.values()),
+            }
@@ -1,24 +1,34 @@
 import os
 import hashlib
-import math
 import json
+import time
 from datetime import datetime
+from collections import OrderedDict
+from threading import Lock
 from typing import Optional
 
-from supabase import create_client, Client
+import numpy as np
+
+from cache_retention import CacheSweeper
+from semantic_cache import SemanticCacheIndex
+from session_store import SessionStore, create_session_store
+from write_behind import WriteBehindQueue
 
 
 # ==============================
-# Supabase Init
+# Storage Init
 # ==============================
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# SESSION_STORE=supabase (default) or sqlite, see session_store.py
+store: SessionStore = create_session_store()
+
+# bookkeeping writes off the /chat response path
+writes = WriteBehindQueue(store)
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Supabase credentials not set")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def flush_pending_writes(timeout: float = 10.0):
+    """Called on API shutdown so queued writes are not lost."""
+    writes.drain(timeout)
 
 
 # ==============================
@@ -38,68 +48,85 @@ def _safe_json(val):
     return val or []
 
 
-def _normalize_embedding(vec):
-    if not vec:
+def _normalize_embedding(vec) -> Optional[np.ndarray]:
+    """Stored embedding (JSON string / list / nested list) → 1-D float32."""
+    if vec is None:
         return None
     if isinstance(vec, str):
         try:
             vec = json.loads(vec)
         except:
             return None
-    if isinstance(vec, list) and len(vec) > 0 and isinstance(vec[0], list):
-        vec = vec[0]
     try:
-        return [float(x) for x in vec]
-    except:
+        arr = np.asarray(vec, dtype=np.float32)
+    except (TypeError, ValueError):
         return None
+    # older rows stored the embedder's [[...]] batch as-is
+    if arr.ndim == 2 and arr.shape[0] == 1:
+        arr = arr[0]
+    if arr.ndim != 1 or arr.size == 0:
+        return None
+    return arr
 
 
-def _embed_query(text: str) -> list:
+def _embed_query(text: str, context=None) -> np.ndarray:
     try:
-        from pipeline.providers.embeddings.bge_embedder import BGEEmbedder
-        embedder = BGEEmbedder()
-        vec = embedder.embed(text)
-        return vec if isinstance(vec, list) else list(vec)
+        # the request's RequestContext embeds each text once
+        if context is not None:
+            return context.embedding(text)
+        from pipeline.providers.embeddings.embedder_factory import get_embedder
+        embedder = get_embedder()
+        return embedder.embed([text])[0]
     except Exception:
-        vec = [0.0] * 256
+        vec = np.zeros(256, dtype=np.float32)
         text = text.lower()
         for i in range(len(text) - 1):
             idx = (ord(text[i]) ^ ord(text[i + 1])) % 256
             vec[idx] += 1.0
-        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
-        return [v / norm for v in vec]
-
-
-def _cosine_similarity(a: list, b: list) -> float:
-    if not a or not b or len(a) != len(b):
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = math.sqrt(sum(x * x for x in a))
-    norm_b = math.sqrt(sum(y * y for y in b))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+        norm = float(np.linalg.norm(vec)) or 1.0
+        return vec / norm
 
 
 # ==============================
 # Session
 # ==============================
 
+_known_sessions: "OrderedDict[str, dict]" = OrderedDict()
+_known_sessions_lock = Lock()
+_KNOWN_SESSIONS_MAX = 10000
+
+
 def get_or_create_session(session_id: str) -> dict:
-    res = supabase.table("sessions").select("*").eq("session_id", session_id).execute()
     now = datetime.utcnow().isoformat()
-    if res.data:
-        supabase.table("sessions").update({
-            "last_active": now
-        }).eq("session_id", session_id).execute()
-        return res.data[0]
-    data = {
-        "session_id":    session_id,
-        "created_at":    now,
-        "last_active":   now,
-        "message_count": 0,
-    }
-    supabase.table("sessions").insert(data).execute()
+
+    # seen before in this process: only last_active changes
+    with _known_sessions_lock:
+        known = _known_sessions.get(session_id)
+        if known is not None:
+            _known_sessions.move_to_end(session_id)
+
+    if known is not None:
+        writes.update("sessions", {"session_id": session_id}, {"last_active": now})
+        return known
+
+    rows = store.select("sessions", {"session_id": session_id})
+    if rows:
+        writes.update("sessions", {"session_id": session_id}, {"last_active": now})
+        data = rows[0]
+    else:
+        data = {
+            "session_id":    session_id,
+            "created_at":    now,
+            "last_active":   now,
+            "message_count": 0,
+        }
+        # synchronous: queued message_count increments need the row
+        store.insert("sessions", [data])
+
+    with _known_sessions_lock:
+        _known_sessions[session_id] = data
+        while len(_known_sessions) > _KNOWN_SESSIONS_MAX:
+            _known_sessions.popitem(last=False)
     return data
 
 
@@ -118,27 +145,20 @@ def save_message(session_id: str, query: str, answer: str, sources: list):
         "date_key":   now.strftime("%Y-%m-%d"),
         "query_hash": _hash_query(query),
     }
-    supabase.table("messages").insert(msg).execute()
-
-    res = supabase.table("sessions").select("message_count").eq("session_id", session_id).execute()
-    if res.data:
-        count = res.data[0].get("message_count", 0)
-        supabase.table("sessions").update({
-            "message_count": count + 1,
-            "last_active":   now.isoformat()
-        }).eq("session_id", session_id).execute()
+    writes.insert("messages", msg)
+    count_doc_sources(session_id, sources)
+    writes.increment(
+        "sessions", {"session_id": session_id}, "message_count",
+        values={"last_active": now.isoformat()},
+    )
 
 
 def get_chat_history(session_id: str) -> dict:
     """Returns chat history for a SPECIFIC session only. Used by ChatOverlay."""
-    res = supabase.table("messages") \
-        .select("*") \
-        .eq("session_id", session_id) \
-        .order("timestamp") \
-        .execute()
+    rows = store.select("messages", {"session_id": session_id}, order="timestamp")
 
     grouped = {}
-    for d in res.data or []:
+    for d in rows:
         date_key = d.get("date_key", "unknown")
         grouped.setdefault(date_key, []).append({
             "query":     d.get("query", ""),
@@ -155,57 +175,64 @@ def get_chat_history(session_id: str) -> dict:
 
 SEMANTIC_THRESHOLD = 0.88
 
+_CACHE_COLUMNS = (
+    "query_hash", "session_id", "query", "query_embedding", "answer", "sources", "hit_count",
+)
+
+
+def _load_cache_rows(session_id: str) -> list:
+    rows = []
+    for data in store.select("cache", {"session_id": session_id}, columns=_CACHE_COLUMNS):
+        embedding = _normalize_embedding(data.pop("query_embedding", None))
+        rows.append((data, embedding))
+    return rows
+
 
-def check_cache(session_id: str, query: str) -> Optional[dict]:
+# the store is the durable copy; lookups run against this index
+semantic_index = SemanticCacheIndex(_load_cache_rows)
+
+# retention (TTL / per-session cap / byte budget), see cache_retention.py
+cache_sweeper = CacheSweeper(store, semantic_index.remove)
+
+
+def cache_stats() -> dict:
+    return {
+        "retention": dict(cache_sweeper.stats),
+        "index": semantic_index.stats(),
+        "writes": dict(writes.stats),
+    }
+
+
+def _record_hit(session_id: str, entry: dict) -> dict:
+    # other workers count hits on the same row: queue a delta,
+    # the local count is only this index's view until it reloads
+    entry["hit_count"] = (entry.get("hit_count") or 0) + 1
+    writes.increment(
+        "cache",
+        {"session_id": session_id, "query_hash": entry.get("query_hash")},
+        "hit_count",
+    )
+    return {
+        "answer":  entry.get("answer"),
+        "sources": _safe_json(entry.get("sources"))
+    }
+
+
+def check_cache(session_id: str, query: str, context=None) -> Optional[dict]:
     query_hash = _hash_query(query)
+    index = semantic_index.session(session_id)
 
     # Exact match
-    res = supabase.table("cache") \
-        .select("*") \
-        .eq("session_id", session_id) \
-        .eq("query_hash", query_hash) \
-        .limit(1) \
-        .execute()
-
-    if res.data:
-        entry = res.data[0]
-        supabase.table("cache").update({
-            "hit_count": entry.get("hit_count", 0) + 1
-        }).eq("query_hash", query_hash).eq("session_id", session_id).execute()
-        return {
-            "answer":  entry.get("answer"),
-            "sources": _safe_json(entry.get("sources"))
-        }
+    entry = index.entries.get(query_hash)
+    if entry:
+        return _record_hit(session_id, entry)
 
     # Semantic match
     try:
-        query_embedding = _embed_query(query)
-        all_entries = supabase.table("cache") \
-            .select("*") \
-            .eq("session_id", session_id) \
-            .execute()
-
-        best_score = 0.0
-        best_entry = None
-
-        for data in all_entries.data or []:
-            emb = _normalize_embedding(data.get("query_embedding"))
-            if not emb:
-                continue
-            score = _cosine_similarity(query_embedding, emb)
-            if score > best_score:
-                best_score = score
-                best_entry = data
+        best_entry, best_score = index.nearest(_embed_query(query, context))
 
         if best_score >= SEMANTIC_THRESHOLD and best_entry:
-            supabase.table("cache").update({
-                "hit_count": best_entry.get("hit_count", 0) + 1
-            }).eq("query_hash", best_entry.get("query_hash")) \
-              .eq("session_id", session_id).execute()
-            return {
-                "answer":  best_entry.get("answer"),
-                "sources": _safe_json(best_entry.get("sources"))
-            }
+            return _record_hit(session_id, best_entry)
 
     except Exception as e:
         print(f"Semantic cache error: {e}")
@@ -213,20 +240,26 @@ def check_cache(session_id: str, query: str) -> Optional[dict]:
     return None
 
 
-def save_to_cache(session_id: str, query: str, answer: str, sources: list):
+def save_to_cache(session_id: str, query: str, answer: str, sources: list, context=None):
     query_hash = _hash_query(query)
-    embedding  = _embed_query(query)
+    embedding  = _embed_query(query, context)
     entry = {
         "query_hash":      query_hash,
         "session_id":      session_id,
         "query":           query,
-        "query_embedding": embedding,
+        "query_embedding": embedding.tolist(),
         "answer":          answer,
         "sources":         sources,
         "hit_count":       0,
         "saved_at":        datetime.utcnow().isoformat(),
     }
-    supabase.table("cache").upsert(entry).execute()
+    writes.upsert("cache", entry, key=("session_id", "query_hash"))
+
+    # the index serves it right away; the store gets it on the next flush
+    semantic_index.session(session_id).add(
+        {k: v for k, v in entry.items() if k != "query_embedding"},
+        embedding,
+    )
 
 
 # ==============================
@@ -241,14 +274,14 @@ def get_all_recent_activity(limit: int = 20) -> list:
     Used by Dashboard 'Recent Activity' card.
     Each item: { session_id, query, sources, timestamp }
     """
-    res = supabase.table("messages") \
-        .select("session_id, query, sources, timestamp") \
-        .order("timestamp", desc=True) \
-        .limit(limit) \
-        .execute()
+    rows = store.select(
+        "messages",
+        columns=("session_id", "query", "sources", "timestamp"),
+        order="timestamp", desc=True, limit=limit,
+    )
 
     results = []
-    for d in res.data or []:
+    for d in rows:
         results.append({
             "session_id": d.get("session_id", ""),
             "query":      d.get("query", ""),
@@ -258,45 +291,112 @@ def get_all_recent_activity(limit: int = 20) -> list:
     return results
 
 
-def get_all_frequent_docs(limit: int = 5) -> list:
+def _doc_sources(sources):
+    """(name, url) for every document source in a message."""
+    for src in _safe_json(sources):
+        if not isinstance(src, dict):
+            continue
+        name = src.get("name") or src.get("file_name") or ""
+        if name:
+            yield name, src.get("url") or ""
+
+
+def scan_doc_frequency() -> dict:
     """
-    Returns top documents accessed across ALL sessions,
-    ranked by how many times they appeared as a source
-    in any message from any user.
-    Used by Dashboard 'Frequently Visited' card.
-    Each item: { file_name, url, count, session_id }
+    Full scan of `messages`: file_name → { count, url, session_id }.
+    Source of truth for the doc_frequency backfill, and the fallback
+    when that table cannot be read.
     """
-    res = supabase.table("messages") \
-        .select("session_id, sources") \
-        .execute()
+    rows = store.select("messages", columns=("session_id", "sources"))
 
     freq: dict = {}  # file_name → { count, url, session_id }
 
-    for d in res.data or []:
-        sources    = _safe_json(d.get("sources"))
+    for d in rows:
         session_id = d.get("session_id", "")
-        for src in sources:
-            if not isinstance(src, dict):
-                continue
-            name = src.get("name") or src.get("file_name") or ""
-            if not name:
-                continue
-            url = src.get("url") or ""
+        for name, url in _doc_sources(d.get("sources")):
             if name not in freq:
                 freq[name] = {"count": 0, "url": url, "session_id": session_id}
             freq[name]["count"] += 1
             freq[name]["session_id"] = session_id  # keep most recent
 
-    sorted_docs = sorted(
-        freq.items(), key=lambda x: x[1]["count"], reverse=True
-    )[:limit]
+    return freq
 
-    return [
-        {
-            "file_name":  name,
-            "url":        data["url"],
-            "count":      data["count"],
-            "session_id": data["session_id"],
-        }
-        for name, data in sorted_docs
-    ]
+
+# ==============================
+# Document frequency aggregate
+#
+#   doc_frequency(file_name text primary key, url text,
+#                 count integer, session_id text)
+#
+# Incremented (write-behind) for every source of every message
+# written, so the dashboard reads `limit` rows instead of scanning
+# all messages. Existing history: scripts/run/backfill_doc_frequency.py
+# On Supabase the table and the increment_column() function come
+# from scripts/run/supabase_migrations.sql.
+# ==============================
+
+FREQUENT_DOCS_TTL = int(os.getenv("FREQUENT_DOCS_TTL", "60"))
+
+_frequent_docs_cache: dict = {}  # limit → (expires_at, result)
+
+
+def count_doc_sources(session_id: str, sources):
+    for name, url in _doc_sources(sources):
+        writes.increment(
+            "doc_frequency", {"file_name": name}, "count",
+            values={"session_id": session_id},
+            defaults={"url": url},
+        )
+
+
+def get_all_frequent_docs(limit: int = 5) -> list:
+    """
+    Returns top documents accessed across ALL sessions,
+    ranked by how many times they appeared as a source
+    in any message from any user.
+    Used by Dashboard 'Frequently Visited' card.
+    Each item: { file_name, url, count, session_id }
+    """
+    cached = _frequent_docs_cache.get(limit)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    try:
+        rows = store.select(
+            "doc_frequency",
+            columns=("file_name", "url", "count", "session_id"),
+            order="count", desc=True, limit=limit,
+        )
+
+        result = [
+            {
+                "file_name":  d.get("file_name", ""),
+                "url":        d.get("url") or "",
+                "count":      d.get("count", 0),
+                "session_id": d.get("session_id", ""),
+            }
+            for d in rows
+        ]
+        if not result:
+            # created but not backfilled yet
+            raise LookupError("doc_frequency is empty")
+
+    except Exception as e:
+        print(f"doc_frequency unavailable, scanning messages: {e}")
+
+        sorted_docs = sorted(
+            scan_doc_frequency().items(), key=lambda x: x[1]["count"], reverse=True
+        )[:limit]
+
+        result = [
+            {
+                "file_name":  name,
+                "url":        data["url"],
+                "count":      data["count"],
+                "session_id": data["session_id"],
+            }
+            for name, data in sorted_docs
+        ]
+
+    _frequent_docs_cache[limit] = (time.monotonic() + FREQUENT_DOCS_TTL, result)
+    return result
@@ -0,0 +1,516 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+
+# ==============================
+# Session storage backends
+#
+# Row-level operations over the session tables (sessions,
+# messages, cache, doc_clicks, doc_frequency). session_manager
+# and the write-behind queue only talk to a SessionStore, so the
+# backend is picked by SESSION_STORE:
+#
+#   supabase  hosted Postgres (default)
+#   sqlite    local file, WAL; single node / offline / load tests
+# ==============================
+
+SESSION_STORE = os.getenv("SESSION_STORE", "supabase").lower()
+
+BASE_DATA_DIR = os.getenv("DATA_DIR", "data")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", str(Path(BASE_DATA_DIR) / "sessions.db"))
+
+
+class SessionStore(ABC):
+    """
+    Equality filters only (a None value matches NULL); rows are plain
+    dicts as in Supabase.
+    """
+
+    @abstractmethod
+    def select(
+        self,
+        table: str,
+        filters: Optional[Dict] = None,
+        columns: Optional[Sequence[str]] = None,
+        order: Optional[Union[str, Sequence[str]]] = None,
+        desc: bool = False,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> List[dict]:
+        pass
+
+    @abstractmethod
+    def insert(self, table: str, rows: List[dict]):
+        pass
+
+    @abstractmethod
+    def upsert(self, table: str, rows: List[dict]):
+        """Insert, or update the given columns of the row with the same primary key."""
+        pass
+
+    @abstractmethod
+    def update(self, table: str, filters: Dict, values: Dict):
+        pass
+
+    @abstractmethod
+    def increment(
+        self,
+        table: str,
+        filters: Dict,
+        column: str,
+        amount: int = 1,
+        values: Optional[Dict] = None,
+        defaults: Optional[Dict] = None,
+    ):
+        """
+        Atomically add `amount` to `column` of the row matching filters
+        and set `values` on it. With `defaults`, a missing row is
+        inserted (filters + defaults + values, column = amount); filters
+        must then be the table's primary key.
+        """
+        pass
+
+    @abstractmethod
+    def delete(
+        self,
+        table: str,
+        filters: Dict,
+        in_column: Optional[str] = None,
+        in_values: Optional[Sequence] = None,
+    ):
+        """Delete rows matching filters (and in_column IN in_values, if given)."""
+        pass
+
+    @abstractmethod
+    def cache_usage(self) -> Optional[List[dict]]:
+        """
+        Per-session totals of the cache table, computed in the store:
+        { session_id, entries, bytes, oldest_saved_at, missing_saved_at }.
+        bytes counts query + answer + sources (UTF-8); oldest_saved_at
+        is the earliest parsed saved_at (ISO string), missing_saved_at
+        the number of rows without one. None if the store cannot
+        aggregate server-side.
+        """
+        pass
+
+
+def _order_columns(order) -> List[str]:
+    if not order:
+        return []
+    return [order] if isinstance(order, str) else list(order)
+
+
+# ==============================
+# Supabase
+# ==============================
+
+_DELETE_BATCH = 200
+
+# SQL functions called over RPC live in scripts/run/supabase_migrations.sql.
+# One that is not deployed (PostgREST PGRST202, Postgres 42883) is
+# reported once and replaced by a client-side fallback.
+_MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+
+_NOT_DEPLOYED = object()
+
+
+def _missing_function(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return code in _MISSING_FUNCTION_CODES or "Could not find the function" in str(error)
+
+
+class SupabaseStore(SessionStore):
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None):
+        from supabase import create_client
+
+        url = url or os.getenv("SUPABASE_URL")
+        key = key or os.getenv("SUPABASE_KEY")
+
+        if not url or not key:
+            raise ValueError("Supabase credentials not set")
+
+        self.client = create_client(url, key)
+        self._missing_functions: set = set()
+
+    @staticmethod
+    def _where(query, filters: Optional[Dict]):
+        for column, value in (filters or {}).items():
+            query = query.is_(column, "null") if value is None else query.eq(column, value)
+        return query
+
+    def select(self, table, filters=None, columns=None, order=None, desc=False, limit=None, offset=None):
+        query = self.client.table(table).select(", ".join(columns) if columns else "*")
+        query = self._where(query, filters)
+        for column in _order_columns(order):
+            query = query.order(column, desc=desc)
+        if limit is not None and offset:
+            query = query.range(offset, offset + limit - 1)
+        elif limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    def insert(self, table, rows):
+        self.client.table(table).insert(rows).execute()
+
+    def upsert(self, table, rows):
+        self.client.table(table).upsert(rows).execute()
+
+    def update(self, table, filters, values):
+        self._where(self.client.table(table).update(values), filters).execute()
+
+    def _rpc(self, function: str, params: dict):
+        """Result of the SQL function, or _NOT_DEPLOYED if it is missing."""
+        if function in self._missing_functions:
+            return _NOT_DEPLOYED
+        try:
+            return self.client.rpc(function, params).execute().data
+        except Exception as e:
+            if not _missing_function(e):
+                raise
+            self._missing_functions.add(function)
+            print(
+                f"[session-store] WARNING: {function}() is not deployed, using the "
+                f"client-side fallback; run scripts/run/supabase_migrations.sql"
+            )
+            return _NOT_DEPLOYED
+
+    def increment(self, table, filters, column, amount=1, values=None, defaults=None):
+        values = values or {}
+
+        # one statement server-side: concurrent workers never lose counts
+        result = self._rpc("increment_column", {
+            "p_table":    table,
+            "p_filters":  filters,
+            "p_column":   column,
+            "p_amount":   amount,
+            "p_values":   values,
+            "p_defaults": defaults,
+        })
+        if result is not _NOT_DEPLOYED:
+            return
+
+        # read-modify-write, as before the function existed: not
+        # atomic, concurrent increments of one row can lose counts
+        rows = self.select(table, filters, columns=[column], limit=1)
+        if rows:
+            self.update(table, filters, {**values, column: (rows[0].get(column) or 0) + amount})
+        elif defaults is not None:
+            self.insert(table, [{**filters, **defaults, **values, column: amount}])
+
+    def cache_usage(self):
+        result = self._rpc("cache_usage", {})
+        # None: the sweep aggregates the rows itself
+        return None if result is _NOT_DEPLOYED else (result or [])
+
+    def delete(self, table, filters, in_column=None, in_values=None):
+        if in_column is None:
+            self._where(self.client.table(table).delete(), filters).execute()
+            return
+
+        values = list(in_values or [])
+        # keeps the request URL short
+        for start in range(0, len(values), _DELETE_BATCH):
+            query = self._where(self.client.table(table).delete(), filters)
+            query.in_(in_column, values[start:start + _DELETE_BATCH]).execute()
+
+
+# ==============================
+# SQLite
+# ==============================
+
+# table → (columns, primary key, JSON columns)
+_TABLES = {
+    "sessions": (
+        ("session_id", "created_at", "last_active", "message_count"),
+        ("session_id",),
+        (),
+    ),
+    "messages": (
+        ("session_id", "query", "answer", "sources", "timestamp", "date_key", "query_hash"),
+        None,
+        ("sources",),
+    ),
+    "cache": (
+        ("query_hash", "session_id", "query", "query_embedding", "answer",
+         "sources", "hit_count", "saved_at"),
+        ("session_id", "query_hash"),
+        ("sources",),
+    ),
+    "doc_clicks": (
+        ("session_id", "file_id", "file_name", "url", "clicked_at"),
+        None,
+        (),
+    ),
+    "doc_frequency": (
+        ("file_name", "url", "count", "session_id"),
+        ("file_name",),
+        (),
+    ),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id    TEXT PRIMARY KEY,
+    created_at    TEXT,
+    last_active   TEXT,
+    message_count INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    query      TEXT,
+    answer     TEXT,
+    sources    TEXT,
+    timestamp  TEXT,
+    date_key   TEXT,
+    query_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS cache (
+    query_hash      TEXT NOT NULL,
+    session_id      TEXT NOT NULL,
+    query           TEXT,
+    query_embedding BLOB,
+    answer          TEXT,
+    sources         TEXT,
+    hit_count       INTEGER DEFAULT 0,
+    saved_at        TEXT,
+    PRIMARY KEY (session_id, query_hash)
+);
+
+CREATE TABLE IF NOT EXISTS doc_clicks (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    file_id    TEXT,
+    file_name  TEXT,
+    url        TEXT,
+    clicked_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS doc_frequency (
+    file_name  TEXT PRIMARY KEY,
+    url        TEXT,
+    count      INTEGER DEFAULT 0,
+    session_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_doc_frequency_count ON doc_frequency(count);
+"""
+
+
+class SQLiteStore(SessionStore):
+
+    _lock = threading.Lock()
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+
+        with self._lock:
+            self.conn.executescript(_SCHEMA)
+            self.conn.commit()
+
+    # -----------------------------
+    # Identifiers are checked against the schema;
+    # values always go in as parameters
+    # -----------------------------
+    @staticmethod
+    def _columns(table: str, columns) -> Sequence[str]:
+        if table not in _TABLES:
+            raise ValueError(f"Unknown session table '{table}'")
+        known = _TABLES[table][0]
+        for column in columns:
+            if column not in known:
+                raise ValueError(f"Unknown column '{table}.{column}'")
+        return columns
+
+    @staticmethod
+    def _encode(table: str, column: str, value):
+        if column == "query_embedding" and value is not None:
+            return np.asarray(value, dtype="<f4").tobytes()
+        if column in _TABLES[table][2] and not isinstance(value, str):
+            return json.dumps(value)
+        return value
+
+    @staticmethod
+    def _decode(table: str, row: sqlite3.Row) -> dict:
+        data = dict(row)
+        data.pop("id", None)
+        for column in _TABLES[table][2]:
+            if isinstance(data.get(column), str):
+                try:
+                    data[column] = json.loads(data[column])
+                except ValueError:
+                    pass
+        if data.get("query_embedding") is not None:
+            data["query_embedding"] = np.frombuffer(data["query_embedding"], dtype="<f4")
+        return data
+
+    def _where(self, table: str, filters: Optional[Dict]):
+        filters = filters or {}
+        self._columns(table, filters)
+        clause = " AND ".join(
+            f"{column} IS NULL" if value is None else f"{column} = ?"
+            for column, value in filters.items()
+        )
+        params = [value for value in filters.values() if value is not None]
+        return (f" WHERE {clause}" if clause else ""), params
+
+    def select(self, table, filters=None, columns=None, order=None, desc=False, limit=None, offset=None):
+        columns = self._columns(table, columns) if columns else ["*"]
+        where, params = self._where(table, filters)
+
+        sql = f"SELECT {', '.join(columns)} FROM {table}{where}"
+        order = self._columns(table, _order_columns(order))
+        if order:
+            sql += " ORDER BY " + ", ".join(f"{c}{' DESC' if desc else ''}" for c in order)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+            if offset:
+                sql += " OFFSET ?"
+                params.append(int(offset))
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        return [self._decode(table, row) for row in rows]
+
+    def _write_many(self, table: str, rows: List[dict], upsert: bool):
+        if not rows:
+            return
+
+        with self._lock:
+            for row in rows:
+                columns = list(self._columns(table, row))
+                sql = (
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})"
+                )
+
+                key = _TABLES[table][1]
+                if upsert and key:
+                    updates = [c for c in columns if c not in key]
+                    sql += f" ON CONFLICT ({', '.join(key)}) DO " + (
+                        "UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updates)
+                        if updates else "NOTHING"
+                    )
+
+                self.conn.execute(sql, [self._encode(table, c, row[c]) for c in columns])
+
+            self.conn.commit()
+
+    def insert(self, table, rows):
+        self._write_many(table, rows, upsert=False)
+
+    def upsert(self, table, rows):
+        self._write_many(table, rows, upsert=True)
+
+    def update(self, table, filters, values):
+        if not values:
+            return
+
+        self._columns(table, values)
+        where, params = self._where(table, filters)
+        assignments = ", ".join(f"{column} = ?" for column in values)
+
+        with self._lock:
+            self.conn.execute(
+                f"UPDATE {table} SET {assignments}{where}",
+                [self._encode(table, c, v) for c, v in values.items()] + params,
+            )
+            self.conn.commit()
+
+    def increment(self, table, filters, column, amount=1, values=None, defaults=None):
+        values = values or {}
+        self._columns(table, [column, *values])
+
+        with self._lock:
+            if defaults is None:
+                where, params = self._where(table, filters)
+                assignments = "".join(f", {c} = ?" for c in values)
+                self.conn.execute(
+                    f"UPDATE {table} SET {column} = COALESCE({column}, 0) + ?{assignments}{where}",
+                    [amount] + [self._encode(table, c, v) for c, v in values.items()] + params,
+                )
+
+            else:
+                row = {**filters, **defaults, **values, column: amount}
+                columns = list(self._columns(table, row))
+                updates = [f"{column} = COALESCE({table}.{column}, 0) + excluded.{column}"]
+                updates += [f"{c} = excluded.{c}" for c in values]
+                self.conn.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT ({', '.join(self._columns(table, list(filters)))}) "
+                    f"DO UPDATE SET {', '.join(updates)}",
+                    [self._encode(table, c, row[c]) for c in columns],
+                )
+
+            self.conn.commit()
+
+    def cache_usage(self):
+        # julianday() parses the ISO timestamps instead of comparing strings
+        sql = """
+            SELECT session_id,
+                   COUNT(*) AS entries,
+                   SUM(LENGTH(CAST(COALESCE(query, '') AS BLOB))
+                       + LENGTH(CAST(COALESCE(answer, '') AS BLOB))
+                       + LENGTH(CAST(COALESCE(sources, '') AS BLOB))) AS bytes,
+                   strftime('%Y-%m-%dT%H:%M:%f', MIN(julianday(saved_at))) AS oldest_saved_at,
+                   SUM(saved_at IS NULL) AS missing_saved_at
+            FROM cache
+            GROUP BY session_id
+        """
+        with self._lock:
+            rows = self.conn.execute(sql).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, table, filters, in_column=None, in_values=None):
+        where, params = self._where(table, filters)
+
+        batches = [None]
+        if in_column is not None:
+            self._columns(table, [in_column])
+            values = list(in_values or [])
+            # SQLite caps bound parameters per statement
+            batches = [values[i:i + 500] for i in range(0, len(values), 500)]
+
+        with self._lock:
+            for batch in batches:
+                sql, batch_params = f"DELETE FROM {table}{where}", list(params)
+                if batch is not None:
+                    sql += (" AND " if where else " WHERE ") + (
+                        f"{in_column} IN ({', '.join('?' * len(batch))})"
+                    )
+                    batch_params += batch
+                self.conn.execute(sql, batch_params)
+            self.conn.commit()
+
+
+_STORES = {
+    "supabase": SupabaseStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def create_session_store(backend: str = SESSION_STORE) -> SessionStore:
+    if backend not in _STORES:
+        raise ValueError(
+            f"Unknown SESSION_STORE '{backend}' (expected one of {sorted(_STORES)})"
+        )
+    return _STORES[backend]()
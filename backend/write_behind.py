@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+# ==============================
+# Write-behind queue for the session store
+#
+# /chat enqueues its bookkeeping writes and returns; a background
+# thread flushes them when WRITE_BEHIND_BATCH_SIZE writes are
+# pending or every WRITE_BEHIND_FLUSH_MS, whichever comes first.
+#
+#   insert     rows of one table go out as one bulk insert
+#   upsert     same, as one bulk upsert (latest row per key)
+#   update     per row (table + filters), later values win
+#   increment  per row + column, deltas add up; one atomic
+#              store.increment per flush however many increments
+#
+# A failed group stays queued and is retried with backoff, up to
+# WRITE_BEHIND_MAX_RETRIES flushes, then dropped and logged.
+# ==============================
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND", "true").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "500"))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000"))
+
+_Filters = Tuple[Tuple[str, object], ...]
+
+
+def _filters(filters: dict) -> _Filters:
+    return tuple(sorted(filters.items()))
+
+
+class _Pending:
+
+    def __init__(self):
+        self.inserts: Dict[str, List[dict]] = {}
+        self.upserts: Dict[str, Dict[tuple, dict]] = {}
+        self.updates: Dict[Tuple[str, _Filters], dict] = {}
+        self.increments: Dict[Tuple[str, _Filters, str], list] = {}
+
+    def __len__(self):
+        return (
+            sum(len(rows) for rows in self.inserts.values())
+            + sum(len(rows) for rows in self.upserts.values())
+            + len(self.updates)
+            + len(self.increments)
+        )
+
+
+class WriteBehindQueue:
+
+    def __init__(
+        self,
+        store,
+        enabled: bool = WRITE_BEHIND_ENABLED,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_ms: float = WRITE_BEHIND_FLUSH_MS,
+        max_retries: int = WRITE_BEHIND_MAX_RETRIES,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.interval = flush_ms / 1000
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+
+        self._pending = _Pending()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        # failed flushes per group, reset once the group succeeds
+        self._attempts: Dict[tuple, int] = {}
+
+        self._thread = None
+        self.stats = {"flushes": 0, "writes": 0, "retries": 0, "dropped": 0}
+
+    # -----------------------------
+    # Enqueue
+    # -----------------------------
+    def insert(self, table: str, row: dict):
+        with self._lock:
+            self._pending.inserts.setdefault(table, []).append(row)
+        self._after_enqueue()
+
+    def upsert(self, table: str, row: dict, key: Tuple[str, ...]):
+        """`key` is the conflict key; a newer row for the same key replaces the queued one."""
+        with self._lock:
+            self._pending.upserts.setdefault(table, {})[tuple(row[k] for k in key)] = row
+        self._after_enqueue()
+
+    def update(self, table: str, filters: dict, values: dict):
+        with self._lock:
+            self._pending.updates.setdefault((table, _filters(filters)), {}).update(values)
+        self._after_enqueue()
+
+    def increment(
+        self,
+        table: str,
+        filters: dict,
+        column: str,
+        amount: int = 1,
+        values: dict = None,
+        defaults: dict = None,
+    ):
+        """
+        Add `amount` to `column`; `values` are set on the same update.
+        With `defaults`, a missing row is inserted (filters + defaults
+        + values, column = amount) instead of being skipped.
+        """
+        with self._lock:
+            entry = self._pending.increments.setdefault(
+                (table, _filters(filters), column), [0, {}, None]
+            )
+            entry[0] += amount
+            entry[1].update(values or {})
+            if defaults is not None and entry[2] is None:
+                entry[2] = defaults
+        self._after_enqueue()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _after_enqueue(self):
+        if not self.enabled or self._stop.is_set():
+            self.flush()
+            return
+
+        self._ensure_thread()
+
+        pending = self.pending()
+
+        if pending >= self.max_pending:
+            # backpressure: the caller pays for the flush
+            self.flush()
+        elif pending >= self.batch_size:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run,
+                        name="session-write-behind",
+                        daemon=True,
+                    )
+                    self._thread.start()
+
+    # -----------------------------
+    # Flush
+    # -----------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            if self._stop.is_set():
+                break
+
+            if not self.flush():
+                # at least one group failed: back off before retrying
+                worst = max(self._attempts.values(), default=1)
+                self._stop.wait(min(30.0, self.interval * 2 ** worst))
+
+    def flush(self) -> bool:
+        """Write everything pending; True if every group succeeded."""
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, _Pending()
+
+            if not len(batch):
+                return True
+
+            ok = True
+
+            for table, rows in batch.inserts.items():
+                ok &= self._write(
+                    ("insert", table), len(rows),
+                    lambda: self.store.insert(table, rows),
+                    lambda: self._requeue(lambda p: p.inserts.setdefault(table, []).extend(rows)),
+                )
+
+            for table, rows in batch.upserts.items():
+                ok &= self._write(
+                    ("upsert", table), len(rows),
+                    lambda: self.store.upsert(table, list(rows.values())),
+                    lambda: self._requeue(
+                        lambda p: p.upserts.__setitem__(table, {**rows, **p.upserts.get(table, {})})
+                    ),
+                )
+
+            for key, values in batch.updates.items():
+                ok &= self._write(
+                    ("update",) + key, 1,
+                    lambda: self._apply_update(key, values),
+                    # newer values queued since win over the failed ones
+                    lambda: self._requeue(
+                        lambda p: p.updates.__setitem__(key, {**values, **p.updates.get(key, {})})
+                    ),
+                )
+
+            for key, (amount, values, defaults) in batch.increments.items():
+                ok &= self._write(
+                    ("increment",) + key, 1,
+                    lambda: self._apply_increment(key, amount, values, defaults),
+                    lambda: self._requeue(
+                        lambda p: self._merge_increment(p, key, amount, values, defaults)
+                    ),
+                )
+
+            self.stats["flushes"] += 1
+            return ok
+
+    def _write(self, group: tuple, n: int, write, requeue) -> bool:
+        try:
+            write()
+        except Exception as e:
+            attempts = self._attempts.get(group, 0) + 1
+
+            if attempts > self.max_retries:
+                self._attempts.pop(group, None)
+                self.stats["dropped"] += n
+                print(f"[write-behind] dropping {n} write(s) to {group[:2]} after {self.max_retries} retries: {e}")
+                return False
+
+            self._attempts[group] = attempts
+            self.stats["retries"] += 1
+            print(f"[write-behind] {group[:2]} failed (attempt {attempts}/{self.max_retries}): {e}")
+            requeue()
+            return False
+
+        self._attempts.pop(group, None)
+        self.stats["writes"] += n
+        return True
+
+    def _requeue(self, merge):
+        with self._lock:
+            merge(self._pending)
+
+    @staticmethod
+    def _merge_increment(pending: _Pending, key, amount: int, values: dict, defaults):
+        entry = pending.increments.setdefault(key, [0, {}, None])
+        entry[0] += amount
+        # values queued after the failure are newer
+        entry[1] = {**values, **entry[1]}
+        entry[2] = defaults if defaults is not None else entry[2]
+
+    def _apply_update(self, key, values: dict):
+        table, filters = key
+        self.store.update(table, dict(filters), values)
+
+    def _apply_increment(self, key, amount: int, values: dict, defaults):
+        table, filters, column = key
+        # atomic in the store, so several API workers (or the backfill)
+        # incrementing the same row do not lose counts
+        self.store.increment(table, dict(filters), column, amount, values, defaults)
+
+    # -----------------------------
+    # Shutdown
+    # -----------------------------
+    def drain(self, timeout: float = 10.0):
+        """Stop the flusher and write out what is still pending."""
+
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+        deadline = time.monotonic() + timeout
+
+        while self.pending() and time.monotonic() < deadline:
+            if not self.flush():
+                time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+
+        if self.pending():
+            print(f"[write-behind] {self.pending()} write(s) still pending at shutdown")
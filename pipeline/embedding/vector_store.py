@@ -2,7 +2,10 @@
 
 import os
 import threading
+import time
 import uuid
+import numpy as np
+from typing import Optional
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
     VectorParams,
@@ -11,8 +14,11 @@ from qdrant_client.models import (
     Filter,
     FieldCondition,
     MatchValue,
+    HasIdCondition,
+    PointIdsList,
 )
 from pipeline.utils.logger import logger
+from pipeline.utils.metrics import metrics
 
 # ----------------------------------------------------------
 # Qdrant Configuration
@@ -22,10 +28,91 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = "drive_docs"
 
+# Seconds before the cached point count is refreshed from Qdrant
+COLLECTION_STATS_TTL = float(os.getenv("COLLECTION_STATS_TTL", "300"))
+
 _client = None
 _lock = threading.Lock()
 
 
+# ----------------------------------------------------------
+# Collection statistics cache
+# ----------------------------------------------------------
+
+class CollectionStats:
+    """
+    Process-wide cache of the collection point count.
+
+    Writes through this process adjust it locally; a TTL refresh
+    picks up writes made elsewhere (e.g. the ingestion workflow).
+    Once a value is known, readers never wait on Qdrant: a stale
+    value is returned while a single background refresh runs.
+    """
+
+    def __init__(self, ttl: float = COLLECTION_STATS_TTL):
+        self.ttl = ttl
+        self._count: Optional[int] = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._count is not None
+            and time.monotonic() - self._refreshed_at < self.ttl
+        )
+
+    def refresh(self, client) -> int:
+        count = client.count(collection_name=COLLECTION_NAME).count
+
+        with self._lock:
+            self._count = count
+            self._refreshed_at = time.monotonic()
+
+        metrics.inc("collection_stats_refreshes")
+        return count
+
+    def _refresh_in_background(self, client):
+        try:
+            self.refresh(client)
+        except Exception:
+            logger.warning("Background refresh of collection stats failed")
+        finally:
+            self._refreshing = False
+
+    def point_count(self, client) -> int:
+
+        if self._is_fresh():
+            return self._count
+
+        if self._count is None:
+            return self.refresh(client)
+
+        with self._lock:
+            start = not self._refreshing
+            self._refreshing = True
+
+        if start:
+            threading.Thread(
+                target=self._refresh_in_background,
+                args=(client,),
+                daemon=True,
+            ).start()
+
+        return self._count
+
+    def adjust(self, delta: int):
+        with self._lock:
+            if self._count is not None:
+                self._count = max(0, self._count + delta)
+
+    def peek(self) -> Optional[int]:
+        return self._count
+
+
+_stats = CollectionStats()
+
+
 def _initialize():
     global _client
 
@@ -71,9 +158,10 @@ class VectorStore:
     # ------------------------------------------------------
     # ADD CHUNKS (Fixed UUID IDs)
     # ------------------------------------------------------
-    def add_chunks(self, embeddings, documents, metadatas, ids):
+    def _points(self, embeddings, documents, metadatas, ids):
 
-        logger.info(f"Adding {len(documents)} chunks to Qdrant")
+        # float32 batch → plain lists only here, at the wire boundary
+        vectors = np.asarray(embeddings, dtype=np.float32).tolist()
 
         points = []
 
@@ -100,16 +188,95 @@ class VectorStore:
             points.append(
                 PointStruct(
                     id=generated_id,
-                    vector=embeddings[i],
+                    vector=vectors[i],
                     payload=payload,
                 )
             )
 
+        return points
+
+    def add_chunks(self, embeddings, documents, metadatas, ids):
+
+        logger.info(f"Adding {len(documents)} chunks to Qdrant")
+
+        points = self._points(embeddings, documents, metadatas, ids)
+
         self.client.upsert(
             collection_name=COLLECTION_NAME,
             points=points,
         )
 
+        # ids are new per ingested file; a TTL refresh corrects any
+        # overwritten points
+        _stats.adjust(len(points))
+
+    # ------------------------------------------------------
+    # REPLACE A FILE'S CHUNKS (re-ingest of an edited file)
+    # ------------------------------------------------------
+    def replace_file(self, file_id: str, embeddings, documents, metadatas, ids):
+        """
+        Upsert the file's new chunks, then delete its points that are
+        not among them. Qdrant has no multi-operation transaction, so
+        the order matters: searches see the old or the new version of
+        each point, never the file with no points at all.
+        """
+
+        logger.info(f"Replacing chunks for file_id={file_id} with {len(documents)} chunks")
+
+        points = self._points(embeddings, documents, metadatas, ids)
+
+        file_condition = FieldCondition(key="file_id", match=MatchValue(value=file_id))
+
+        before = None
+
+        if _stats.peek() is not None:
+            before = self.client.count(
+                collection_name=COLLECTION_NAME,
+                count_filter=Filter(must=[file_condition]),
+                exact=True,
+            ).count
+
+        if points:
+            self.client.upsert(
+                collection_name=COLLECTION_NAME,
+                points=points,
+            )
+
+        self.client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=Filter(
+                must=[file_condition],
+                must_not=[HasIdCondition(has_id=[p.id for p in points])] if points else [],
+            ),
+        )
+
+        if before is not None:
+            _stats.adjust(len(points) - before)
+
+    # ------------------------------------------------------
+    # CHUNK DIFF (re-ingest with a chunk manifest)
+    # ------------------------------------------------------
+    def update_file_chunks(self, embeddings, documents, metadatas, ids, removed_ids):
+        """
+        Upsert only the file's new chunks and delete only the removed
+        ones (ids as passed to add_chunks); unchanged points are left
+        as they are.
+        """
+
+        logger.info(f"Updating file chunks in Qdrant | +{len(documents)} -{len(removed_ids)}")
+
+        if documents:
+            self.add_chunks(embeddings, documents, metadatas, ids)
+
+        if removed_ids:
+            self.client.delete(
+                collection_name=COLLECTION_NAME,
+                points_selector=PointIdsList(
+                    points=[str(uuid.uuid5(uuid.NAMESPACE_DNS, str(i))) for i in removed_ids]
+                ),
+            )
+            _stats.adjust(-len(removed_ids))
+
     # ------------------------------------------------------
     # DELETE BY FILE ID
     # ------------------------------------------------------
@@ -117,41 +284,61 @@ class VectorStore:
 
         logger.warning(f"Deleting vectors for file_id={file_id}")
 
+        file_filter = Filter(
+            must=[
+                FieldCondition(
+                    key="file_id",
+                    match=MatchValue(value=file_id),
+                )
+            ]
+        )
+
+        removed = None
+
+        if _stats.peek() is not None:
+            removed = self.client.count(
+                collection_name=COLLECTION_NAME,
+                count_filter=file_filter,
+                exact=True,
+            ).count
+
         self.client.delete(
             collection_name=COLLECTION_NAME,
-            points_selector=Filter(
-                must=[
-                    FieldCondition(
-                        key="file_id",
-                        match=MatchValue(value=file_id),
-                    )
-                ]
-            ),
+            points_selector=file_filter,
         )
 
+        if removed is not None:
+            _stats.adjust(-removed)
+
     # ------------------------------------------------------
     # COUNT
     # ------------------------------------------------------
     def count(self) -> int:
+        """Exact count straight from Qdrant (also refreshes the cache)."""
 
-        count = self.client.count(
-            collection_name=COLLECTION_NAME
-        ).count
+        count = _stats.refresh(self.client)
 
         logger.info(f"Total vectors in Qdrant: {count}")
 
         return count
 
+    def cached_count(self) -> int:
+        """
+        Point count from the collection-stats cache; only the first
+        call in a process goes to Qdrant.
+        """
+        return _stats.point_count(self.client)
+
     # ------------------------------------------------------
     # QUERY — compatible with qdrant-client 1.9.1
     # query_points() was only added in qdrant-client 1.10+
     # use search() instead which works on all 1.x versions
     # ------------------------------------------------------
-    def query(self, embedding: list, n_results: int):
+    def query(self, embedding, n_results: int):
 
         results = self.client.search(
             collection_name=COLLECTION_NAME,
-            query_vector=embedding,
+            query_vector=np.asarray(embedding, dtype=np.float32).tolist(),
             limit=n_results,
             with_payload=True,
         )
@@ -1,5 +1,7 @@
 # src/ingestion/list_docs.py
 
+from typing import Dict, List, Tuple
+
 from googleapiclient.discovery import build
 from pipeline.utils.auth import get_credentials
 from pipeline.utils.logger import logger
@@ -12,6 +14,17 @@ CSV_MIME = "text/csv"
 #  Your Target Folder
 TARGET_FOLDER_ID = "1xs66Xr4CGmK3ikgL7xXcyDwbFfwy6NnW"
 
+TARGET_MIMES = (GOOGLE_DOC_MIME, DOCX_MIME, PDF_MIME, CSV_MIME)
+
+# modifiedTime / md5Checksum / version let ingestion tell edited
+# files from unchanged ones (see tracker_db.revision_changed)
+FILE_FIELDS = "id, name, mimeType, parents, modifiedTime, md5Checksum, version"
+
+
+def _drive_service():
+    creds = get_credentials()
+    return build("drive", "v3", credentials=creds)
+
 
 def list_drive_documents():
     """
@@ -25,8 +38,7 @@ def list_drive_documents():
 
     logger.info("Fetching documents ONLY from target folder")
 
-    creds = get_credentials()
-    service = build("drive", "v3", credentials=creds)
+    service = _drive_service()
 
     query = (
         f"('{TARGET_FOLDER_ID}' in parents) and "
@@ -37,13 +49,24 @@ def list_drive_documents():
         f"and trashed=false"
     )
 
-    results = service.files().list(
-        q=query,
-        fields="files(id, name, mimeType, parents)",
-        pageSize=100,
-    ).execute()
+    files = []
+    page_token = None
+
+    # every page: files missing from the listing are treated as
+    # deleted by the ingestion sync
+    while True:
+        results = service.files().list(
+            q=query,
+            fields=f"nextPageToken, files({FILE_FIELDS})",
+            pageSize=100,
+            pageToken=page_token,
+        ).execute()
 
-    files = results.get("files", [])
+        files.extend(results.get("files", []))
+
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
 
     logger.info(f"Found {len(files)} documents in target folder")
 
@@ -51,3 +74,75 @@ def list_drive_documents():
         logger.debug(f"{f['name']} | {f['mimeType']} | {f['id']}")
 
     return files
+
+
+# -----------------------------
+# Changes feed
+# -----------------------------
+
+def _in_scope(f: dict) -> bool:
+    """Same selection as list_drive_documents(), applied to one file resource."""
+    return (
+        not f.get("trashed")
+        and f.get("mimeType") in TARGET_MIMES
+        and TARGET_FOLDER_ID in (f.get("parents") or [])
+    )
+
+
+def get_drive_start_page_token() -> str:
+    """Changes-feed position for "now"; changes after it are returned by list_drive_changes()."""
+    service = _drive_service()
+    return service.changes().getStartPageToken().execute()["startPageToken"]
+
+
+def list_drive_changes(page_token: str) -> Tuple[List[dict], List[str], str]:
+    """
+    Changes since page_token, as (changed, removed_ids, next_token):
+
+        changed      in-scope files added or modified, listing dicts
+                     with the same fields as list_drive_documents()
+        removed_ids  files deleted, trashed or moved out of the folder
+        next_token   where the next poll continues from
+    """
+
+    service = _drive_service()
+
+    # latest change per file wins
+    latest: Dict[str, dict] = {}
+
+    while True:
+        results = service.changes().list(
+            pageToken=page_token,
+            spaces="drive",
+            includeRemoved=True,
+            pageSize=1000,
+            fields=(
+                "nextPageToken, newStartPageToken, "
+                f"changes(fileId, removed, file({FILE_FIELDS}, trashed))"
+            ),
+        ).execute()
+
+        for change in results.get("changes", []):
+            if change.get("fileId"):
+                latest[change["fileId"]] = change
+
+        if "newStartPageToken" in results:
+            next_token = results["newStartPageToken"]
+            break
+
+        page_token = results["nextPageToken"]
+
+    changed, removed_ids = [], []
+
+    for file_id, change in latest.items():
+        f = change.get("file")
+
+        if change.get("removed") or not f or not _in_scope(f):
+            removed_ids.append(file_id)
+        else:
+            f.pop("trashed", None)
+            changed.append(f)
+
+    logger.info(f"Drive changes | changed={len(changed)} removed_or_out_of_scope={len(removed_ids)}")
+
+    return changed, removed_ids, next_token
@@ -4,21 +4,30 @@ load_dotenv()
 
 import os
 import time
+import hashlib
 import tempfile
 import json
+import threading
 import requests
+from typing import List, Optional, Set
 
-from pipeline.ingestion.list_docs import list_drive_documents
+from pipeline.ingestion.list_docs import (
+    get_drive_start_page_token,
+    list_drive_changes,
+    list_drive_documents,
+)
 from pipeline.ingestion.download_file import download_drive_file
+from pipeline.ingestion.staged_pipeline import Stage, StagedPipeline
 
 from pipeline.providers.parsers.parser_router import ParserRouter
-from pipeline.providers.embeddings.bge_embedder import BGEEmbedder
+from pipeline.providers.embeddings.embedder_factory import get_embedder
 from pipeline.embedding.vector_store import VectorStore
 from pipeline.providers.chunking.chunking_router import ChunkingRouter
 from pipeline.providers.retrievers.bm25_retriever import BM25Retriever
 
-from pipeline.storage.tracker_db import TrackerDB
+from pipeline.storage.tracker_db import TrackerDB, revision_changed, revision_of
 from pipeline.storage.sqlite_store import SQLiteStore
+from pipeline.utils.lexical_features import compute_features
 from pipeline.utils.logger import logger
 
 
@@ -174,58 +183,378 @@ TEXT CHUNKS:
 
 
 # -----------------------------
-# MAIN
+# Ingestion stages
 # -----------------------------
 
-def main():
+# Worker threads per stage; queues between stages are bounded
+# (INGEST_STAGE_QUEUE_SIZE), so while document N is embedded,
+# N+1 is already downloading and parsing
+STAGE_WORKERS = {
+    "download": int(os.getenv("INGEST_DOWNLOAD_CONCURRENCY", "4")),
+    "parse":    int(os.getenv("INGEST_PARSE_CONCURRENCY", "4")),
+    "chunk":    int(os.getenv("INGEST_CHUNK_CONCURRENCY", "2")),
+    "enrich":   int(os.getenv("INGEST_ENRICH_CONCURRENCY", "2")),
+    "embed":    int(os.getenv("INGEST_EMBED_CONCURRENCY", "4")),
+    "index":    int(os.getenv("INGEST_INDEX_CONCURRENCY", "2")),
+}
+
+# PDFs go through vision extraction for scanned pages / charts;
+# capped separately inside the parse stage
+INGEST_OCR_CONCURRENCY = int(os.getenv("INGEST_OCR_CONCURRENCY", "2"))
+
+SUPPORTED_MIMES = (CSV_MIME, GOOGLE_DOC_MIME, DOCX_MIME, PDF_MIME)
+
+
+def chunk_hash(text: str) -> str:
+    """Content address of a chunk; the Qdrant point id is derived from file_id + this."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestionStages:
+    """
+    One document moves through the stages as a job dict. A stage
+    that has nothing more to do sets job["status"]:
+
+        "indexed"  chunks are in Qdrant and BM25
+        "skipped"  nothing to index (still marked ingested, as before)
+        "failed"   unexpected error, left unmarked and retried next run
+
+    Chunks are identified by content (chunk_hash). job["replace"] is
+    set for a tracked file whose revision changed; with the file's
+    chunk manifest in job["manifest"], only chunks that are not in it
+    are enriched, embedded and indexed, and only chunks that are no
+    longer there are deleted. Without a manifest (files indexed with
+    positional ids, renamed files) all old chunks are swapped out.
+    An edited file with nothing left to index loses its old chunks.
+
+    No stage touches TrackerDB; main() records each finished job.
+    """
+
+    def __init__(self, deps: dict):
+        self.deps = deps
+        self._ocr = threading.BoundedSemaphore(max(1, INGEST_OCR_CONCURRENCY))
+        # the CSV parser writes through one shared csv_store.db connection
+        self._csv = threading.Lock()
+
+    @staticmethod
+    def new_job(doc: dict, replace: bool = False, manifest: Optional[Set[str]] = None) -> dict:
+        return {
+            "doc":      doc,
+            "status":   None,
+            "chunks":   [],
+            "local":    [],
+            "replace":  replace,
+            "manifest": manifest,
+        }
+
+    @staticmethod
+    def finished(job: dict) -> bool:
+        return job["status"] is not None
+
+    @staticmethod
+    def on_error(stage: str, job: dict, exc: Exception) -> dict:
+        logger.opt(exception=exc).error(f"Ingestion failed at {stage} → {job['doc']['name']} | {exc}")
+        temp_path = job.pop("temp_path", None)
+        if temp_path and os.path.exists(temp_path):
+            os.unlink(temp_path)
+        job["status"] = "failed"
+        return job
+
+    def _extraction_failed(self, job: dict, exc: Exception) -> dict:
+        logger.warning(f"Extraction failed → {job['doc']['name']} | {exc}")
+        job["status"] = "skipped"
+        return job
+
+    def _nothing_to_index(self, job: dict) -> dict:
+        # an edited file that is now empty must not keep its old chunks
+        if job["replace"]:
+            file_id = job["doc"]["id"]
+            self.deps["vector_store"].delete_by_file_id(file_id)
+            self.deps["bm25"].delete_by_file_id(file_id, persist=False)
+            job["chunk_hashes"] = []
+        job["status"] = "skipped"
+        return job
+
+    def stages(self) -> List[Stage]:
+        return [
+            Stage(name, getattr(self, name), workers=STAGE_WORKERS[name])
+            for name in ("download", "parse", "chunk", "enrich", "embed", "index")
+        ]
 
-    logger.info("DEBUG: main() started")
+    # -----------------------------
+    # Stages
+    # -----------------------------
+    def download(self, job: dict) -> dict:
+        doc = job["doc"]
 
-    vector_store = VectorStore()
-    embedder = BGEEmbedder()
-    tracker = TrackerDB()
-    sqlite_store = SQLiteStore()
-    parser_router = ParserRouter()
-    chunk_router = ChunkingRouter()
+        if doc["mimeType"] not in SUPPORTED_MIMES:
+            job["status"] = "skipped"
+            return job
 
-    bm25 = BM25Retriever()
-    bm25.load()
+        if doc["mimeType"] in (DOCX_MIME, PDF_MIME):
+            with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                job["temp_path"] = tmp.name
+            try:
+                download_drive_file(doc["id"], job["temp_path"])
+            except Exception as e:
+                os.unlink(job.pop("temp_path"))
+                return self._extraction_failed(job, e)
 
-    query_generator = QueryGenerator()
+        return job
 
-    docs = list_drive_documents()
+    def parse(self, job: dict) -> dict:
+        doc = job["doc"]
+        file_name = doc["name"]
+        parser = self.deps["parser_router"].route(file_name)
 
-    if not docs:
-        logger.info("No documents found")
-        return
+        try:
+            if doc["mimeType"] == CSV_MIME:
+                with self._csv:
+                    parser.parse(doc["id"], file_name)
+                job["status"] = "skipped"
+                return job
 
-    local_store = []
+            if doc["mimeType"] == GOOGLE_DOC_MIME:
+                text = parser.parse(doc["id"])
 
-    drive_file_ids = {doc["id"] for doc in docs}
-    tracked_file_ids = tracker.get_all_file_ids()
+            else:
+                temp_path = job.pop("temp_path")
+                try:
+                    if doc["mimeType"] == PDF_MIME:
+                        with self._ocr:
+                            text = parser.parse(temp_path)
+                    else:
+                        text = parser.parse(temp_path)
+                finally:
+                    os.unlink(temp_path)
 
-    deleted_file_ids = tracked_file_ids - drive_file_ids
+        except Exception as e:
+            return self._extraction_failed(job, e)
 
-    for file_id in deleted_file_ids:
+        if not text or not text.strip():
+            logger.warning(f"No text → {file_name}")
+            return self._nothing_to_index(job)
+
+        job["text"] = text
+        return job
+
+    def chunk(self, job: dict) -> dict:
+        chunker = self.deps["chunk_router"].route(job["doc"]["mimeType"])
+
+        # a chunk repeated within a file is indexed once
+        chunks, hashes, seen = [], [], set()
+        for text in chunker.chunk(job.pop("text")):
+            h = chunk_hash(text)
+            if h not in seen:
+                seen.add(h)
+                chunks.append(text)
+                hashes.append(h)
+
+        job["chunks"] = chunks
+        job["chunk_hashes"] = hashes
+
+        if not chunks:
+            return self._nothing_to_index(job)
+
+        manifest = job["manifest"]
+
+        if manifest is None:
+            job["new"] = list(range(len(chunks)))
+            job["removed"] = []
+        else:
+            job["new"] = [i for i, h in enumerate(hashes) if h not in manifest]
+            job["removed"] = sorted(manifest.difference(hashes))
+
+            logger.info(
+                f"Chunk diff → {job['doc']['name']} | new={len(job['new'])} "
+                f"removed={len(job['removed'])} unchanged={len(chunks) - len(job['new'])}"
+            )
+
+        return job
+
+    def enrich(self, job: dict) -> dict:
+        chunks = [job["chunks"][i] for i in job["new"]]
+        synthetic_queries_all = []
+
+        for i in range(0, len(chunks), 10):
+            batch = chunks[i:i + 10]
+            batch_queries = self.deps["query_generator"].generate_queries_batch(batch)
+            synthetic_queries_all.extend(batch_queries)
+
+        logger.info(f"Query generation done → {job['doc']['name']}")
+
+        job["synthetic_queries"] = synthetic_queries_all
+        return job
+
+    def embed(self, job: dict) -> dict:
+        chunks = [job["chunks"][i] for i in job["new"]]
+        job["embeddings"] = self.deps["embedder"].embed(chunks) if chunks else []
+        return job
+
+    def index(self, job: dict) -> dict:
+        file_id   = job["doc"]["id"]
+        file_name = job["doc"]["name"]
+        synthetic_queries_all = job.pop("synthetic_queries")
+
+        # only the new chunks; unchanged ones stay as indexed
+        chunks = [job["chunks"][i] for i in job["new"]]
+        hashes = [job["chunk_hashes"][i] for i in job["new"]]
+
+        ids = [f"{file_id}:{h}" for h in hashes]
+
+        metadatas = []
+
+        # chunk_hash is the chunk's id: a position (chunk_id) would
+        # collide with the unchanged chunks' positions on re-ingest
+        for n in range(len(chunks)):
+            meta = {
+                "file_id":            file_id,
+                "file_name":          file_name,
+                "chunk_hash":         hashes[n],
+                "synthetic_queries":  synthetic_queries_all[n] if n < len(synthetic_queries_all) else [],
+                "lexical":            compute_features(chunks[n], file_name),
+            }
+
+            metadatas.append(meta)
+
+            job["local"].append({
+                "id":       ids[n],
+                "text":     chunks[n],
+                "metadata": meta
+            })
+
+        if job["manifest"] is not None:
+            self.deps["vector_store"].update_file_chunks(
+                embeddings=job.pop("embeddings"),
+                documents=chunks,
+                metadatas=metadatas,
+                ids=ids,
+                removed_ids=[f"{file_id}:{h}" for h in job["removed"]],
+            )
+
+            self.deps["bm25"].update_file_chunks(
+                file_id,
+                documents=chunks,
+                metadatas=metadatas,
+                removed_hashes=job["removed"],
+                persist=False,
+            )
+
+        elif job["replace"]:
+            self.deps["vector_store"].replace_file(
+                file_id,
+                embeddings=job.pop("embeddings"),
+                documents=chunks,
+                metadatas=metadatas,
+                ids=ids,
+            )
+
+            self.deps["bm25"].replace_file(
+                file_id,
+                documents=chunks,
+                metadatas=metadatas,
+                persist=False,
+            )
+
+        else:
+            self.deps["vector_store"].add_chunks(
+                embeddings=job.pop("embeddings"),
+                documents=chunks,
+                metadatas=metadatas,
+                ids=ids,
+            )
+
+            self.deps["bm25"].add_chunks(
+                documents=chunks,
+                metadatas=metadatas,
+                persist=False,
+            )
+
+        job["status"] = "indexed"
+        return job
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+
+def open_deps() -> dict:
+    """
+    Stores, indexes and providers for ingestion. main() opens them per
+    run; the changes poller keeps one set for the life of the process.
+    """
+
+    vector_store = VectorStore()
+    tracker = TrackerDB()
+    sqlite_store = SQLiteStore()
+
+    bm25 = BM25Retriever()
+    bm25.load()
+
+    return {
+        "vector_store":    vector_store,
+        "tracker":         tracker,
+        "sqlite_store":    sqlite_store,
+        "embedder":        get_embedder(),
+        "parser_router":   ParserRouter(),
+        "chunk_router":    ChunkingRouter(),
+        "query_generator": QueryGenerator(),
+        "bm25":            bm25,
+    }
+
+
+def remove_files(deps: dict, file_ids):
+    """
+    Drop the files from Qdrant, BM25 (in memory) and the CSV store.
+    Their TrackerDB rows are removed by the caller once BM25 is
+    persisted, so an interrupted run retries the deletion.
+    """
+    vector_store = deps["vector_store"]
+    bm25 = deps["bm25"]
+    tracker = deps["tracker"]
+
+    for file_id in file_ids:
         file_name = tracker.get_file_name(file_id)
 
         logger.info(f"File deleted → {file_name}")
 
         vector_store.delete_by_file_id(file_id)
+        bm25.delete_by_file_id(file_id, persist=False)
 
         if file_name:
             try:
-                sqlite_store.drop_table(file_name)
+                deps["sqlite_store"].drop_table(file_name)
             except Exception:
                 pass
 
-        tracker.remove(file_id)
+
+def ingest_documents(deps: dict, docs: List[dict], deleted_file_ids=()) -> dict:
+    """
+    Remove deleted_file_ids, then ingest whichever of docs are new or
+    changed since they were last indexed. Returns the job counts.
+    """
+
+    tracker = deps["tracker"]
+    bm25 = deps["bm25"]
+
+    local_store = []
+
+    remove_files(deps, deleted_file_ids)
+
+    # one query for every tracked file and the revision it was indexed at
+    revisions = tracker.get_all_revisions()
+
+    stages = IngestionStages(deps)
+
+    # TrackerDB is only read and written on this thread; stages
+    # report back and outcomes are recorded once the run is persisted
+    pending = []
+    detected = {"new": 0, "changed": 0, "unchanged": 0}
 
     for doc in docs:
 
         file_id   = doc["id"]
         file_name = doc["name"]
-        mime_type = doc["mimeType"]
 
         # Build file_url once, reuse everywhere
         file_url = f"https://drive.google.com/file/d/{file_id}/view"
@@ -239,117 +568,177 @@ def main():
         except Exception as e:
             logger.warning(f"Failed to update latest_documents → {file_name} | {e}")
 
-        # THEN skip if already ingested — after updating latest_documents
-        if tracker.is_ingested(file_id):
-            continue
-
-        logger.info(f"New file detected → {file_name}")
+        # THEN skip if already ingested at this revision — after updating latest_documents
+        stored = revisions.get(file_id)
+        revision = revision_of(doc)
 
-        text = ""
+        if stored is None:
+            logger.info(f"New file detected → {file_name}")
+            detected["new"] += 1
+            pending.append(stages.new_job(doc))
+            continue
 
-        try:
-            if mime_type == CSV_MIME:
-                parser = parser_router.route(file_name)
-                parser.parse(file_id, file_name)
-                tracker.mark_ingested(file_id, file_name, file_url)
-                logger.info(f"Finished → {file_name}")
-                continue
-
-            if mime_type == GOOGLE_DOC_MIME:
-                parser = parser_router.route(file_name)
-                text = parser.parse(file_id)
-
-            elif mime_type in [DOCX_MIME, PDF_MIME]:
-                with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                    download_drive_file(file_id, tmp.name)
-                    temp_path = tmp.name
-
-                parser = parser_router.route(file_name)
-                text = parser.parse(temp_path)
-                os.unlink(temp_path)
+        if revision_changed(stored, revision) or stored["file_name"] != file_name:
+            logger.info(f"Changed file detected → {file_name}")
+            detected["changed"] += 1
 
-            else:
-                tracker.mark_ingested(file_id, file_name, file_url)
-                logger.info(f"Finished → {file_name}")
-                continue
+            # a rename rewrites every chunk's file_name, so no diff;
+            # files indexed before manifests have none to diff against
+            manifest = None
+            if stored["file_name"] == file_name:
+                manifest = tracker.get_chunk_manifest(file_id) or None
 
-        except Exception as e:
-            logger.warning(f"Extraction failed → {file_name} | {e}")
-            tracker.mark_ingested(file_id, file_name, file_url)
+            pending.append(stages.new_job(doc, replace=True, manifest=manifest))
             continue
 
-        if not text or not text.strip():
-            logger.warning(f"No text → {file_name}")
-            tracker.mark_ingested(file_id, file_name, file_url)
-            continue
+        detected["unchanged"] += 1
 
-        chunker = chunk_router.route(mime_type)
-        chunks = chunker.chunk(text)
+        # ingested before revisions were tracked: take the listed one
+        # as the baseline instead of re-ingesting everything once
+        if not any(stored.get(field) for field in revision) and any(revision.values()):
+            tracker.set_revision(file_id, revision)
 
-        if not chunks:
-            tracker.mark_ingested(file_id, file_name, file_url)
-            continue
+    logger.info(
+        f"Change detection | new={detected['new']} changed={detected['changed']} "
+        f"unchanged={detected['unchanged']} deleted={len(deleted_file_ids)}"
+    )
 
-        synthetic_queries_all = []
+    pipeline = StagedPipeline(
+        stages.stages(),
+        finished=stages.finished,
+        on_error=stages.on_error,
+    )
 
-        for i in range(0, len(chunks), 10):
-            batch = chunks[i:i + 10]
-            batch_queries = query_generator.generate_queries_batch(batch)
-            synthetic_queries_all.extend(batch_queries)
+    counts = {"indexed": 0, "skipped": 0, "failed": 0}
+    total_chunks = 0
+    reused_chunks = 0
+    start = time.perf_counter()
 
-        logger.info(f"Query generation done → {file_name}")
+    finished = []
 
-        embeddings = embedder.embed(chunks)
-        ids = [f"{file_id}_{i}" for i in range(len(chunks))]
+    for job in pipeline.run(pending):
+        counts[job["status"]] += 1
+        local_store.extend(job["local"])
 
-        metadatas = []
+        if job["status"] == "indexed":
+            total_chunks += len(job["new"])
+            reused_chunks += len(job["chunks"]) - len(job["new"])
 
-        for i in range(len(chunks)):
-            meta = {
-                "file_id":            file_id,
-                "file_name":          file_name,
-                "chunk_id":           i,
-                "synthetic_queries":  synthetic_queries_all[i] if i < len(synthetic_queries_all) else []
-            }
+        if job["status"] != "failed":
+            finished.append(job)
 
-            metadatas.append(meta)
+    # BM25 deltas are merged into the on-disk segment once per run
+    # rather than once per file, and only if the run changed anything
+    # (a new generation makes every API process reload the segment).
+    # TrackerDB is updated only after that: if the run or the persist
+    # raises, nothing is recorded and the next run redoes the work,
+    # which is idempotent for Qdrant.
+    bm25.persist_if_dirty()
 
-            local_store.append({
-                "id":       ids[i],
-                "text":     chunks[i],
-                "metadata": meta
-            })
+    for file_id in deleted_file_ids:
+        tracker.remove(file_id)
 
-        vector_store.add_chunks(
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas,
-            ids=ids,
+    for job in finished:
+        doc = job["doc"]
+        tracker.mark_ingested(
+            doc["id"],
+            doc["name"],
+            f"https://drive.google.com/file/d/{doc['id']}/view",
+            revision=revision_of(doc),
         )
+        if "chunk_hashes" in job:
+            tracker.set_chunk_manifest(doc["id"], job["chunk_hashes"])
+        logger.info(f"Finished → {doc['name']}")
+
+    elapsed = time.perf_counter() - start
+    processed = sum(counts.values())
+
+    logger.info(
+        f"Ingestion throughput | {processed} docs in {elapsed:.1f}s "
+        f"| {processed / elapsed * 60 if elapsed else 0.0:.1f} docs/min "
+        f"| indexed={counts['indexed']} skipped={counts['skipped']} failed={counts['failed']} "
+        f"| chunks={total_chunks} unchanged_chunks={reused_chunks}"
+    )
+    pipeline.log_stats()
+
+    if local_store:
+        try:
+            with open("local_chunks.json", "w", encoding="utf-8") as f:
+                json.dump(local_store, f, indent=2)
+            logger.info("Local JSON saved")
 
-        bm25.add_chunks(
-            documents=chunks,
-            metadatas=metadatas,
-        )
+        except Exception as e:
+            logger.warning(f"Failed to save JSON: {e}")
 
-        tracker.mark_ingested(file_id, file_name, file_url)
+    return counts
 
-        logger.info(f"Finished → {file_name}")
 
-    try:
-        with open("local_chunks.json", "w", encoding="utf-8") as f:
-            json.dump(local_store, f, indent=2)
-        logger.info("Local JSON saved")
+def main(deps: Optional[dict] = None):
 
-    except Exception as e:
-        logger.warning(f"Failed to save JSON: {e}")
+    logger.info("DEBUG: main() started")
+
+    deps = deps or open_deps()
+
+    docs = list_drive_documents()
+
+    if not docs:
+        logger.info("No documents found")
+        return
+
+    drive_file_ids = {doc["id"] for doc in docs}
+    deleted_file_ids = deps["tracker"].get_all_file_ids() - drive_file_ids
+
+    ingest_documents(deps, docs, deleted_file_ids)
 
     logger.info("Ingestion completed")
     logger.info("DEBUG: main() finished")
 
 
-def run_sync(verbose: bool = True):
-    main()
+# -----------------------------
+# Drive changes feed
+#
+# Polls changes.list from the page token kept in TrackerDB and
+# ingests only files that were added, edited, trashed or moved
+# since the last poll. main() (the full listing) stays the
+# reconciliation pass for anything the feed missed, including
+# files that failed during a poll.
+# -----------------------------
+
+DRIVE_CHANGES_TOKEN_KEY = "drive_start_page_token"
+
+
+def sync_changes(deps: Optional[dict] = None) -> dict:
+    """One poll of the Drive changes feed; returns the job counts."""
+
+    deps = deps or open_deps()
+    tracker = deps["tracker"]
+
+    token = tracker.get_sync_state(DRIVE_CHANGES_TOKEN_KEY)
+
+    if token is None:
+        # first poll: take the feed position before the full listing,
+        # so changes made while it runs are picked up next time
+        token = get_drive_start_page_token()
+        logger.info("No Drive changes token yet, running full sync first")
+        main(deps)
+        tracker.set_sync_state(DRIVE_CHANGES_TOKEN_KEY, token)
+        return {}
+
+    changed, removed_ids, next_token = list_drive_changes(token)
+
+    # the feed covers the whole Drive; only tracked files are removed
+    deleted_file_ids = set(removed_ids) & tracker.get_all_file_ids()
+
+    counts = {}
+    if changed or deleted_file_ids:
+        counts = ingest_documents(deps, changed, deleted_file_ids)
+
+    tracker.set_sync_state(DRIVE_CHANGES_TOKEN_KEY, next_token)
+    return counts
+
+
+def run_sync(verbose: bool = True, deps: Optional[dict] = None):
+    main(deps)
 
 
 if __name__ == "__main__":
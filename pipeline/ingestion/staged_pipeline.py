@@ -0,0 +1,201 @@
+# src/ingestion/staged_pipeline.py
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from pipeline.utils.logger import logger
+from pipeline.utils.metrics import metrics
+
+# ----------------------------------------------------------
+# Staged producer / consumer pipeline
+#
+#   source → [q] → stage 1 (n workers) → [q] → stage 2 → ... → results
+#
+# Every stage has its own worker threads and a bounded input queue,
+# so a slow stage backs up the ones before it instead of letting
+# work pile up in memory, and every stage keeps working on the next
+# item while later stages handle earlier ones.
+#
+# A stage function returns the item to pass on. Items for which
+# `finished(item)` is true skip the remaining stages; an exception
+# goes to `on_error(stage, item, exc)`, whose return value is
+# treated as finished.
+# ----------------------------------------------------------
+
+STAGE_QUEUE_SIZE = int(os.getenv("INGEST_STAGE_QUEUE_SIZE", "4"))
+
+QUEUE_WAIT_BUCKETS_MS = (1, 10, 100, 1000, 10000, 60000)
+
+_DONE = object()
+
+
+class Stage:
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = STAGE_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+
+        self._lock = threading.Lock()
+        self._running = 0
+
+        self.items = 0
+        self.busy = 0.0
+        self.wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, busy: float, wait: float):
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        metrics.inc(f"ingest_{self.name}_items")
+        metrics.observe(f"ingest_{self.name}_queue_wait_ms", wait * 1000, QUEUE_WAIT_BUCKETS_MS)
+
+
+class StagedPipeline:
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        finished: Callable = lambda item: False,
+        on_error: Optional[Callable] = None,
+    ):
+        self.stages = stages
+        self.finished = finished
+        self.on_error = on_error or self._reraise
+
+        self._results: "queue.Queue" = queue.Queue()
+        self._elapsed = 0.0
+
+    @staticmethod
+    def _reraise(stage, item, exc):
+        raise exc
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+    def _forward(self, index: int, item):
+        if index >= len(self.stages) or self.finished(item):
+            self._results.put(item)
+        else:
+            # blocks while the next stage is full (backpressure)
+            self.stages[index].queue.put((item, time.perf_counter()))
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+
+        while True:
+            entry = stage.queue.get()
+
+            if entry is _DONE:
+                break
+
+            item, enqueued = entry
+            start = time.perf_counter()
+
+            try:
+                item = stage.fn(item)
+            except Exception as e:
+                try:
+                    item = self.on_error(stage.name, item, e)
+                except Exception:
+                    logger.exception(f"Pipeline stage '{stage.name}' error handler failed")
+                    item = None
+
+                stage.record(time.perf_counter() - start, start - enqueued)
+
+                if item is not None:
+                    self._results.put(item)
+                continue
+
+            stage.record(time.perf_counter() - start, start - enqueued)
+            self._forward(index + 1, item)
+
+        # last worker out closes the next stage
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+
+        if last:
+            if index + 1 < len(self.stages):
+                following = self.stages[index + 1]
+                for _ in range(following.workers):
+                    following.queue.put(_DONE)
+            else:
+                self._results.put(_DONE)
+
+    def _feed(self, items: Iterable):
+        first = self.stages[0]
+        try:
+            for item in items:
+                self._forward(0, item)
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_DONE)
+
+    # -----------------------------
+    # Run
+    # -----------------------------
+    def run(self, items: Iterable) -> Iterator:
+        """Yield items as they come out of the pipeline (completion order)."""
+
+        start = time.perf_counter()
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            stage._running = stage.workers
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(index,),
+                    name=f"ingest-{stage.name}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        feeder = threading.Thread(target=self._feed, args=(items,), name="ingest-source", daemon=True)
+        feeder.start()
+
+        try:
+            while True:
+                item = self._results.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self._elapsed = time.perf_counter() - start
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+
+    def stats(self) -> Dict[str, dict]:
+        elapsed = self._elapsed or 1e-9
+        return {
+            stage.name: {
+                "workers": stage.workers,
+                "items": stage.items,
+                "throughput_per_min": stage.items / elapsed * 60,
+                # fraction of the stage's worker time spent working
+                "occupancy": stage.busy / (stage.workers * elapsed),
+                "avg_queue_wait_s": stage.wait / stage.items if stage.items else 0.0,
+                "max_queue_wait_s": stage.max_wait,
+            }
+            for stage in self.stages
+        }
+
+    def log_stats(self):
+        for name, s in self.stats().items():
+            logger.info(
+                f"Stage {name:<8} | workers={s['workers']} items={s['items']} "
+                f"| {s['throughput_per_min']:.1f}/min | occupancy={s['occupancy']:.0%} "
+                f"| queue wait avg={s['avg_queue_wait_s']:.2f}s max={s['max_queue_wait_s']:.2f}s"
+            )
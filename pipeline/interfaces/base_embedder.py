@@ -1,9 +1,16 @@
 from abc import ABC, abstractmethod
 from typing import List
 
+import numpy as np
+
 
 class BaseEmbedder(ABC):
 
     @abstractmethod
-    def embed(self, texts: List[str]) -> List[List[float]]:
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts as one contiguous float32 array of shape
+        (len(texts), dim), rows in input order. Convert to lists only
+        at a wire boundary (Qdrant payloads, JSON).
+        """
         pass
@@ -107,7 +107,10 @@ def generate_answer(
         chunk_id = meta.get("chunk_id")
         file_id = meta.get("file_id")
 
-        chunk_key = f"{file_id}_{chunk_id}"
+        chunk_key = (
+            f"{file_id}:{meta['chunk_hash']}" if meta.get("chunk_hash")
+            else f"{file_id}_{chunk_id}"
+        )
 
         if chunk_key in seen_chunk_ids:
             continue
@@ -1,10 +1,11 @@
-from typing import TypedDict, List, Any
+from typing import TypedDict, List, Any, Optional
 from langgraph.graph import StateGraph, END
 from pipeline.utils.metrics import metrics
 from pipeline.utils.logger import logger
 from pipeline.providers.retrievers.hybrid_retriever import HybridRetriever
 from pipeline.utils.query_rewriter import QueryRewriter
 from pipeline.llm.rag import generate_answer
+from pipeline.utils.request_context import RequestContext
 
 
 class RAGState(TypedDict):
@@ -25,6 +26,7 @@ class RAGState(TypedDict):
     confidence: float
     grounding_score: float
     next_step: str
+    context: Any
 
 
 rewriter = QueryRewriter()
@@ -133,7 +135,7 @@ def retrieve_node(state: RAGState) -> RAGState:
 
     try:
         docs, metas, scores = get_retriever().retrieve(
-            query, k, rewrite_before_retrieve=False
+            query, k, rewrite_before_retrieve=False, context=state.get("context")
         )
     except Exception as e:
         print(f"❌ RETRIEVAL EXCEPTION: {e}")
@@ -373,13 +375,17 @@ def build_graph():
     return graph.compile()
 
 
-def run_pipeline(query: str) -> dict:
+def run_pipeline(query: str, context: Optional[RequestContext] = None) -> dict:
     if not query or not query.strip():
         return {"answer": "No query provided."}
 
     metrics.reset()
     app = get_app()
 
+    # shared with the API's cache lookup / save when it passes one in
+    if context is None:
+        context = RequestContext(query)
+
     result = app.invoke(
         {
             "query": query.strip(),
@@ -398,7 +404,8 @@ def run_pipeline(query: str) -> dict:
             "execution_path": [],
             "confidence": 0.0,
             "grounding_score": 0.0,
-            "next_step": ""
+            "next_step": "",
+            "context": context
         },
         config={"recursion_limit": 50}
     )
@@ -411,5 +418,6 @@ def run_pipeline(query: str) -> dict:
         "confidence": float(result.get("confidence", 0.0)),
         "grounding_score": float(result.get("grounding_score", 0.0)),
         "retrieval_score": float(result.get("retrieval_score", 0.0)),
-        "sources": result.get("retrieved_metas", [])
+        "sources": result.get("retrieved_metas", []),
+        "embed_calls": context.embed_calls
     }
@@ -0,0 +1,160 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from pipeline.interfaces.base_embedder import BaseEmbedder
+from pipeline.utils.logger import logger
+from pipeline.utils.metrics import Histogram
+
+# ----------------------------------------------------------
+# Micro-batching embedding dispatcher
+#
+# Concurrent embed() calls (one query per /chat request) are held
+# for at most MAX_WAIT_MS, or until MAX_BATCH texts are waiting,
+# then sent to the backend as one batch; each caller gets its own
+# slice of the result back through a Future.
+# ----------------------------------------------------------
+
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("EMBED_MICROBATCH_MAX_WAIT_MS", "5"))
+MICROBATCH_MAX_SIZE = int(os.getenv("EMBED_MICROBATCH_MAX_SIZE", "32"))
+MICROBATCH_WORKERS = int(os.getenv("EMBED_MICROBATCH_WORKERS", "4"))
+
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_Request = Tuple[List[str], Future]
+
+
+class MicroBatchingEmbedder(BaseEmbedder):
+
+    def __init__(
+        self,
+        embedder: BaseEmbedder,
+        max_wait_ms: float = MICROBATCH_MAX_WAIT_MS,
+        max_batch: int = MICROBATCH_MAX_SIZE,
+        workers: int = MICROBATCH_WORKERS,
+    ):
+        self.embedder = embedder
+        self.model_name = getattr(embedder, "model_name", type(embedder).__name__)
+
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed-dispatch")
+
+        self._collector: Optional[threading.Thread] = None
+        self._collector_lock = threading.Lock()
+
+        # process-wide, unlike metrics.data which run_pipeline resets
+        # on every request
+        self._queue_depth = Histogram(QUEUE_DEPTH_BUCKETS)
+        self._batch_size = Histogram(BATCH_SIZE_BUCKETS)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth_now": self.queue_depth(),
+            "queue_depth":     self._queue_depth.snapshot(),
+            "batch_size":      self._batch_size.snapshot(),
+        }
+
+    # -----------------------------
+    # Caller side
+    # -----------------------------
+    def embed(self, texts: List[str]) -> np.ndarray:
+
+        # a single string yields a single embedding
+        if isinstance(texts, str):
+            texts = [texts]
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        texts = list(texts)
+
+        # already a full batch (ingestion): nothing to gain by waiting
+        if len(texts) >= self.max_batch:
+            return self.embedder.embed(texts)
+
+        self._ensure_collector()
+
+        future: Future = Future()
+        self._queue.put((texts, future))
+
+        return future.result()
+
+    def _ensure_collector(self):
+        if self._collector is None:
+            with self._collector_lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(
+                        target=self._collect_forever,
+                        name="embed-microbatch",
+                        daemon=True,
+                    )
+                    self._collector.start()
+
+    # -----------------------------
+    # Collector side
+    # -----------------------------
+    def _collect_forever(self):
+        while True:
+            try:
+                self._pool.submit(self._dispatch, self._collect())
+            except Exception:
+                logger.exception("Embedding micro-batch collector error")
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+
+        self._queue_depth.observe(self._queue.qsize())
+
+        return batch
+
+    def _dispatch(self, batch: List[_Request]):
+
+        # identical texts across callers (same query from the retriever
+        # and the semantic cache) are embedded once
+        unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+
+        # batch_size count = number of micro-batches dispatched
+        self._batch_size.observe(len(unique))
+
+        try:
+            vectors = self.embedder.embed(unique)
+
+            if len(vectors) != len(unique):
+                raise Exception(
+                    f"Embedder returned {len(vectors)} vectors for {len(unique)} texts"
+                )
+
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        row = {text: i for i, text in enumerate(unique)}
+
+        for texts, future in batch:
+            future.set_result(vectors[[row[text] for text in texts]])
@@ -1,17 +1,52 @@
 import os
+import random
+import threading
+import time
 import requests
 import certifi
-from typing import List
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from pipeline.interfaces.base_embedder import BaseEmbedder
+from pipeline.utils.logger import logger
+from pipeline.utils.metrics import metrics
 
 
 HF_MODEL = "BAAI/bge-small-en-v1.5"
 HF_API_URL = f"https://router.huggingface.co/hf-inference/models/{HF_MODEL}"
 
+# Batches are capped by text count and by total characters so one
+# large document never becomes one giant request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "24000"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_TIMEOUT = int(os.getenv("EMBED_TIMEOUT", "180"))
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+PAYLOAD_TOO_LARGE = 413
+
+
+class EmbeddingAPIError(Exception):
+
+    def __init__(self, status_code: int, text: str, retry_after: Optional[float] = None):
+        super().__init__(
+            f"HuggingFace embedding API error: {status_code} | {text}"
+        )
+        self.status_code = status_code
+        self.retry_after = retry_after
+
 
 class BGEEmbedder(BaseEmbedder):
 
-    def __init__(self):
+    model_name = HF_MODEL
+
+    def __init__(
+        self,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_batch_chars: int = EMBED_BATCH_MAX_CHARS,
+        workers: int = EMBED_WORKERS,
+    ):
         self.api_token = os.getenv("HF_API_TOKEN")
         if not self.api_token:
             raise ValueError("HF_API_TOKEN not found in environment variables.")
@@ -21,14 +56,24 @@ class BGEEmbedder(BaseEmbedder):
             "Content-Type": "application/json"
         }
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
-        """
-        Batch embedding call to HuggingFace Inference Router.
-        Adds SSL-safe handling + retry fallback.
-        """
+        # batch_size shrinks on 413 and stays shrunk for later calls
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.workers = workers
 
-        if not texts:
-            return []
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+        # shared cool-down after 429/503 so every worker backs off
+        self._cooldown_until = 0.0
+        self._stats_lock = threading.Lock()
+
+        self.last_stats = {}
+
+    # -----------------------------
+    # Single HTTP request
+    # -----------------------------
+    def _post(self, texts: List[str]) -> np.ndarray:
 
         payload = {
             "inputs": texts
@@ -40,7 +85,7 @@ class BGEEmbedder(BaseEmbedder):
                 HF_API_URL,
                 headers=self.headers,
                 json=payload,
-                timeout=180,
+                timeout=EMBED_TIMEOUT,
                 verify=certifi.where()
             )
 
@@ -50,32 +95,198 @@ class BGEEmbedder(BaseEmbedder):
                 HF_API_URL,
                 headers=self.headers,
                 json=payload,
-                timeout=180,
+                timeout=EMBED_TIMEOUT,
                 verify=False
             )
 
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Embedding request failed: {str(e)}")
-
         if response.status_code != 200:
-            raise Exception(
-                f"HuggingFace embedding API error: "
-                f"{response.status_code} | {response.text}"
-            )
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+
+            raise EmbeddingAPIError(response.status_code, response.text, retry_after)
 
         result = response.json()
 
-        # Handle different HF response formats safely
+        # Handle different HF response formats safely; the JSON lists
+        # are turned into float32 right here at the wire boundary
         if isinstance(result, list):
 
             # Case 1: batch embeddings [[...], [...]]
             if result and isinstance(result[0], list):
-                return result
+                return np.asarray(result, dtype=np.float32)
 
             # Case 2: single embedding [....]
             if result and isinstance(result[0], float):
-                return [result]
+                return np.asarray([result], dtype=np.float32)
 
         raise Exception(
             f"Unexpected embedding response format: {type(result)} | {result}"
         )
+
+    # -----------------------------
+    # Batching
+    # -----------------------------
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        batches = []
+        current, chars = [], 0
+
+        for text in texts:
+            if current and (
+                len(current) >= self.batch_size
+                or chars + len(text) > self.max_batch_chars
+            ):
+                batches.append(current)
+                current, chars = [], 0
+
+            current.append(text)
+            chars += len(text)
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def _count(self, stats: dict, key: str, n: int = 1):
+        with self._stats_lock:
+            stats[key] += n
+
+    def _wait_for_cooldown(self):
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _embed_batch(self, texts: List[str], stats: dict) -> np.ndarray:
+        """
+        One batch with retries: backs off on 429/5xx and network errors,
+        splits in half on 413 (and lowers batch_size for later batches).
+        """
+
+        attempt = 0
+
+        while True:
+
+            self._wait_for_cooldown()
+            self._count(stats, "requests")
+
+            try:
+                vectors = self._post(texts)
+
+                if len(vectors) != len(texts):
+                    raise Exception(
+                        f"Embedding API returned {len(vectors)} vectors for {len(texts)} texts"
+                    )
+
+                return vectors
+
+            except EmbeddingAPIError as e:
+
+                if e.status_code == PAYLOAD_TOO_LARGE and len(texts) > 1:
+                    half = len(texts) // 2
+                    self.batch_size = max(1, min(self.batch_size, half))
+                    self._count(stats, "splits")
+                    logger.warning(
+                        f"Embedding payload too large ({len(texts)} texts), "
+                        f"splitting; batch_size now {self.batch_size}"
+                    )
+                    return np.concatenate([
+                        self._embed_batch(texts[:half], stats),
+                        self._embed_batch(texts[half:], stats),
+                    ])
+
+                if e.status_code not in RETRYABLE_STATUS or attempt >= EMBED_MAX_RETRIES:
+                    raise
+
+                delay = e.retry_after or self._backoff(attempt)
+
+                # everyone pauses, not just this worker
+                self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+
+                if attempt >= EMBED_MAX_RETRIES:
+                    raise Exception(f"Embedding request failed: {str(e)}")
+
+                delay = self._backoff(attempt)
+
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Embedding request failed: {str(e)}")
+
+            attempt += 1
+            self._count(stats, "retries")
+            metrics.inc("embedding_retries")
+
+            logger.warning(f"Embedding batch retry {attempt}/{EMBED_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(30.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="bge-embed",
+                    )
+        return self._pool
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Batch embedding calls to HuggingFace Inference Router.
+        Input is split into count/character-capped batches that run
+        concurrently on a bounded pool; vectors come back in input order
+        as one float32 array.
+        Adds SSL-safe handling + retry / backoff.
+        """
+
+        # a single string yields a single embedding
+        if isinstance(texts, str):
+            texts = [texts]
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        start = time.perf_counter()
+        stats = {"requests": 0, "retries": 0, "splits": 0}
+
+        batches = self._make_batches(list(texts))
+
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0], stats)]
+        else:
+            pool = self._get_pool()
+            futures = [pool.submit(self._embed_batch, batch, stats) for batch in batches]
+            results = [future.result() for future in futures]
+
+        vectors = results[0] if len(results) == 1 else np.concatenate(results)
+
+        elapsed = time.perf_counter() - start
+
+        stats.update({
+            "texts": len(texts),
+            "chars": sum(len(t) for t in texts),
+            "batches": len(batches),
+            "seconds": elapsed,
+            "texts_per_sec": len(texts) / elapsed if elapsed else 0.0,
+        })
+        self.last_stats = stats
+
+        metrics.inc("embedding_requests", stats["requests"])
+        metrics.inc("embedding_texts", len(texts))
+
+        if len(batches) > 1:
+            logger.info(
+                f"Embedded {len(texts)} texts in {len(batches)} batches "
+                f"| {elapsed:.1f}s | {stats['texts_per_sec']:.1f} texts/s "
+                f"| requests={stats['requests']} retries={stats['retries']} splits={stats['splits']}"
+            )
+
+        return vectors
@@ -0,0 +1,72 @@
+# src/providers/embeddings/embedder_factory.py
+
+import os
+from threading import Lock
+
+from pipeline.interfaces.base_embedder import BaseEmbedder
+from pipeline.providers.embeddings.batching_dispatcher import MicroBatchingEmbedder
+from pipeline.providers.embeddings.bge_embedder import BGEEmbedder
+from pipeline.providers.embeddings.embedding_cache import CachedEmbedder
+from pipeline.providers.embeddings.local_embedder import LocalEmbedder
+
+# "http" (Hugging Face router) or "local" (in-process model from
+# LOCAL_EMBEDDING_MODEL_DIR)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "http").lower()
+
+# Serve repeated texts (re-ingested chunks, repeated queries) from
+# the local embedding cache instead of the remote API
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "true").lower() == "true"
+
+# Coalesce concurrent small embed calls into one backend batch
+EMBED_MICROBATCH_ENABLED = os.getenv("EMBED_MICROBATCH", "true").lower() == "true"
+
+_BACKENDS = {
+    "http": BGEEmbedder,
+    "local": LocalEmbedder,
+}
+
+_embedder = None
+_lock = Lock()
+
+
+def create_embedder(backend: str = EMBEDDING_BACKEND) -> BaseEmbedder:
+    if backend not in _BACKENDS:
+        raise ValueError(
+            f"Unknown EMBEDDING_BACKEND '{backend}' (expected one of {sorted(_BACKENDS)})"
+        )
+    return _BACKENDS[backend]()
+
+
+def get_embedder() -> BaseEmbedder:
+    """Process-wide embedder shared by ingestion, retrieval and the API."""
+
+    global _embedder
+
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                embedder = create_embedder()
+                # cache first, so hits never wait for a micro-batch
+                if EMBED_MICROBATCH_ENABLED:
+                    embedder = MicroBatchingEmbedder(embedder)
+                if EMBEDDING_CACHE_ENABLED:
+                    embedder = CachedEmbedder(embedder)
+                _embedder = embedder
+
+    return _embedder
+
+
+def embedder_stats() -> dict:
+    """Counters of the shared embedder's layers (cache, micro-batching)."""
+
+    stats = {}
+    embedder = _embedder
+
+    while embedder is not None:
+        if isinstance(embedder, CachedEmbedder):
+            stats["cache"] = embedder.cache.stats()
+        elif isinstance(embedder, MicroBatchingEmbedder):
+            stats["microbatch"] = embedder.stats()
+        embedder = getattr(embedder, "embedder", None)
+
+    return stats
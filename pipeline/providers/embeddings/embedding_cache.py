@@ -0,0 +1,252 @@
+# src/providers/embeddings/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pipeline.interfaces.base_embedder import BaseEmbedder
+from pipeline.utils.logger import logger
+from pipeline.utils.metrics import metrics
+
+# ----------------------------------------------------------
+# Content-addressed embedding cache
+#
+#   key     sha256(model \0 normalized text)
+#   tier 1  in-process LRU (OrderedDict)
+#   tier 2  SQLite on local disk, float32 blobs, evicted by
+#           least-recently-used once over the size bound
+# ----------------------------------------------------------
+
+BASE_DATA_DIR = os.getenv("DATA_DIR", "data")
+CACHE_PATH = Path(BASE_DATA_DIR) / "embedding_cache.db"
+
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+
+# evict down to this fraction of MAX_ENTRIES so eviction is batched
+_EVICT_TO = 0.9
+
+
+def normalize_text(text: str) -> str:
+    # whitespace / unicode form differences never change the tokens
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(
+        f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    ).hexdigest()
+
+
+class EmbeddingCache:
+    _lock = Lock()
+
+    def __init__(
+        self,
+        path: Path = CACHE_PATH,
+        max_entries: int = MAX_ENTRIES,
+        memory_entries: int = MEMORY_ENTRIES,
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+
+        with self._lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key       TEXT PRIMARY KEY,
+                    model     TEXT    NOT NULL,
+                    dim       INTEGER NOT NULL,
+                    vector    BLOB    NOT NULL,
+                    last_used REAL    NOT NULL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+            )
+            self.conn.commit()
+
+            self._rows = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+    # -----------------------------
+    # In-process LRU tier
+    # -----------------------------
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # -----------------------------
+    # Lookup / store
+    # -----------------------------
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+
+            pending = []
+
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    pending.append(key)
+
+            self.memory_hits += len(found)
+
+            # SQLite caps bound parameters per statement
+            for start in range(0, len(pending), 500):
+                batch = pending[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+
+                for key, blob in rows:
+                    # read-only float32 view over the row bytes, no copy
+                    vector = np.frombuffer(blob, dtype="<f4")
+                    found[key] = vector
+                    self._remember(key, vector)
+
+                if rows:
+                    now = time.time()
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows],
+                    )
+
+            if pending:
+                self.conn.commit()
+
+            hits = len(found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        metrics.inc("embedding_cache_hits", hits)
+        metrics.inc("embedding_cache_misses", len(keys) - hits)
+
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]):
+
+        if not items:
+            return
+
+        now = time.time()
+
+        with self._lock:
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (key, model, len(vector), np.asarray(vector, dtype="<f4").tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+            self._rows += len(items)
+
+            if self._rows > self.max_entries:
+                self._evict()
+
+            self.conn.commit()
+
+    def _evict(self):
+        # other processes share the file; recount before deleting
+        self._rows = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._rows - int(self.max_entries * _EVICT_TO)
+
+        if excess <= 0:
+            return
+
+        self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._rows -= excess
+
+        metrics.inc("embedding_cache_evictions", excess)
+        logger.info(f"Embedding cache evicted {excess} entries (max {self.max_entries})")
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._rows,
+        }
+
+
+class CachedEmbedder(BaseEmbedder):
+    """
+    BaseEmbedder in front of another embedder: only texts missing
+    from the cache are sent to it, results come back in input order.
+    """
+
+    def __init__(self, embedder: BaseEmbedder, cache: Optional[EmbeddingCache] = None):
+        self.embedder = embedder
+        self.model_name = getattr(embedder, "model_name", type(embedder).__name__)
+        self.cache = cache if cache is not None else EmbeddingCache()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+
+        # callers sometimes pass a single string (one embedding back)
+        if isinstance(texts, str):
+            texts = [texts]
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.embedder.embed(list(missing.values()))
+
+            if len(vectors) != len(missing):
+                raise Exception(
+                    f"Embedder returned {len(vectors)} vectors for {len(missing)} texts"
+                )
+
+            # own copy per row so a cached vector never pins the batch
+            fresh = {key: vectors[i].copy() for i, key in enumerate(missing)}
+            self.cache.put_many(self.model_name, fresh)
+            found.update(fresh)
+
+        return np.stack([found[key] for key in keys])
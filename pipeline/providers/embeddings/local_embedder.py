@@ -0,0 +1,187 @@
+import importlib.util
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from pipeline.interfaces.base_embedder import BaseEmbedder
+from pipeline.utils.logger import logger
+
+# ----------------------------------------------------------
+# In-process embedding from a local model directory
+#
+#   runtime "sentence-transformers"  any ST model dir (default)
+#   runtime "onnx"                   model.onnx + tokenizer.json,
+#                                    CLS pooling + L2 norm (bge)
+#
+# The model must be bge-small-en-v1.5 (or a bge-small-compatible
+# export): query vectors have to live in the same space as the
+# chunk vectors already stored in Qdrant.
+# ----------------------------------------------------------
+
+LOCAL_EMBEDDING_MODEL_DIR = os.getenv("LOCAL_EMBEDDING_MODEL_DIR", "models/bge-small-en-v1.5")
+LOCAL_EMBEDDING_RUNTIME = os.getenv("LOCAL_EMBEDDING_RUNTIME", "sentence-transformers")
+
+# Cache key namespace; same weights as the HTTP backend by default,
+# so both share embedding-cache entries
+LOCAL_EMBEDDING_MODEL_NAME = os.getenv("LOCAL_EMBEDDING_MODEL_NAME", "BAAI/bge-small-en-v1.5")
+
+LOCAL_EMBED_BATCH_SIZE = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "32"))
+LOCAL_EMBED_WORKERS = int(os.getenv("LOCAL_EMBED_WORKERS", "2"))
+LOCAL_EMBED_MAX_LENGTH = 512
+
+
+class _SentenceTransformerRuntime:
+
+    def __init__(self, model_dir: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_dir, device="cpu")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+
+
+class _OnnxRuntime:
+
+    def __init__(self, model_dir: str):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=LOCAL_EMBED_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+        hidden = self.session.run(None, feeds)[0]
+
+        # bge: CLS token, L2-normalized
+        cls = hidden[:, 0].astype(np.float32)
+        norms = np.linalg.norm(cls, axis=1, keepdims=True)
+        return cls / np.maximum(norms, 1e-12)
+
+
+_RUNTIMES = {
+    "sentence-transformers": _SentenceTransformerRuntime,
+    "onnx": _OnnxRuntime,
+}
+
+# checked when the embedder is created, before any model loads
+_RUNTIME_PACKAGES = {
+    "sentence-transformers": ("sentence_transformers",),
+    "onnx": ("onnxruntime", "tokenizers"),
+}
+
+_RUNTIME_REQUIREMENTS = {
+    "sentence-transformers": "requirements.txt",
+    "onnx": "requirements-onnx.txt",
+}
+
+_RUNTIME_FILES = {
+    "onnx": ("model.onnx", "tokenizer.json"),
+}
+
+
+class LocalEmbedder(BaseEmbedder):
+    """
+    CPU embedding in-process, no network on the query path.
+    Large inputs are cut into batches encoded on a small thread
+    pool (the runtimes release the GIL while computing).
+    """
+
+    def __init__(
+        self,
+        model_dir: str = LOCAL_EMBEDDING_MODEL_DIR,
+        runtime: str = LOCAL_EMBEDDING_RUNTIME,
+        model_name: str = LOCAL_EMBEDDING_MODEL_NAME,
+        batch_size: int = LOCAL_EMBED_BATCH_SIZE,
+        workers: int = LOCAL_EMBED_WORKERS,
+    ):
+        if runtime not in _RUNTIMES:
+            raise ValueError(
+                f"Unknown LOCAL_EMBEDDING_RUNTIME '{runtime}' (expected one of {sorted(_RUNTIMES)})"
+            )
+
+        missing = [p for p in _RUNTIME_PACKAGES[runtime] if importlib.util.find_spec(p) is None]
+        if missing:
+            raise ValueError(
+                f"LOCAL_EMBEDDING_RUNTIME '{runtime}' needs {', '.join(missing)} "
+                f"(pip install -r {_RUNTIME_REQUIREMENTS[runtime]})"
+            )
+
+        if not os.path.isdir(model_dir):
+            raise ValueError(f"Local embedding model directory not found: {model_dir}")
+
+        missing = [f for f in _RUNTIME_FILES.get(runtime, ()) if not os.path.isfile(os.path.join(model_dir, f))]
+        if missing:
+            raise ValueError(
+                f"LOCAL_EMBEDDING_RUNTIME '{runtime}' needs {', '.join(missing)} in {model_dir}"
+            )
+
+        logger.info(f"Loading local embedding model from {model_dir} ({runtime})")
+
+        self.model_dir = model_dir
+        self.model_name = model_name
+        self.runtime = _RUNTIMES[runtime](model_dir)
+
+        self.batch_size = batch_size
+        self.workers = workers
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix="local-embed",
+                    )
+        return self._pool
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+
+        # a single string yields a single embedding
+        if isinstance(texts, str):
+            texts = [texts]
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        texts = list(texts)
+
+        if len(texts) <= self.batch_size:
+            return self.runtime.encode(texts)
+
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+        results = self._get_pool().map(self.runtime.encode, batches)
+
+        return np.concatenate(list(results))
@@ -0,0 +1,650 @@
+# src/providers/retrievers/bm25_index.py
+
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from pipeline.providers.retrievers.bm25_segment import encode_document, write_segment
+
+
+# Postings per block for BlockMax-WAND upper bounds
+BLOCK_SIZE = 64
+
+_END = 1 << 32
+
+# stored document for scoring-only use (benchmarks)
+_NO_DOCUMENT = ("", {})
+
+
+def tokenize(text: str) -> List[str]:
+    return text.lower().split()
+
+
+class Postings:
+    """
+    Append-only postings list for a single term.
+
+    Alongside (doc_id, tf) pairs it keeps per-block max tf / min doc
+    length so a block's score upper bound can be computed at query
+    time against the current avgdl without touching the postings.
+    """
+
+    __slots__ = (
+        "doc_ids", "tfs",
+        "block_last_doc", "block_max_tf", "block_min_dl",
+        "max_tf", "min_dl",
+    )
+
+    def __init__(self):
+        self.doc_ids = array("I")
+        self.tfs = array("I")
+        self.block_last_doc = array("I")
+        self.block_max_tf = array("I")
+        self.block_min_dl = array("I")
+        self.max_tf = 0
+        self.min_dl = _END
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def append(self, doc_id: int, tf: int, doc_length: int):
+
+        if len(self.doc_ids) % BLOCK_SIZE == 0:
+            self.block_last_doc.append(doc_id)
+            self.block_max_tf.append(tf)
+            self.block_min_dl.append(doc_length)
+        else:
+            self.block_last_doc[-1] = doc_id
+            self.block_max_tf[-1] = max(self.block_max_tf[-1], tf)
+            self.block_min_dl[-1] = min(self.block_min_dl[-1], doc_length)
+
+        self.doc_ids.append(doc_id)
+        self.tfs.append(tf)
+
+        self.max_tf = max(self.max_tf, tf)
+        self.min_dl = min(self.min_dl, doc_length)
+
+    @classmethod
+    def concat(cls, parts: Iterable) -> "Postings":
+        """
+        Join postings parts with ascending, non-overlapping doc ids.
+        Blocks are copied as-is, a short trailing block in one part is
+        still a valid (if looser) upper bound.
+        """
+
+        entry = cls()
+
+        for part in parts:
+            entry.doc_ids.extend(part.doc_ids)
+            entry.tfs.extend(part.tfs)
+            entry.block_last_doc.extend(part.block_last_doc)
+            entry.block_max_tf.extend(part.block_max_tf)
+            entry.block_min_dl.extend(part.block_min_dl)
+            entry.max_tf = max(entry.max_tf, part.max_tf)
+            entry.min_dl = min(entry.min_dl, part.min_dl)
+
+        return entry
+
+
+class _Cursor:
+
+    __slots__ = ("postings", "weight", "ub", "pos", "doc")
+
+    def __init__(self, postings: Postings, weight: float, ub: float):
+        self.postings = postings
+        self.weight = weight
+        self.ub = ub
+        self.pos = 0
+        self.doc = postings.doc_ids[0] if len(postings) else _END
+
+    def advance(self, target: int):
+        doc_ids = self.postings.doc_ids
+        self.pos = bisect_left(doc_ids, target, self.pos)
+        self.doc = doc_ids[self.pos] if self.pos < len(doc_ids) else _END
+
+    def block_of(self, target: int) -> int:
+        return bisect_left(self.postings.block_last_doc, target)
+
+
+class MemorySegment:
+    """
+    Immutable in-memory segment for doc ids [doc_base, doc_base + num_docs).
+
+    Built in one go from freshly tokenized chunks and never modified
+    once it is part of a published index; postings carry global doc
+    ids, stored documents and lengths are indexed locally.
+    """
+
+    deleted = ()
+
+    def __init__(
+        self,
+        doc_base: int,
+        terms: Dict[str, Postings],
+        doc_lengths: array,
+        documents: List[Tuple[str, Dict]],
+        file_docs: Dict[str, List[int]],
+    ):
+        self.doc_base = doc_base
+        self.terms = terms
+        self.doc_lengths = doc_lengths
+        self.documents = documents
+        self.file_docs = file_docs
+
+        self.num_docs = len(doc_lengths)
+        self.total_length = sum(doc_lengths)
+
+    @classmethod
+    def build(
+        cls,
+        doc_base: int,
+        tokenized_docs: List[List[str]],
+        documents: Optional[List[Tuple[str, Dict]]] = None,
+    ) -> "MemorySegment":
+
+        terms: Dict[str, Postings] = {}
+        doc_lengths = array("I")
+        stored_docs = []
+        file_docs: Dict[str, List[int]] = {}
+
+        for i, tokens in enumerate(tokenized_docs):
+
+            doc_id = doc_base + i
+            doc_length = len(tokens)
+
+            for term, freq in Counter(tokens).items():
+
+                entry = terms.get(term)
+
+                if entry is None:
+                    entry = Postings()
+                    terms[term] = entry
+
+                entry.append(doc_id, freq, doc_length)
+
+            doc_lengths.append(doc_length)
+
+            stored = documents[i] if documents is not None else _NO_DOCUMENT
+            stored_docs.append(stored)
+
+            file_id = stored[1].get("file_id")
+            if file_id is not None:
+                file_docs.setdefault(str(file_id), []).append(doc_id)
+
+        return cls(doc_base, terms, doc_lengths, stored_docs, file_docs)
+
+    @classmethod
+    def merge(cls, first: "MemorySegment", second: "MemorySegment") -> "MemorySegment":
+        """New segment covering two adjacent ones; the inputs are left untouched."""
+
+        terms = {}
+
+        for term in first.terms.keys() | second.terms.keys():
+            terms[term] = Postings.concat(
+                part for part in (first.terms.get(term), second.terms.get(term))
+                if part is not None
+            )
+
+        doc_lengths = array("I", first.doc_lengths)
+        doc_lengths.extend(second.doc_lengths)
+
+        file_docs = {file_id: list(ids) for file_id, ids in first.file_docs.items()}
+        for file_id, ids in second.file_docs.items():
+            file_docs.setdefault(file_id, []).extend(ids)
+
+        return cls(
+            first.doc_base,
+            terms,
+            doc_lengths,
+            first.documents + second.documents,
+            file_docs,
+        )
+
+    def postings(self, term: str) -> Optional[Postings]:
+        return self.terms.get(term)
+
+    def iter_postings(self):
+        return iter(self.terms.items())
+
+    def file_doc_ids(self, file_id: str):
+        return self.file_docs.get(str(file_id), ())
+
+    def iter_files(self):
+        return iter(self.file_docs.items())
+
+    def get_document(self, local_id: int) -> Tuple[str, Dict]:
+        return self.documents[local_id]
+
+    def raw_document(self, local_id: int) -> bytes:
+        return encode_document(*self.documents[local_id])
+
+
+class BM25Index:
+    """
+    Immutable BM25 index snapshot.
+
+    An optional read-only base segment (mmap, see bm25_segment) holds
+    doc ids [0, base.num_docs); newer chunks live in immutable
+    in-memory segments that continue the doc id range. Adding chunks
+    or deleting a file never modifies a published snapshot: it returns
+    a new BM25Index sharing every untouched segment, so a query that
+    holds a reference always sees one consistent generation.
+
+    Only the new chunks are tokenized and indexed; small trailing
+    segments are merged (size-tiered) to keep the segment count
+    logarithmic in the number of appends.
+
+    Deletes are tombstones: queries skip dead doc ids while their
+    postings (and N / df stats) stay until the next compaction.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        base=None,
+        segments: Iterable[MemorySegment] = (),
+        deleted: Optional[FrozenSet[int]] = None,
+    ):
+        self.k1 = k1
+        self.b = b
+
+        self.base = base
+        self.segments: Tuple[MemorySegment, ...] = tuple(segments)
+
+        if deleted is None:
+            deleted = frozenset(base.deleted) if base is not None else frozenset()
+
+        self.deleted: FrozenSet[int] = deleted
+
+        self._all = ([base] if base is not None else []) + list(self.segments)
+        self._starts = [seg.doc_base for seg in self._all]
+
+        self.num_docs = sum(seg.num_docs for seg in self._all)
+        self.total_length = sum(seg.total_length for seg in self._all)
+
+    # -----------------------------
+    # Stats
+    # -----------------------------
+    @property
+    def avgdl(self) -> float:
+        if not self.num_docs:
+            return 0.0
+        return self.total_length / self.num_docs
+
+    def _parts(self, term: str) -> list:
+        parts = []
+
+        for seg in self._all:
+            entry = seg.postings(term)
+            if entry is not None:
+                parts.append(entry)
+
+        return parts
+
+    def df(self, term: str) -> int:
+        return sum(len(part) for part in self._parts(term))
+
+    def idf(self, term: str) -> float:
+        # Lucene-style IDF: always positive and depends only on
+        # (N, df), so it stays valid as documents are appended.
+        n = self.num_docs
+        df = self.df(term)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    @property
+    def dead_fraction(self) -> float:
+        if not self.num_docs:
+            return 0.0
+        return len(self.deleted) / self.num_docs
+
+    def _locate(self, doc_id: int):
+        seg = self._all[bisect_right(self._starts, doc_id) - 1]
+        return seg, doc_id - seg.doc_base
+
+    def doc_length(self, doc_id: int) -> int:
+        seg, local_id = self._locate(doc_id)
+        return seg.doc_lengths[local_id]
+
+    # -----------------------------
+    # Copy-on-write updates
+    # -----------------------------
+    def _derive(self, segments=None, deleted=None) -> "BM25Index":
+        return BM25Index(
+            self.k1,
+            self.b,
+            base=self.base,
+            segments=self.segments if segments is None else segments,
+            deleted=self.deleted if deleted is None else deleted,
+        )
+
+    def with_documents(
+        self,
+        tokenized_docs: List[List[str]],
+        documents: Optional[List[Tuple[str, Dict]]] = None,
+    ) -> "BM25Index":
+        """New snapshot with the chunks appended; self is unchanged."""
+
+        if not tokenized_docs:
+            return self
+
+        segments = list(self.segments)
+        segments.append(MemorySegment.build(self.num_docs, tokenized_docs, documents))
+
+        while len(segments) > 1 and segments[-2].num_docs <= 2 * segments[-1].num_docs:
+            last = segments.pop()
+            segments.append(MemorySegment.merge(segments.pop(), last))
+
+        return self._derive(segments=segments)
+
+    def with_file_deleted(self, file_id: str) -> Tuple["BM25Index", int]:
+        """New snapshot with file_id's chunks tombstoned, and how many were live."""
+
+        doc_ids = [d for d in self.docs_for_file(file_id) if d not in self.deleted]
+
+        if not doc_ids:
+            return self, 0
+
+        return self._derive(deleted=self.deleted.union(doc_ids)), len(doc_ids)
+
+    def with_chunks_deleted(self, file_id: str, chunk_hashes) -> Tuple["BM25Index", int]:
+        """New snapshot with file_id's chunks whose metadata chunk_hash is in chunk_hashes tombstoned."""
+
+        chunk_hashes = set(chunk_hashes)
+
+        doc_ids = [
+            d for d in self.docs_for_file(file_id)
+            if d not in self.deleted and self.get_document(d)[1].get("chunk_hash") in chunk_hashes
+        ]
+
+        if not doc_ids:
+            return self, 0
+
+        return self._derive(deleted=self.deleted.union(doc_ids)), len(doc_ids)
+
+    # -----------------------------
+    # Stored documents
+    # -----------------------------
+    def get_document(self, doc_id: int) -> Tuple[str, Dict]:
+        seg, local_id = self._locate(doc_id)
+        return seg.get_document(local_id)
+
+    def raw_document(self, doc_id: int):
+        seg, local_id = self._locate(doc_id)
+        return seg.raw_document(local_id)
+
+    def docs_for_file(self, file_id: str) -> List[int]:
+        doc_ids = []
+
+        for seg in self._all:
+            doc_ids.extend(seg.file_doc_ids(file_id))
+
+        return doc_ids
+
+    # -----------------------------
+    # Persistence (all segments → one segment)
+    # -----------------------------
+    def _all_postings(self) -> Dict[str, list]:
+        postings = {}
+
+        for seg in self._all:
+            for term, entry in seg.iter_postings():
+                postings.setdefault(term, []).append(entry)
+
+        return postings
+
+    def _all_file_docs(self) -> Dict[str, List[int]]:
+        file_docs = {}
+
+        for seg in self._all:
+            for file_id, doc_ids in seg.iter_files():
+                file_docs.setdefault(file_id, []).extend(doc_ids)
+
+        return file_docs
+
+    def _all_doc_lengths(self) -> array:
+        doc_lengths = array("I")
+
+        if self.base is not None:
+            doc_lengths.frombytes(self.base.doc_lengths.cast("B"))
+
+        for seg in self.segments:
+            doc_lengths.extend(seg.doc_lengths)
+
+        return doc_lengths
+
+    def write(self, path: str, compact: bool = False):
+        """
+        Write all segments as one. Without compaction postings
+        are copied as-is and tombstones carried over; with compaction
+        dead docs are dropped and live ones renumbered densely.
+        """
+
+        record = self.raw_document
+
+        if not compact or not self.deleted:
+            write_segment(
+                path,
+                self._all_postings(),
+                self._all_doc_lengths(),
+                self.total_length,
+                (record(doc_id) for doc_id in range(self.num_docs)),
+                self._all_file_docs(),
+                self.deleted,
+            )
+            return
+
+        old_lengths = self._all_doc_lengths()
+
+        remap = array("q", [-1]) * len(old_lengths)
+        live = [d for d in range(len(old_lengths)) if d not in self.deleted]
+        new_lengths = array("I")
+
+        for new_id, old_id in enumerate(live):
+            remap[old_id] = new_id
+            new_lengths.append(old_lengths[old_id])
+
+        postings = {}
+
+        for term, parts in self._all_postings().items():
+
+            entry = Postings()
+
+            for part in parts:
+                for old_id, tf in zip(part.doc_ids, part.tfs):
+                    new_id = remap[old_id]
+                    if new_id >= 0:
+                        entry.append(new_id, tf, new_lengths[new_id])
+
+            if len(entry):
+                postings[term] = [entry]
+
+        file_docs = {}
+
+        for file_id, doc_ids in self._all_file_docs().items():
+            kept = [remap[d] for d in doc_ids if remap[d] >= 0]
+            if kept:
+                file_docs[file_id] = kept
+
+        write_segment(
+            path,
+            postings,
+            new_lengths,
+            sum(new_lengths),
+            (record(old_id) for old_id in live),
+            file_docs,
+            set(),
+        )
+
+    # -----------------------------
+    # Scoring
+    # -----------------------------
+    def _term_score(self, weight: float, tf: int, doc_length: int, avgdl: float) -> float:
+        k1 = self.k1
+        norm = k1 * (1 - self.b + self.b * doc_length / avgdl)
+        return weight * tf * (k1 + 1) / (tf + norm)
+
+    def top_k(
+        self,
+        tokens: List[str],
+        k: int,
+        prune: bool = True,
+        stats: Optional[Dict] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Document-at-a-time top-k over the query terms' postings only.
+
+        With prune=True uses BlockMax-WAND: a document is only fully
+        scored when the sum of its terms' upper bounds (term-level,
+        then block-level) can beat the current k-th best score.
+        Results are identical to exhaustive evaluation.
+        """
+
+        if stats is None:
+            stats = {}
+
+        stats.update({
+            "postings_total": 0,
+            "postings_scanned": 0,
+            "docs_scored": 0,
+            "blocks_skipped": 0,
+        })
+
+        if not self.num_docs or k <= 0:
+            return []
+
+        avgdl = self.avgdl or 1.0
+        doc_length = self.doc_length
+        term_score = self._term_score
+        deleted = self.deleted
+
+        # one cursor per (term, segment); a doc lives in exactly one
+        # segment so each term still contributes at most once
+        cursors = []
+
+        for term, query_tf in Counter(tokens).items():
+
+            parts = self._parts(term)
+
+            if not parts:
+                continue
+
+            weight = self.idf(term) * query_tf
+
+            for postings in parts:
+                ub = term_score(weight, postings.max_tf, postings.min_dl, avgdl)
+                cursors.append(_Cursor(postings, weight, ub))
+                stats["postings_total"] += len(postings)
+
+        heap: List[Tuple[float, int]] = []
+        threshold = 0.0
+        scanned = 0
+        scored = 0
+        skipped = 0
+
+        while True:
+
+            cursors = [c for c in cursors if c.doc != _END]
+
+            if not cursors:
+                break
+
+            cursors.sort(key=lambda c: c.doc)
+
+            # ---- WAND pivot selection
+            pivot = None
+
+            if prune and len(heap) >= k:
+                acc = 0.0
+                for i, c in enumerate(cursors):
+                    acc += c.ub
+                    if acc > threshold:
+                        pivot = i
+                        break
+                if pivot is None:
+                    break
+            else:
+                pivot = 0
+
+            pivot_doc = cursors[pivot].doc
+
+            while pivot + 1 < len(cursors) and cursors[pivot + 1].doc == pivot_doc:
+                pivot += 1
+
+            # ---- BlockMax refinement
+            if prune and len(heap) >= k:
+
+                block_ub = 0.0
+                next_doc = _END
+
+                for c in cursors[:pivot + 1]:
+                    p = c.postings
+                    bi = c.block_of(pivot_doc)
+
+                    # no posting at or after the pivot: contributes nothing
+                    if bi >= len(p.block_last_doc):
+                        continue
+
+                    block_ub += term_score(
+                        c.weight, p.block_max_tf[bi], p.block_min_dl[bi], avgdl
+                    )
+                    next_doc = min(next_doc, p.block_last_doc[bi] + 1)
+
+                if block_ub <= threshold:
+
+                    if pivot + 1 < len(cursors):
+                        next_doc = min(next_doc, cursors[pivot + 1].doc)
+
+                    for c in cursors[:pivot + 1]:
+                        if c.doc < next_doc:
+                            c.advance(next_doc)
+                            scanned += 1
+
+                    skipped += 1
+                    continue
+
+            # ---- Evaluate or move lagging cursors up to the pivot
+            if cursors[0].doc == pivot_doc and pivot_doc in deleted:
+
+                for c in cursors[:pivot + 1]:
+                    c.advance(pivot_doc + 1)
+                    scanned += 1
+
+            elif cursors[0].doc == pivot_doc:
+
+                score = 0.0
+                dl = doc_length(pivot_doc)
+
+                for c in cursors[:pivot + 1]:
+                    score += term_score(c.weight, c.postings.tfs[c.pos], dl, avgdl)
+                    c.advance(pivot_doc + 1)
+                    scanned += 1
+
+                scored += 1
+
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, pivot_doc))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, pivot_doc))
+
+                if len(heap) >= k:
+                    threshold = heap[0][0]
+
+            else:
+
+                for c in cursors[:pivot]:
+                    if c.doc < pivot_doc:
+                        c.advance(pivot_doc)
+                        scanned += 1
+
+        stats["postings_scanned"] = scanned
+        stats["docs_scored"] = scored
+        stats["blocks_skipped"] = skipped
+
+        return [
+            (doc_id, score)
+            for score, doc_id in sorted(heap, key=lambda x: (-x[0], x[1]))
+        ]
@@ -2,11 +2,24 @@
 
 import os
 import pickle
-from typing import List, Dict
-from rank_bm25 import BM25Okapi
+from typing import List, Dict, Optional
+from pipeline.providers.retrievers.bm25_index import BM25Index, tokenize
+from pipeline.providers.retrievers.bm25_segment import MmapSegment
+from pipeline.providers.retrievers.index_generation import (
+    GenerationWatcher,
+    marker_path_for,
+    read_generation,
+    write_generation,
+)
+from pipeline.providers.retrievers.snapshot import SnapshotHolder
 from pipeline.utils.logger import logger
+from pipeline.utils.metrics import metrics
 from pipeline.embedding.vector_store import VectorStore
 
+# Rewrite postings without tombstoned chunks once this fraction
+# of the index is dead
+COMPACTION_THRESHOLD = float(os.getenv("BM25_COMPACTION_THRESHOLD", "0.2"))
+
 
 class BM25Retriever:
     """
@@ -14,31 +27,68 @@ class BM25Retriever:
     Complements dense embedding search.
     """
 
-    def __init__(self, persist_path: str = "data/bm25_index.pkl"):
+    def __init__(
+        self,
+        persist_path: str = "data/bm25_index.bin",
+        compaction_threshold: float = COMPACTION_THRESHOLD,
+    ):
         self.persist_path = persist_path
-        self.corpus: List[str] = []
-        self.metadata_refs: List[Dict] = []
-        self.bm25 = None
+        self.compaction_threshold = compaction_threshold
+        self.legacy_path = os.path.splitext(persist_path)[0] + ".pkl"
+        self.marker_path = marker_path_for(persist_path)
+
+        # Published BM25Index snapshots are immutable: writers derive
+        # the next one and swap it in, queries pin one for their run
+        self._snapshots = SnapshotHolder(BM25Index())
+        self.generation = 0
+
+        # snapshot matching the segment file on disk; anything else
+        # published since (added chunks, tombstones) is unpersisted
+        self._persisted = self.index
+
         self.vector_store = VectorStore()
         self._rebuilt_from_vector_store = False
+        self.last_query_stats: Dict = {}
+
+        self._watcher = GenerationWatcher(self.marker_path)
+
+    # -----------------------------
+    # Snapshots
+    # -----------------------------
+    @property
+    def index(self) -> BM25Index:
+        return self._snapshots.current()
+
+    @property
+    def dirty(self) -> bool:
+        """True if chunks were added or tombstoned since the last persist / load."""
+        return self.index is not self._persisted
+
+    def snapshot(self) -> BM25Index:
+        """
+        Pin the latest generation for one request. The returned index
+        never changes underneath the caller, whatever ingestion does.
+        """
+        self.reload_if_changed()
+        return self._snapshots.current()
 
     # -----------------------------
     # Tokenization
     # -----------------------------
     def _tokenize(self, text: str) -> List[str]:
-        return text.lower().split()
+        return tokenize(text)
 
     # -----------------------------
-    # Build BM25
+    # Build BM25 (full rebuild — legacy load / Qdrant recovery only)
     # -----------------------------
-    def _build_index(self):
+    def _build_index(self, corpus: List[str], metadata_refs: List[Dict]):
 
-        if not self.corpus:
-            self.bm25 = None
-            return
+        tokenized = [self._tokenize(doc) for doc in corpus]
 
-        tokenized_corpus = [self._tokenize(doc) for doc in self.corpus]
-        self.bm25 = BM25Okapi(tokenized_corpus)
+        with self._snapshots.writer():
+            self._snapshots.publish(
+                BM25Index().with_documents(tokenized, list(zip(corpus, metadata_refs)))
+            )
 
     # -----------------------------
     # Load from Qdrant if index missing
@@ -52,8 +102,8 @@ class BM25Retriever:
 
         try:
 
-            self.corpus = []
-            self.metadata_refs = []
+            corpus = []
+            metadata_refs = []
 
             offset = None
 
@@ -83,16 +133,16 @@ class BM25Retriever:
                         if k != "document"
                     }
 
-                    self.corpus.append(document)
-                    self.metadata_refs.append(metadata)
+                    corpus.append(document)
+                    metadata_refs.append(metadata)
 
                 if offset is None:
                     break
 
-            logger.info(f"BM25 rebuilt with {len(self.corpus)} chunks")
+            logger.info(f"BM25 rebuilt with {len(corpus)} chunks")
 
-            self._build_index()
-            self._persist()
+            self._build_index(corpus, metadata_refs)
+            self.persist()
 
             self._rebuilt_from_vector_store = True
 
@@ -102,56 +152,227 @@ class BM25Retriever:
     # -----------------------------
     # Add Chunks (during ingestion)
     # -----------------------------
-    def add_chunks(self, documents: List[str], metadatas: List[Dict]):
+    def add_chunks(self, documents: List[str], metadatas: List[Dict], persist: bool = True):
+
+        documents = list(documents)
+        metadatas = list(metadatas)
 
-        for doc, meta in zip(documents, metadatas):
-            self.corpus.append(doc)
-            self.metadata_refs.append(meta)
+        # Only the new chunks are tokenized (outside the write lock);
+        # existing segments are shared with the new snapshot
+        tokenized = [self._tokenize(doc) for doc in documents]
+        stored = list(zip(documents, metadatas))
 
-        self._build_index()
-        self._persist()
+        self._snapshots.update(lambda index: index.with_documents(tokenized, stored))
+
+        if persist:
+            self.persist()
 
         logger.info(f"BM25 index updated with {len(documents)} new chunks.")
 
+    # -----------------------------
+    # Delete (deletion sync)
+    # -----------------------------
+    def delete_by_file_id(self, file_id: str, persist: bool = True) -> int:
+
+        if not self.index.num_docs:
+            self.load()
+
+        with self._snapshots.writer():
+            index, removed = self.index.with_file_deleted(file_id)
+            self._snapshots.publish(index)
+
+        logger.info(
+            f"BM25 tombstoned {removed} chunks for file_id={file_id} "
+            f"| dead_fraction={index.dead_fraction:.2%}"
+        )
+
+        if persist and removed:
+            self.persist()
+
+        return removed
+
+    # -----------------------------
+    # Replace (re-ingest of an edited file)
+    # -----------------------------
+    def replace_file(
+        self,
+        file_id: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        persist: bool = True,
+    ) -> int:
+        """
+        Tombstone file_id's chunks and append the new ones in a single
+        published snapshot, so no query sees the file twice or not at
+        all. Returns how many old chunks were tombstoned.
+        """
+
+        if not self.index.num_docs:
+            self.load()
+
+        documents = list(documents)
+        metadatas = list(metadatas)
+
+        tokenized = [self._tokenize(doc) for doc in documents]
+        stored = list(zip(documents, metadatas))
+
+        with self._snapshots.writer():
+            index, removed = self.index.with_file_deleted(file_id)
+            index = self._snapshots.publish(index.with_documents(tokenized, stored))
+
+        logger.info(
+            f"BM25 replaced {removed} → {len(documents)} chunks for file_id={file_id} "
+            f"| dead_fraction={index.dead_fraction:.2%}"
+        )
+
+        if persist:
+            self.persist()
+
+        return removed
+
+    # -----------------------------
+    # Chunk diff (re-ingest with a chunk manifest)
+    # -----------------------------
+    def update_file_chunks(
+        self,
+        file_id: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        removed_hashes,
+        persist: bool = True,
+    ) -> int:
+        """
+        Tombstone the file's chunks whose chunk_hash is in
+        removed_hashes and append the new ones, in one published
+        snapshot. Unchanged chunks keep their postings.
+        """
+
+        if not self.index.num_docs:
+            self.load()
+
+        documents = list(documents)
+        metadatas = list(metadatas)
+
+        tokenized = [self._tokenize(doc) for doc in documents]
+        stored = list(zip(documents, metadatas))
+
+        with self._snapshots.writer():
+            index, removed = self.index.with_chunks_deleted(file_id, removed_hashes)
+            index = self._snapshots.publish(index.with_documents(tokenized, stored))
+
+        logger.info(
+            f"BM25 file_id={file_id} | -{removed} +{len(documents)} chunks "
+            f"| dead_fraction={index.dead_fraction:.2%}"
+        )
+
+        if persist and (removed or documents):
+            self.persist()
+
+        return removed
+
+    # -----------------------------
+    # Hot reload (API side)
+    # -----------------------------
+    def reload_if_changed(self) -> bool:
+        """
+        Swap in the latest published generation if ingestion bumped
+        the marker. Only one thread reloads, and never while a writer
+        is publishing; others keep querying the current snapshot
+        without waiting.
+        """
+
+        if not self._watcher.changed():
+            return False
+
+        with self._snapshots.writer(blocking=False) as acquired:
+
+            if not acquired:
+                return False
+
+            return self._reload()
+
+    def _reload(self) -> bool:
+
+        try:
+
+            generation = read_generation(self.marker_path)
+
+            if generation == self.generation:
+                return False
+
+            # new segments and pending tombstones alike
+            if self.dirty:
+                logger.warning("BM25 has unpersisted changes, skipping reload")
+                return False
+
+            index = BM25Index(base=MmapSegment(self.persist_path))
+
+            self._persisted = self._snapshots.publish(index)
+            self.generation = generation
+
+            logger.info(
+                f"BM25 reloaded generation {generation} with {index.num_docs} chunks"
+            )
+
+            return True
+
+        except Exception:
+            logger.exception("BM25 reload failed, keeping current generation")
+            return False
+
     # -----------------------------
     # Query
     # -----------------------------
-    def query(self, query: str, top_k: int = 10) -> List[Dict]:
+    def query(
+        self,
+        query: str,
+        top_k: int = 10,
+        snapshot: Optional[BM25Index] = None,
+    ) -> List[Dict]:
+
+        index = snapshot if snapshot is not None else self.snapshot()
 
-        if not self.bm25:
+        if not index.num_docs:
 
             logger.warning("BM25 index not initialized.")
 
-            if not self.corpus:
-                self.load()
+            self.load()
 
-            if not self.corpus:
+            if not self.index.num_docs:
                 self._load_from_vector_store()
 
-            if not self.bm25:
+            index = self.index
+
+            if not index.num_docs:
                 return []
 
         tokens = self._tokenize(query)
 
-        scores = self.bm25.get_scores(tokens)
+        stats = {}
+        hits = index.top_k(tokens, top_k, stats=stats)
+
+        self.last_query_stats = stats
+        metrics.inc("bm25_postings_scanned", stats["postings_scanned"])
+        metrics.inc("bm25_docs_scored", stats["docs_scored"])
 
-        ranked_indices = sorted(
-            range(len(scores)),
-            key=lambda i: scores[i],
-            reverse=True
-        )[:top_k]
+        logger.info(
+            f"BM25 query | postings_scanned={stats['postings_scanned']}/{stats['postings_total']} "
+            f"| docs_scored={stats['docs_scored']} | corpus={index.num_docs}"
+        )
 
         results = []
 
-        for idx in ranked_indices:
+        for idx, score in hits:
 
-            if scores[idx] <= 0:
+            if score <= 0:
                 continue
 
+            document, metadata = index.get_document(idx)
+
             results.append({
-                "document": self.corpus[idx],
-                "metadata": self.metadata_refs[idx],
-                "score": float(scores[idx])
+                "document": document,
+                "metadata": metadata,
+                "score": float(score)
             })
 
         return results
@@ -159,34 +380,90 @@ class BM25Retriever:
     # -----------------------------
     # Persistence
     # -----------------------------
-    def _persist(self):
+    def persist_if_dirty(self, compact: bool = None) -> bool:
+        """persist() only if there is something to write; a no-op run leaves the generation alone."""
+        if not self.dirty:
+            return False
+        self.persist(compact)
+        return True
+
+    def persist(self, compact: bool = None):
+        """
+        Merge base segment + in-memory segments into a new segment file
+        (written atomically), reopen it as the mmap'd base and publish
+        a new generation for running APIs to pick up.
+        Compacts away tombstoned chunks when the dead fraction passes
+        the configured threshold, or when compact=True.
+
+        Holds the write lock so no chunk added meanwhile is lost;
+        queries keep running on the current snapshot throughout.
+        """
+
+        with self._snapshots.writer():
+
+            current = self.index
+
+            if compact is None:
+                compact = current.dead_fraction >= self.compaction_threshold
+
+            if compact and current.deleted:
+                logger.info(
+                    f"Compacting BM25 index | dropping {len(current.deleted)} "
+                    f"of {current.num_docs} chunks"
+                )
 
-        os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+            current.write(self.persist_path, compact=compact)
 
-        with open(self.persist_path, "wb") as f:
+            index = BM25Index(base=MmapSegment(self.persist_path))
+            generation = read_generation(self.marker_path) + 1
 
-            pickle.dump({
-                "corpus": self.corpus,
-                "metadata_refs": self.metadata_refs
-            }, f)
+            write_generation(self.marker_path, generation, num_docs=index.num_docs)
+
+            self._persisted = self._snapshots.publish(index)
+            self.generation = generation
+
+        logger.info(f"BM25 published generation {generation} with {index.num_docs} chunks")
 
     # -----------------------------
     # Load saved index
     # -----------------------------
     def load(self):
 
-        if not os.path.exists(self.persist_path):
+        if os.path.exists(self.persist_path):
+
+            try:
+                segment = MmapSegment(self.persist_path)
+            except ValueError as e:
+                # e.g. segment written by an older format version;
+                # query() falls back to rebuilding from Qdrant
+                logger.warning(f"Cannot open BM25 index: {e}")
+                return
 
-            logger.info("No existing BM25 index found.")
+            with self._snapshots.writer():
+                self._persisted = self._snapshots.publish(BM25Index(base=segment))
+                self.generation = read_generation(self.marker_path)
+
+            logger.info(f"BM25 index opened with {self.index.num_docs} chunks.")
+            return
+
+        if os.path.exists(self.legacy_path):
+            self._migrate_legacy_pickle()
             return
 
-        with open(self.persist_path, "rb") as f:
+        logger.info("No existing BM25 index found.")
 
-            data = pickle.load(f)
+    def _migrate_legacy_pickle(self):
 
-        self.corpus = data.get("corpus", [])
-        self.metadata_refs = data.get("metadata_refs", [])
+        logger.info(f"Migrating legacy BM25 pickle {self.legacy_path} → {self.persist_path}")
+
+        with open(self.legacy_path, "rb") as f:
+
+            data = pickle.load(f)
 
-        self._build_index()
+        self._build_index(
+            data.get("corpus", []),
+            data.get("metadata_refs", []),
+        )
+        self.persist()
 
-        logger.info(f"BM25 index loaded with {len(self.corpus)} chunks.")
+        logger.info(f"BM25 index loaded with {self.index.num_docs} chunks.")
@@ -0,0 +1,385 @@
+# src/providers/retrievers/bm25_segment.py
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# ----------------------------------------------------------
+# On-disk BM25 segment (little-endian, versioned)
+#
+#   header
+#   term table     fixed 48-byte records, sorted by term bytes
+#   term strings   utf-8 blob
+#   postings       doc_ids u32[P], tfs u32[P]
+#   blocks         last_doc u32[B], max_tf u32[B], min_dl u32[B]
+#   doc lengths    u32[N]
+#   doc offsets    u64[N + 1] into the doc store
+#   doc store      utf-8 JSON {"document", "metadata"} per doc
+#   file table     fixed 24-byte records, sorted by file_id bytes
+#   file strings   utf-8 blob
+#   file doc ids   u32, doc ids of each file_id
+#   deleted        u32, sorted tombstoned doc ids
+#
+# Opened read-only with mmap: nothing is decoded up front, so open
+# time does not depend on corpus size and every worker process shares
+# the same pages through the OS page cache.
+# ----------------------------------------------------------
+
+MAGIC = b"BM25IDX\x00"
+FORMAT_VERSION = 2
+
+_SECTIONS = (
+    "term_table",
+    "term_strings",
+    "post_doc_ids",
+    "post_tfs",
+    "block_last_doc",
+    "block_max_tf",
+    "block_min_dl",
+    "doc_lengths",
+    "doc_offsets",
+    "doc_store",
+    "file_table",
+    "file_strings",
+    "file_doc_ids",
+    "deleted",
+)
+
+# magic, version, num_docs, num_terms, num_files, total_length,
+# then (offset, length) per section
+_HEADER = struct.Struct("<8sIIIIQ" + "QQ" * len(_SECTIONS))
+_TERM = struct.Struct("<QQQIIIIII")
+_FILE = struct.Struct("<QQII")
+
+
+class SegmentPostings:
+    """Read-only postings view over the mmap; same shape as bm25_index.Postings."""
+
+    __slots__ = (
+        "doc_ids", "tfs",
+        "block_last_doc", "block_max_tf", "block_min_dl",
+        "max_tf", "min_dl",
+    )
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+
+class MmapSegment:
+
+    # a persisted segment always starts the doc id range
+    doc_base = 0
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = _HEADER.unpack_from(self._mm, 0)
+
+        magic, version, num_docs, num_terms, num_files, total_length = header[:6]
+
+        if magic != MAGIC:
+            raise ValueError(f"Not a BM25 segment: {path}")
+
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported BM25 segment version {version} (expected {FORMAT_VERSION})"
+            )
+
+        self.num_docs = num_docs
+        self.num_terms = num_terms
+        self.num_files = num_files
+        self.total_length = total_length
+
+        view = memoryview(self._mm)
+        sections = {}
+
+        for i, name in enumerate(_SECTIONS):
+            offset, length = header[6 + 2 * i], header[7 + 2 * i]
+            sections[name] = view[offset:offset + length]
+
+        self._term_table = sections["term_table"]
+        self._term_strings = sections["term_strings"]
+
+        self._post_doc_ids = sections["post_doc_ids"].cast("I")
+        self._post_tfs = sections["post_tfs"].cast("I")
+        self._block_last_doc = sections["block_last_doc"].cast("I")
+        self._block_max_tf = sections["block_max_tf"].cast("I")
+        self._block_min_dl = sections["block_min_dl"].cast("I")
+
+        self.doc_lengths = sections["doc_lengths"].cast("I")
+        self._doc_offsets = sections["doc_offsets"].cast("Q")
+        self._doc_store = sections["doc_store"]
+
+        self._file_table = sections["file_table"]
+        self._file_strings = sections["file_strings"]
+        self._file_doc_ids = sections["file_doc_ids"].cast("I")
+
+        self.deleted = sections["deleted"].cast("I")
+
+        self._cache: Dict[str, Optional[SegmentPostings]] = {}
+
+    # -----------------------------
+    # Vocab lookup (binary search over the term table)
+    # -----------------------------
+    def _term_at(self, i: int) -> Tuple:
+        record = _TERM.unpack_from(self._term_table, i * _TERM.size)
+        str_off, str_len = record[0], record[3]
+        return bytes(self._term_strings[str_off:str_off + str_len]), record
+
+    def _file_at(self, i: int) -> Tuple:
+        record = _FILE.unpack_from(self._file_table, i * _FILE.size)
+        str_off, str_len = record[0], record[2]
+        return bytes(self._file_strings[str_off:str_off + str_len]), record
+
+    @staticmethod
+    def _search(key: bytes, count: int, record_at) -> Optional[Tuple]:
+        lo, hi = 0, count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found, record = record_at(mid)
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return record
+
+        return None
+
+    def _find(self, term: str) -> Optional[Tuple]:
+        return self._search(term.encode("utf-8"), self.num_terms, self._term_at)
+
+    def postings(self, term: str) -> Optional[SegmentPostings]:
+
+        if term in self._cache:
+            return self._cache[term]
+
+        record = self._find(term)
+        entry = self._postings_from(record) if record is not None else None
+
+        self._cache[term] = entry
+        return entry
+
+    def _postings_from(self, record: Tuple) -> SegmentPostings:
+        _, post_off, block_off, _, df, max_tf, min_dl, num_blocks, _ = record
+
+        entry = SegmentPostings()
+        entry.doc_ids = self._post_doc_ids[post_off:post_off + df]
+        entry.tfs = self._post_tfs[post_off:post_off + df]
+        entry.block_last_doc = self._block_last_doc[block_off:block_off + num_blocks]
+        entry.block_max_tf = self._block_max_tf[block_off:block_off + num_blocks]
+        entry.block_min_dl = self._block_min_dl[block_off:block_off + num_blocks]
+        entry.max_tf = max_tf
+        entry.min_dl = min_dl
+
+        return entry
+
+    def iter_postings(self):
+        """Sequential scan of (term, postings), used when merging segments."""
+        for i in range(self.num_terms):
+            term, record = self._term_at(i)
+            yield term.decode("utf-8"), self._postings_from(record)
+
+    # -----------------------------
+    # file_id → doc ids (delete support)
+    # -----------------------------
+    def file_doc_ids(self, file_id: str):
+        record = self._search(str(file_id).encode("utf-8"), self.num_files, self._file_at)
+
+        if record is None:
+            return []
+
+        _, doc_off, _, count = record
+        return self._file_doc_ids[doc_off:doc_off + count]
+
+    def iter_files(self):
+        for i in range(self.num_files):
+            file_id, record = self._file_at(i)
+            _, doc_off, _, count = record
+            yield file_id.decode("utf-8"), self._file_doc_ids[doc_off:doc_off + count]
+
+    # -----------------------------
+    # Stored documents
+    # -----------------------------
+    def raw_document(self, doc_id: int) -> memoryview:
+        start = self._doc_offsets[doc_id]
+        end = self._doc_offsets[doc_id + 1]
+        return self._doc_store[start:end]
+
+    def get_document(self, doc_id: int) -> Tuple[str, Dict]:
+        return decode_document(self.raw_document(doc_id))
+
+    def close(self):
+        self._cache.clear()
+        try:
+            self._mm.close()
+        except BufferError:
+            # views still referenced by an in-flight query; the map is
+            # released when the last of them is garbage collected
+            pass
+
+
+# ----------------------------------------------------------
+# Writer
+# ----------------------------------------------------------
+
+def _raw(values) -> memoryview:
+    # array.frombytes only takes byte-sized buffers
+    return memoryview(values).cast("B")
+
+
+def encode_document(document: str, metadata: Dict) -> bytes:
+    return json.dumps(
+        {"document": document, "metadata": metadata},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def decode_document(raw) -> Tuple[str, Dict]:
+    record = json.loads(bytes(raw))
+    return record["document"], record["metadata"]
+
+
+def write_segment(
+    path: str,
+    postings: Dict[str, List],
+    doc_lengths,
+    total_length: int,
+    documents,
+    file_docs: Dict[str, List[int]],
+    deleted,
+):
+    """
+    Write a segment atomically (tmp file + os.replace).
+
+    postings maps term -> list of postings parts (Postings or
+    SegmentPostings) whose doc ids are already global and ascending,
+    so parts are concatenated without re-blocking.
+    documents yields encoded records (see encode_document) in
+    doc_id order. file_docs maps file_id -> doc ids, deleted is the
+    set of tombstoned doc ids.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    terms = sorted(postings, key=lambda t: t.encode("utf-8"))
+
+    term_table = bytearray()
+    term_strings = bytearray()
+    post_doc_ids, post_tfs = array("I"), array("I")
+    block_last_doc, block_max_tf, block_min_dl = array("I"), array("I"), array("I")
+
+    for term in terms:
+
+        encoded = term.encode("utf-8")
+        str_off = len(term_strings)
+        post_off = len(post_doc_ids)
+        block_off = len(block_last_doc)
+
+        max_tf, min_dl = 0, 1 << 32
+
+        for part in postings[term]:
+            post_doc_ids.frombytes(_raw(part.doc_ids))
+            post_tfs.frombytes(_raw(part.tfs))
+            block_last_doc.frombytes(_raw(part.block_last_doc))
+            block_max_tf.frombytes(_raw(part.block_max_tf))
+            block_min_dl.frombytes(_raw(part.block_min_dl))
+            max_tf = max(max_tf, part.max_tf)
+            min_dl = min(min_dl, part.min_dl)
+
+        term_strings.extend(encoded)
+        term_table.extend(_TERM.pack(
+            str_off,
+            post_off,
+            block_off,
+            len(encoded),
+            len(post_doc_ids) - post_off,
+            max_tf,
+            min_dl,
+            len(block_last_doc) - block_off,
+            0,
+        ))
+
+    doc_offsets = array("Q", [0])
+    doc_store = bytearray()
+
+    for record in documents:
+        doc_store.extend(record)
+        doc_offsets.append(len(doc_store))
+
+    doc_lengths = array("I", doc_lengths)
+
+    file_table = bytearray()
+    file_strings = bytearray()
+    file_doc_ids = array("I")
+
+    files = sorted(file_docs, key=lambda f: f.encode("utf-8"))
+
+    for file_id in files:
+        encoded = file_id.encode("utf-8")
+        doc_off = len(file_doc_ids)
+        file_doc_ids.extend(file_docs[file_id])
+        file_table.extend(_FILE.pack(
+            len(file_strings),
+            doc_off,
+            len(encoded),
+            len(file_doc_ids) - doc_off,
+        ))
+        file_strings.extend(encoded)
+
+    sections = [
+        term_table,
+        term_strings,
+        post_doc_ids.tobytes(),
+        post_tfs.tobytes(),
+        block_last_doc.tobytes(),
+        block_max_tf.tobytes(),
+        block_min_dl.tobytes(),
+        doc_lengths.tobytes(),
+        doc_offsets.tobytes(),
+        doc_store,
+        file_table,
+        file_strings,
+        file_doc_ids.tobytes(),
+        array("I", sorted(deleted)).tobytes(),
+    ]
+
+    offsets = []
+    layout = []
+    position = _HEADER.size
+
+    for section in sections:
+        # 8-byte alignment so memoryview casts are aligned
+        position += -position % 8
+        offsets.append(position)
+        layout.extend((position, len(section)))
+        position += len(section)
+
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(doc_lengths),
+        len(terms),
+        len(files),
+        total_length,
+        *layout,
+    )
+
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for offset, section in zip(offsets, sections):
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
@@ -1,19 +1,43 @@
-import re
+import os
+import time
 from collections import defaultdict
+from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 from pipeline.utils.metrics import metrics
 
 from pipeline.utils.cross_encoder_reranker import CrossEncoderReranker
-from pipeline.providers.embeddings.bge_embedder import BGEEmbedder
+from pipeline.providers.embeddings.embedder_factory import get_embedder
 from pipeline.embedding.vector_store import VectorStore
 from pipeline.providers.retrievers.bm25_retriever import BM25Retriever
+from pipeline.utils.lexical_features import QueryFeatures, score_candidates
 from pipeline.utils.logger import logger
 from pipeline.utils.query_rewriter import QueryRewriter
+from pipeline.utils.request_context import RequestContext
+
+# Run query embedding, collection count and BM25 in parallel;
+# set to false to run the lanes one after another
+RETRIEVAL_CONCURRENT = os.getenv("RETRIEVAL_CONCURRENT", "true").lower() == "true"
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=RETRIEVAL_WORKERS,
+    thread_name_prefix="retrieval-lane",
+)
+
+
+def _timed(timings, lane, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[lane] = (time.perf_counter() - start) * 1000
 
 
 class HybridRetriever:
 
-    def __init__(self):
-        self.embedder = BGEEmbedder()
+    def __init__(self, concurrent: bool = RETRIEVAL_CONCURRENT):
+        self.embedder = get_embedder()
         self.vector_store = VectorStore()
         self.bm25 = BM25Retriever()
         self.bm25.load()
@@ -23,104 +47,46 @@ class HybridRetriever:
         # FIX: disable cross encoder to prevent OOM
         self.reranker = None
 
-    def _keyword_score(self, query: str, document: str) -> float:
-        query_tokens = set(re.findall(r"\w+", query.lower()))
-        doc_tokens = set(re.findall(r"\w+", document.lower()))
-
-        if not query_tokens:
-            return 0.0
-
-        overlap = query_tokens.intersection(doc_tokens)
-        return len(overlap) / len(query_tokens)
-
-    def _exact_phrase_boost(self, query: str, document: str) -> float:
-        if query.lower() in document.lower():
-            return 0.3
-        return 0.0
-
-    def _file_name_boost(self, query: str, file_name: str) -> float:
-        if not file_name:
-            return 0.0
-
-        base_name = file_name.lower().replace(".pdf", "").replace(".docx", "")
-        if base_name in query.lower():
-            return 0.25
-
-        return 0.0
-
-    def _numbered_reference_boost(self, query: str, document: str) -> float:
-        query_numbers = re.findall(r"\b\d+\b", query.lower())
-
-        if not query_numbers:
-            return 0.0
-
-        doc_lower = document.lower()
-        score = 0.0
-
-        for number in query_numbers:
-            if re.search(rf"\b{number}\b", doc_lower):
-                score += 0.15
+        self.concurrent = concurrent
+        self.last_lane_timings = {}
 
-        return min(score, 0.3)
+    # -----------------------------
+    # Retrieval lanes
+    # -----------------------------
+    def _submit(self, timings, lane, fn, *args, **kwargs) -> Future:
+        """Start a lane on the shared pool, or run it inline when not concurrent."""
 
-    def _structured_chunk_boost(self, document: str) -> float:
-        colon_count = document.count(":")
-        numeric_tokens = len(re.findall(r"\d+", document))
+        if self.concurrent:
+            return _executor.submit(_timed, timings, lane, fn, *args, **kwargs)
 
-        score = 0.0
-
-        if colon_count >= 3:
-            score += 0.05
-        if numeric_tokens >= 3:
-            score += 0.05
-
-        return min(score, 0.1)
-
-    def _vision_chunk_boost(self, document: str) -> float:
-        vision_markers = [
-            "FULL_PAGE_VISION",
-            "IMAGE_VISION",
-            "CHART_TITLE",
-            "DATA_POINTS",
-            "X_AXIS_LABEL",
-            "Y_AXIS_LABEL",
-            "LEGEND",
-        ]
-
-        if any(marker in document for marker in vision_markers):
-            return 0.15
-
-        return 0.0
-
-    def _entity_density_boost(self, query: str, document: str) -> float:
-        query_tokens = re.findall(r"\w+", query.lower())
-        doc_lower = document.lower()
-
-        meaningful_tokens = [
-            t for t in query_tokens
-            if len(t) >= 3 and not t.isdigit()
-        ]
-
-        if not meaningful_tokens:
-            return 0.0
-
-        matches = 0
+        future = Future()
+        try:
+            future.set_result(_timed(timings, lane, fn, *args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
 
-        for token in meaningful_tokens:
-            if re.search(rf"\b{re.escape(token)}\b", doc_lower):
-                matches += 1
+    def _collection_count(self, fallback: int) -> int:
+        try:
+            return self.vector_store.cached_count()
+        except Exception:
+            logger.warning("Could not fetch collection count. Defaulting candidate pool to k.")
+            return fallback
 
-        density = matches / len(meaningful_tokens)
-        return min(density * 0.20, 0.20)
+    @staticmethod
+    def _chunk_key(meta: dict, rank: int) -> str:
+        # chunk_id: positional id of chunks indexed before chunk_hash
+        file_id = meta.get("file_id", "unknown")
+        if meta.get("chunk_hash"):
+            return f"{file_id}:{meta['chunk_hash']}"
+        return f"{file_id}_{meta.get('chunk_id', rank)}"
 
     def _rrf_fusion(self, semantic_results, bm25_results, top_k, k_constant=60):
         scores = defaultdict(float)
         chunk_lookup = {}
 
         for rank, (doc, meta, _) in enumerate(semantic_results):
-            file_id = meta.get("file_id", "unknown")
-            chunk_id = meta.get("chunk_id", rank)
-            chunk_key = f"{file_id}_{chunk_id}"
+            chunk_key = self._chunk_key(meta, rank)
 
             scores[chunk_key] += 1.0 / (k_constant + rank + 1)
             chunk_lookup[chunk_key] = (doc, meta)
@@ -129,9 +95,7 @@ class HybridRetriever:
             doc = item["document"]
             meta = item["metadata"]
 
-            file_id = meta.get("file_id", "unknown")
-            chunk_id = meta.get("chunk_id", rank)
-            chunk_key = f"{file_id}_{chunk_id}"
+            chunk_key = self._chunk_key(meta, rank)
 
             scores[chunk_key] += 1.0 / (k_constant + rank + 1)
 
@@ -183,10 +147,25 @@ class HybridRetriever:
 
         return final_docs, final_metas, final_scores
 
-    def retrieve(self, query: str, k: int = 5, rewrite_before_retrieve: bool = True):
+    def _embed_query(self, query: str, context: Optional[RequestContext]):
+        if context is not None:
+            return context.embedding(query)
+        return self.embedder.embed([query])[0]
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 5,
+        rewrite_before_retrieve: bool = True,
+        context: Optional[RequestContext] = None,
+    ):
 
         metrics.inc("retrieval_calls")
 
+        # One BM25 generation for the whole request, even if ingestion
+        # publishes a new one while we embed / search
+        bm25_snapshot = self.bm25.snapshot()
+
         if rewrite_before_retrieve:
             try:
                 rewritten = self.query_rewriter.rewrite(query, [])
@@ -197,22 +176,28 @@ class HybridRetriever:
 
         logger.info(f"Vector query (semantic embedding): '{query}'")
 
-        try:
-            query_embedding = self.embedder.embed([query])[0]
-        except Exception:
-            logger.exception("Failed to embed query")
-            return [], [], []
-
         # FIX: reduce memory load
         CANDIDATE_MULTIPLIER = 4
         desired_n = k * CANDIDATE_MULTIPLIER
 
+        timings = {}
+        start = time.perf_counter()
+
+        # BM25 does not need the embedding: it runs next to the
+        # semantic lane (embed → search) and joins it at RRF
+        embed_future = self._submit(timings, "embed", self._embed_query, query, context)
+        count_future = self._submit(timings, "count", self._collection_count, k)
+        bm25_future = self._submit(
+            timings, "bm25", self.bm25.query, query, top_k=desired_n, snapshot=bm25_snapshot
+        )
+
         try:
-            collection_count = self.vector_store.count()
+            query_embedding = embed_future.result()
         except Exception:
-            logger.warning("Could not fetch collection count. Defaulting candidate pool to k.")
-            collection_count = k
+            logger.exception("Failed to embed query")
+            return [], [], []
 
+        collection_count = count_future.result()
         safe_n = max(1, min(desired_n, collection_count))
 
         logger.info(
@@ -220,7 +205,7 @@ class HybridRetriever:
         )
 
         try:
-            results = self.vector_store.query(query_embedding, safe_n)
+            results = _timed(timings, "search", self.vector_store.query, query_embedding, safe_n)
         except Exception:
             logger.exception("Vector store query failed")
             return [], [], []
@@ -235,35 +220,46 @@ class HybridRetriever:
 
         metrics.inc("chunks_retrieved", len(documents))
 
-        semantic_scored = []
-
-        for doc, meta, dist in zip(documents, metadatas, distances):
-            semantic_score = max(0, 1 - dist) if dist is not None else 0
-
-            keyword_score = self._keyword_score(query, doc)
-            phrase_boost = self._exact_phrase_boost(query, doc)
-            file_boost = self._file_name_boost(query, meta.get("file_name", ""))
-            number_boost = self._numbered_reference_boost(query, doc)
-            structure_boost = self._structured_chunk_boost(doc)
-            vision_boost = self._vision_chunk_boost(doc)
-            entity_boost = self._entity_density_boost(query, doc)
-
-            final_score = (
-                0.55 * semantic_score
-                + 0.30 * keyword_score
-                + phrase_boost
-                + file_boost
-                + number_boost
-                + structure_boost
-                + vision_boost
-                + entity_boost
-            )
+        lexical_start = time.perf_counter()
 
-            semantic_scored.append((doc, meta, final_score))
+        # Lexical boosts for all candidates in one vectorized pass,
+        # using features precomputed at ingestion (see lexical_features)
+        semantic = np.array(
+            [max(0, 1 - dist) if dist is not None else 0 for dist in distances],
+            dtype=np.float64,
+        )
+        final_scores = 0.55 * semantic + score_candidates(
+            context.features(query) if context is not None else QueryFeatures(query),
+            documents,
+            metadatas,
+        )
+
+        semantic_scored = [
+            (doc, meta, float(score))
+            for doc, meta, score in zip(documents, metadatas, final_scores)
+        ]
 
         semantic_scored.sort(key=lambda x: x[2], reverse=True)
 
-        bm25_results = self.bm25.query(query, top_k=safe_n)
+        timings["lexical"] = (time.perf_counter() - lexical_start) * 1000
+
+        # fetched with the unclamped pool size; results are sorted, so
+        # cutting to safe_n matches querying with safe_n directly
+        bm25_results = bm25_future.result()[:safe_n]
+
+        timings["semantic_path"] = (
+            max(timings["embed"], timings["count"]) + timings["search"] + timings["lexical"]
+        )
+        timings["total"] = (time.perf_counter() - start) * 1000
+        self.last_lane_timings = timings
+
+        logger.info(
+            "Retrieval lanes (ms) | "
+            + " | ".join(f"{lane}={timings[lane]:.1f}" for lane in (
+                "embed", "count", "search", "lexical", "bm25", "semantic_path", "total",
+            ))
+            + f" | concurrent={self.concurrent}"
+        )
 
         docs, metas, scores = self._rrf_fusion(
             semantic_scored,
@@ -302,7 +298,7 @@ class HybridRetriever:
 
         for i, (doc, meta, score) in enumerate(zip(docs, metas, scores)):
             logger.info(
-                f"Hybrid hit {i + 1} | file={meta.get('file_name')} | chunk={meta.get('chunk_id')} | rrf_score={score:.6f}"
+                f"Hybrid hit {i + 1} | file={meta.get('file_name')} | chunk={meta.get('chunk_hash') or meta.get('chunk_id')} | rrf_score={score:.6f}"
             )
 
         logger.info(f"Retrieved {len(docs)} chunks via hybrid RRF search")
@@ -0,0 +1,80 @@
+# src/providers/retrievers/index_generation.py
+
+import json
+import os
+import time
+from datetime import datetime
+
+# ----------------------------------------------------------
+# Index generation marker
+#
+# Ingestion bumps a small JSON marker next to the index after each
+# publish; the API polls it (one stat() per interval) and swaps in
+# the new generation without a restart.
+# ----------------------------------------------------------
+
+RELOAD_INTERVAL_SECONDS = float(os.getenv("INDEX_RELOAD_INTERVAL", "30"))
+
+
+def marker_path_for(index_path: str) -> str:
+    return os.path.splitext(index_path)[0] + ".generation"
+
+
+def read_generation(marker_path: str) -> int:
+    try:
+        with open(marker_path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("generation", 0))
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_generation(marker_path: str, generation: int, **info):
+    os.makedirs(os.path.dirname(marker_path) or ".", exist_ok=True)
+
+    tmp_path = f"{marker_path}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "generation": generation,
+            "published_at": datetime.utcnow().isoformat(),
+            **info,
+        }, f)
+
+    os.replace(tmp_path, marker_path)
+
+
+class GenerationWatcher:
+    """
+    Cheap change detection for a generation marker: at most one
+    stat() per interval, the JSON is only read when the file changed.
+    """
+
+    def __init__(self, marker_path: str, interval: float = RELOAD_INTERVAL_SECONDS):
+        self.marker_path = marker_path
+        self.interval = interval
+        self._next_check = 0.0
+        self._stamp = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.marker_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def changed(self) -> bool:
+
+        now = time.monotonic()
+
+        if now < self._next_check:
+            return False
+
+        self._next_check = now + self.interval
+
+        stamp = self._stat()
+
+        if stamp == self._stamp:
+            return False
+
+        self._stamp = stamp
+        return True
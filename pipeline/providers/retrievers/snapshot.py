@@ -0,0 +1,51 @@
+# src/providers/retrievers/snapshot.py
+
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SnapshotHolder(Generic[T]):
+    """
+    Copy-on-write holder for an immutable index snapshot.
+
+    Readers call current() once at query start and keep using that
+    reference; it is a plain attribute read, so queries never wait on
+    writers. Writers build the next snapshot off to the side and
+    publish it with a single reference swap. The write lock only
+    serializes writers with each other (so no update is lost), it is
+    never taken on the read path.
+    """
+
+    def __init__(self, initial: T):
+        self._current = initial
+        self._write_lock = threading.Lock()
+        self.version = 0
+
+    def current(self) -> T:
+        return self._current
+
+    def publish(self, snapshot: T) -> T:
+        self._current = snapshot
+        self.version += 1
+        return snapshot
+
+    @contextmanager
+    def writer(self, blocking: bool = True):
+        """
+        Hold the write lock across a read-modify-publish sequence.
+        Yields whether the lock was acquired (always True when blocking).
+        """
+        acquired = self._write_lock.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._write_lock.release()
+
+    def update(self, fn: Callable[[T], T]) -> T:
+        """Derive the next snapshot from the current one and publish it."""
+        with self._write_lock:
+            return self.publish(fn(self._current))
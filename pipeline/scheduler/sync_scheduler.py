@@ -1,11 +1,13 @@
 import os
 import sys
+import threading
 import time
 from datetime import datetime
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 # ----------------------------------------------------------
 # FIX PYTHON PATH
@@ -19,7 +21,7 @@ if PROJECT_ROOT not in sys.path:
 # IMPORT BUSINESS LOGIC
 # ----------------------------------------------------------
 
-from pipeline.ingestion.main import run_sync
+from pipeline.ingestion.main import open_deps, run_sync, sync_changes
 from scripts.backup_sqlite import backup_sqlite
 from scripts.backup_qdrant import backup_qdrant
 from scripts.upload_backup_to_drive import upload_backup
@@ -35,6 +37,32 @@ SYNC_MINUTE = 00
 
 STEP_DELAY_SECONDS = 20  # 2 minutes delay between steps
 
+# daily   : full Drive listing once a day (default)
+# changes : also poll the Drive changes feed every
+#           DRIVE_CHANGES_POLL_SECONDS; the daily full listing
+#           stays on as the reconciliation pass
+DRIVE_SYNC_MODE = os.getenv("DRIVE_SYNC_MODE", "daily").lower()
+DRIVE_CHANGES_POLL_SECONDS = int(os.getenv("DRIVE_CHANGES_POLL_SECONDS", "60"))
+
+# ----------------------------------------------------------
+# SHARED INGESTION STATE (changes mode)
+# ----------------------------------------------------------
+
+# Poll and daily sync never run at the same time, and in changes mode
+# they share one set of stores / indexes so neither persists a BM25
+# index that is missing the other's updates.
+_sync_lock = threading.Lock()
+_deps = None
+
+
+def _ingestion_deps():
+    global _deps
+    if DRIVE_SYNC_MODE != "changes":
+        return None
+    if _deps is None:
+        _deps = open_deps()
+    return _deps
+
 # ----------------------------------------------------------
 # PIPELINE JOB
 # ----------------------------------------------------------
@@ -50,7 +78,8 @@ def run_full_pipeline():
 
     print(f"[{datetime.now(TIMEZONE)}] Starting Drive Sync...")
     try:
-        run_sync(verbose=True)
+        with _sync_lock:
+            run_sync(verbose=True, deps=_ingestion_deps())
         print(f"[{datetime.now(TIMEZONE)}] Drive Sync completed.")
     except Exception as e:
         print(f"[{datetime.now(TIMEZONE)}] Drive Sync failed: {e}")
@@ -92,6 +121,25 @@ def run_full_pipeline():
     print("========================================")
 
 
+# ----------------------------------------------------------
+# CHANGES POLL JOB
+# ----------------------------------------------------------
+
+def poll_drive_changes():
+    if not _sync_lock.acquire(blocking=False):
+        print(f"[{datetime.now(TIMEZONE)}] Drive sync in progress, skipping changes poll.")
+        return
+
+    try:
+        counts = sync_changes(_ingestion_deps())
+        if counts:
+            print(f"[{datetime.now(TIMEZONE)}] Drive changes synced: {counts}")
+    except Exception as e:
+        print(f"[{datetime.now(TIMEZONE)}] Drive changes poll failed: {e}")
+    finally:
+        _sync_lock.release()
+
+
 # ----------------------------------------------------------
 # START SCHEDULER
 # ----------------------------------------------------------
@@ -106,12 +154,24 @@ def start_scheduler():
         replace_existing=True,
     )
 
+    if DRIVE_SYNC_MODE == "changes":
+        scheduler.add_job(
+            poll_drive_changes,
+            IntervalTrigger(seconds=DRIVE_CHANGES_POLL_SECONDS),
+            id="drive_changes_poll",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
     scheduler.start()
 
     print("========================================")
     print("Scheduler Started (IST)")
     print(f"Daily Pipeline Time : {SYNC_HOUR:02d}:{SYNC_MINUTE:02d}")
     print("Order: Sync → SQLite → Qdrant")
+    if DRIVE_SYNC_MODE == "changes":
+        print(f"Drive changes poll  : every {DRIVE_CHANGES_POLL_SECONDS}s")
     print("========================================")
 
     try:
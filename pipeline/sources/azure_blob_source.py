@@ -27,10 +27,16 @@ class AzureBlobSource(BaseSource):
         files = []
 
         for blob in blobs:
+            content_md5 = blob.content_settings.content_md5 if blob.content_settings else None
+
             files.append({
                 "id": blob.name,  # blob name acts as file_id
                 "name": blob.name,
-                "mimeType": self._infer_mime(blob.name)
+                "mimeType": self._infer_mime(blob.name),
+                # revision fields, same keys as the Drive listing
+                "modifiedTime": blob.last_modified.isoformat() if blob.last_modified else None,
+                "md5Checksum": bytes(content_md5).hex() if content_md5 else None,
+                "etag": blob.etag,
             })
 
         logger.info(f"Found {len(files)} blobs")
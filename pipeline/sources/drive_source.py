@@ -42,7 +42,7 @@ def list_drive_documents():
     # Fetch Docs & DOCX
     doc_results = service.files().list(
         q=doc_query,
-        fields="files(id, name, mimeType)",
+        fields="files(id, name, mimeType, modifiedTime, md5Checksum, version)",
         pageSize=100,
     ).execute()
 
@@ -51,7 +51,7 @@ def list_drive_documents():
     # Fetch PDFs + CSV
     folder_results = service.files().list(
         q=folder_query,
-        fields="files(id, name, mimeType)",
+        fields="files(id, name, mimeType, modifiedTime, md5Checksum, version)",
         pageSize=100,
     ).execute()
 
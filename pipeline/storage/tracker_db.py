@@ -4,6 +4,7 @@ import os
 import sqlite3
 from pathlib import Path
 from threading import Lock
+from typing import Dict, Iterable, Optional, Set
 
 # ----------------------------------------------------------
 # Dynamic data directory (Local + Production safe)
@@ -14,6 +15,50 @@ DB_PATH = Path(BASE_DATA_DIR) / "tracker.db"
 
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# ----------------------------------------------------------
+# Source revisions
+#
+# What the listing reports about a file's current content, in the
+# order they are compared: the first field both the stored and the
+# listed revision have decides whether the file changed.
+#
+#   md5_checksum   Drive binaries (DOCX / PDF / CSV), Azure blobs
+#   etag           Azure blobs
+#   modified_time  everything; the only content signal for Google Docs
+#   version        Drive; also bumps on sharing / metadata changes
+# ----------------------------------------------------------
+
+REVISION_FIELDS = ("md5_checksum", "etag", "modified_time", "version")
+
+# listing key → files column
+_LISTING_KEYS = {
+    "md5Checksum":  "md5_checksum",
+    "etag":         "etag",
+    "modifiedTime": "modified_time",
+    "version":      "version",
+}
+
+
+def revision_of(doc: dict) -> Dict[str, Optional[str]]:
+    """Revision fields of a listed file (Drive / Azure listing dict)."""
+    return {
+        column: (str(doc[key]) if doc.get(key) is not None else None)
+        for key, column in _LISTING_KEYS.items()
+    }
+
+
+def revision_changed(stored: dict, current: dict) -> bool:
+    """
+    True if the listed revision differs from the one recorded at
+    ingestion. Rows ingested before revisions were tracked (nothing
+    to compare) count as unchanged.
+    """
+    for field in REVISION_FIELDS:
+        old, new = stored.get(field), current.get(field)
+        if old and new:
+            return old != new
+    return False
+
 
 class TrackerDB:
     _lock = Lock()  # Ensures safe writes across background threads
@@ -37,9 +82,31 @@ class TrackerDB:
             # ── CHANGED: added file_url column ──────────────────────────
             self.conn.execute("""
                 CREATE TABLE IF NOT EXISTS files (
-                    file_id   TEXT PRIMARY KEY,
-                    file_name TEXT,
-                    file_url  TEXT
+                    file_id       TEXT PRIMARY KEY,
+                    file_name     TEXT,
+                    file_url      TEXT,
+                    modified_time TEXT,
+                    md5_checksum  TEXT,
+                    version       TEXT,
+                    etag          TEXT
+                )
+            """)
+
+            # Chunk manifest: content hashes of every indexed chunk per
+            # file, diffed against the new chunks when the file changes
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_manifest (
+                    file_id    TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    PRIMARY KEY (file_id, chunk_hash)
+                )
+            """)
+
+            # Sync state (e.g. the Drive changes-feed page token)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key   TEXT PRIMARY KEY,
+                    value TEXT
                 )
             """)
 
@@ -58,14 +125,15 @@ class TrackerDB:
 
     # ── NEW: backward-compat migration for existing DBs ─────────────────
     def _migrate(self):
-        """Add file_url column to files table if it doesn't exist yet."""
+        """Add file_url / revision columns to files table if they don't exist yet."""
         with self._lock:
-            try:
-                self.conn.execute("ALTER TABLE files ADD COLUMN file_url TEXT")
-                self.conn.commit()
-            except sqlite3.OperationalError:
-                # Column already exists — safe to ignore
-                pass
+            for column in ("file_url",) + REVISION_FIELDS:
+                try:
+                    self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} TEXT")
+                    self.conn.commit()
+                except sqlite3.OperationalError:
+                    # Column already exists — safe to ignore
+                    pass
 
     # ──────────────────────────────────────────────────────────────
     # files table methods
@@ -80,11 +148,46 @@ class TrackerDB:
         return cur.fetchone() is not None
 
     # ── CHANGED: now accepts and stores file_url ─────────────────
-    def mark_ingested(self, file_id: str, file_name: str, file_url: str = ""):
+    def mark_ingested(
+        self,
+        file_id: str,
+        file_name: str,
+        file_url: str = "",
+        revision: Optional[dict] = None,
+    ):
+        """Record (or, after a re-ingest, update) a file and the revision that was indexed."""
+        revision = revision or {}
+        values = [revision.get(field) for field in REVISION_FIELDS]
+
         with self._lock:
             self.conn.execute(
-                "INSERT OR IGNORE INTO files (file_id, file_name, file_url) VALUES (?, ?, ?)",
-                (file_id, file_name, file_url)
+                f"""
+                INSERT INTO files (file_id, file_name, file_url, {", ".join(REVISION_FIELDS)})
+                VALUES (?, ?, ?, {", ".join("?" * len(REVISION_FIELDS))})
+                ON CONFLICT (file_id) DO UPDATE SET
+                    file_name = excluded.file_name,
+                    file_url  = excluded.file_url,
+                    {", ".join(f"{field} = excluded.{field}" for field in REVISION_FIELDS)}
+                """,
+                [file_id, file_name, file_url] + values
+            )
+            self.conn.commit()
+
+    def get_all_revisions(self) -> Dict[str, dict]:
+        """file_id → { file_name, <revision fields> } for every ingested file, in one query."""
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT file_id, file_name, {', '.join(REVISION_FIELDS)} FROM files")
+        return {
+            row[0]: dict(zip(("file_name",) + REVISION_FIELDS, row[1:]))
+            for row in cur.fetchall()
+        }
+
+    def set_revision(self, file_id: str, revision: dict):
+        """Adopt the listed revision for a file ingested before revisions were tracked."""
+        with self._lock:
+            self.conn.execute(
+                f"UPDATE files SET {', '.join(f'{field} = ?' for field in REVISION_FIELDS)} WHERE file_id=?",
+                [revision.get(field) for field in REVISION_FIELDS] + [file_id]
             )
             self.conn.commit()
 
@@ -94,6 +197,10 @@ class TrackerDB:
                 "DELETE FROM files WHERE file_id=?",
                 (file_id,)
             )
+            self.conn.execute(
+                "DELETE FROM chunk_manifest WHERE file_id=?",
+                (file_id,)
+            )
             self.conn.commit()
 
     def get_all_file_ids(self) -> set:
@@ -113,6 +220,52 @@ class TrackerDB:
     def close(self):
         self.conn.close()
 
+    # ──────────────────────────────────────────────────────────────
+    # chunk_manifest table methods
+    # ──────────────────────────────────────────────────────────────
+
+    def get_chunk_manifest(self, file_id: str) -> Set[str]:
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT chunk_hash FROM chunk_manifest WHERE file_id=?",
+            (file_id,)
+        )
+        return {row[0] for row in cur.fetchall()}
+
+    def set_chunk_manifest(self, file_id: str, chunk_hashes: Iterable[str]):
+        """Replace the file's manifest with the chunks now indexed."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM chunk_manifest WHERE file_id=?",
+                (file_id,)
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO chunk_manifest (file_id, chunk_hash) VALUES (?, ?)",
+                [(file_id, chunk_hash) for chunk_hash in chunk_hashes]
+            )
+            self.conn.commit()
+
+    # ──────────────────────────────────────────────────────────────
+    # sync_state table methods
+    # ──────────────────────────────────────────────────────────────
+
+    def get_sync_state(self, key: str) -> Optional[str]:
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT value FROM sync_state WHERE key=?",
+            (key,)
+        )
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def set_sync_state(self, key: str, value: str):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                (key, value)
+            )
+            self.conn.commit()
+
     # ──────────────────────────────────────────────────────────────
     # latest_documents table methods (UNCHANGED)
     # ──────────────────────────────────────────────────────────────
@@ -0,0 +1,220 @@
+# src/utils/lexical_features.py
+
+import base64
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from pipeline.utils.metrics import metrics
+
+# ----------------------------------------------------------
+# Per-chunk lexical features
+#
+# Computed once at ingestion and stored in the chunk payload under
+# "lexical", so HybridRetriever can score every semantic candidate
+# in one NumPy pass instead of re-scanning each chunk's text with
+# several regexes per query.
+#
+# Every \w+ token of the lowercased chunk is hashed to a stable
+# 64-bit id; "query token t occurs in the chunk" (including the old
+# \bNUMBER\b / \bTOKEN\b checks) becomes "hash(t) in token_ids".
+# ----------------------------------------------------------
+
+FEATURES_KEY = "lexical"
+FEATURES_VERSION = 1
+
+VISION_MARKERS = (
+    "FULL_PAGE_VISION",
+    "IMAGE_VISION",
+    "CHART_TITLE",
+    "DATA_POINTS",
+    "X_AXIS_LABEL",
+    "Y_AXIS_LABEL",
+    "LEGEND",
+)
+
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+
+_EMPTY_IDS = np.empty(0, dtype=np.uint64)
+
+
+def token_id(token: str) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def token_ids(tokens) -> np.ndarray:
+    """Sorted, unique uint64 ids for tokens."""
+    ids = np.fromiter((token_id(t) for t in set(tokens)), dtype=np.uint64)
+    ids.sort()
+    return ids
+
+
+def normalize_file_name(file_name: str) -> str:
+    if not file_name:
+        return ""
+    return file_name.lower().replace(".pdf", "").replace(".docx", "")
+
+
+# ----------------------------------------------------------
+# Chunk side (ingestion)
+# ----------------------------------------------------------
+
+class ChunkFeatures:
+
+    __slots__ = ("token_ids", "numeric_count", "colon_count", "has_vision_marker", "file_name_norm")
+
+    def __init__(self, token_ids, numeric_count, colon_count, has_vision_marker, file_name_norm):
+        self.token_ids = token_ids
+        self.numeric_count = numeric_count
+        self.colon_count = colon_count
+        self.has_vision_marker = has_vision_marker
+        self.file_name_norm = file_name_norm
+
+
+def _extract(document: str, file_name: str) -> ChunkFeatures:
+    return ChunkFeatures(
+        token_ids(_WORD.findall(document.lower())),
+        len(_DIGITS.findall(document)),
+        document.count(":"),
+        any(marker in document for marker in VISION_MARKERS),
+        normalize_file_name(file_name),
+    )
+
+
+def compute_features(document: str, file_name: str = "") -> Dict:
+    """Payload-ready features for one chunk (JSON-serializable)."""
+
+    features = _extract(document or "", file_name)
+
+    return {
+        "v": FEATURES_VERSION,
+        "token_ids": base64.b64encode(features.token_ids.astype("<u8").tobytes()).decode("ascii"),
+        "numeric_count": features.numeric_count,
+        "colon_count": features.colon_count,
+        "has_vision_marker": features.has_vision_marker,
+        "file_name_norm": features.file_name_norm,
+    }
+
+
+def load_features(document: str, metadata: Dict) -> Optional[ChunkFeatures]:
+    """
+    Decode stored features, or compute them from the text for chunks
+    ingested before features existed (returns None only if the
+    payload is unusable and there is no text either).
+    """
+
+    stored = metadata.get(FEATURES_KEY)
+
+    if isinstance(stored, dict) and stored.get("v") == FEATURES_VERSION:
+        try:
+            return ChunkFeatures(
+                np.frombuffer(base64.b64decode(stored["token_ids"]), dtype="<u8"),
+                int(stored["numeric_count"]),
+                int(stored["colon_count"]),
+                bool(stored["has_vision_marker"]),
+                stored.get("file_name_norm", ""),
+            )
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    if document is None:
+        return None
+
+    return _extract(document, metadata.get("file_name", ""))
+
+
+# ----------------------------------------------------------
+# Query side (retrieval)
+# ----------------------------------------------------------
+
+class QueryFeatures:
+    """Everything the boosts need from the query, computed once."""
+
+    def __init__(self, query: str):
+        self.query_lower = query.lower()
+
+        tokens = _WORD.findall(self.query_lower)
+        unique = sorted(set(tokens), key=token_id)
+
+        self.ids = np.fromiter((token_id(t) for t in unique), dtype=np.uint64, count=len(unique))
+        position = {t: i for i, t in enumerate(unique)}
+
+        # \b\d+\b matches exactly the all-digit \w+ tokens; repeats count
+        self.number_weights = np.zeros(len(unique))
+        for t in tokens:
+            if _DIGITS.fullmatch(t):
+                self.number_weights[position[t]] += 1
+
+        # meaningful tokens for entity density, repeats count
+        self.entity_weights = np.zeros(len(unique))
+        for t in tokens:
+            if len(t) >= 3 and not t.isdigit():
+                self.entity_weights[position[t]] += 1
+
+        self.num_entities = float(self.entity_weights.sum())
+
+
+def score_candidates(query: QueryFeatures, documents: List[str], metadatas: List[Dict]) -> np.ndarray:
+    """
+    Lexical part of the hybrid score for every candidate:
+
+        0.30 * keyword overlap + phrase + file name + numbered
+        reference + structure + vision + entity density boosts
+    """
+
+    n = len(documents)
+    features = [load_features(doc, meta or {}) for doc, meta in zip(documents, metadatas)]
+
+    metrics.inc(
+        "lexical_features_fallback",
+        sum(1 for meta in metadatas if not isinstance((meta or {}).get(FEATURES_KEY), dict)),
+    )
+
+    ids = [f.token_ids if f is not None else _EMPTY_IDS for f in features]
+    m = len(query.ids)
+
+    # ---- query-token presence matrix, one pass over all candidates
+    present = np.zeros((n, m))
+
+    if n and m:
+        lengths = np.fromiter((len(x) for x in ids), dtype=np.int64, count=n)
+        all_ids = np.concatenate(ids) if lengths.sum() else _EMPTY_IDS
+        owner = np.repeat(np.arange(n), lengths)
+
+        hit = np.isin(all_ids, query.ids)
+        present[owner[hit], np.searchsorted(query.ids, all_ids[hit])] = 1.0
+
+    scores = np.zeros(n)
+
+    if m:
+        scores += 0.30 * present.sum(axis=1) / m
+        scores += np.minimum(0.15 * (present @ query.number_weights), 0.3)
+
+    if query.num_entities:
+        scores += np.minimum(0.20 * (present @ query.entity_weights) / query.num_entities, 0.20)
+
+    # ---- per-chunk scalar features
+    colon_count = np.fromiter((f.colon_count if f else 0 for f in features), dtype=np.int64, count=n)
+    numeric_count = np.fromiter((f.numeric_count if f else 0 for f in features), dtype=np.int64, count=n)
+    vision = np.fromiter((bool(f and f.has_vision_marker) for f in features), dtype=bool, count=n)
+
+    scores += np.minimum(0.05 * (colon_count >= 3) + 0.05 * (numeric_count >= 3), 0.1)
+    scores += 0.15 * vision
+
+    # ---- substring checks need the raw strings
+    query_lower = query.query_lower
+
+    scores += 0.25 * np.fromiter(
+        (bool(f and f.file_name_norm and f.file_name_norm in query_lower) for f in features),
+        dtype=bool, count=n,
+    )
+    scores += 0.3 * np.fromiter(
+        (doc is not None and query_lower in doc.lower() for doc in documents),
+        dtype=bool, count=n,
+    )
+
+    return scores
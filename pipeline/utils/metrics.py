@@ -1,6 +1,50 @@
+import threading
+
+
+class Histogram:
+    """
+    Bucketed counts that live outside Metrics.data, for process-wide
+    series that must survive the per-request metrics.reset().
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._data = self._empty()
+
+    def _empty(self):
+        return {
+            "count": 0,
+            "sum": 0,
+            "buckets": {**{f"le_{b}": 0 for b in self.buckets}, "le_inf": 0},
+        }
+
+    def observe(self, value):
+        with self._lock:
+            _observe(self._data, self.buckets, value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self._data, "buckets": dict(self._data["buckets"])}
+
+
+def _observe(hist: dict, buckets, value):
+    hist["count"] += 1
+    hist["sum"] += value
+
+    for bound in buckets:
+        if value <= bound:
+            hist["buckets"][f"le_{bound}"] += 1
+            return
+
+    hist["buckets"]["le_inf"] += 1
+
+
 class Metrics:
 
     def __init__(self):
+        # inc() / observe() run on request, dispatcher and ingestion threads
+        self._lock = threading.Lock()
         self.reset()
 
     def reset(self):
@@ -57,9 +101,25 @@ class Metrics:
     # Generic increment
     # -------------------------
     def inc(self, key, amount=1):
-        if key not in self.data:
-            self.data[key] = 0
-        self.data[key] += amount
+        with self._lock:
+            if key not in self.data:
+                self.data[key] = 0
+            self.data[key] += amount
+
+    # -------------------------
+    # Histograms
+    # -------------------------
+    def observe(self, key, value, buckets):
+        """Count value into the first bucket whose upper bound >= value."""
+        with self._lock:
+            if key not in self.data:
+                self.data[key] = {
+                    "count": 0,
+                    "sum": 0,
+                    "buckets": {**{f"le_{b}": 0 for b in buckets}, "le_inf": 0},
+                }
+
+            _observe(self.data[key], buckets, value)
 
     # -------------------------
     # LLM tracking
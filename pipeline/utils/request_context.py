@@ -0,0 +1,68 @@
+# src/utils/request_context.py
+
+import threading
+import uuid
+from typing import Dict, Optional
+
+import numpy as np
+
+from pipeline.interfaces.base_embedder import BaseEmbedder
+from pipeline.utils.lexical_features import QueryFeatures
+from pipeline.utils.metrics import metrics
+
+# ----------------------------------------------------------
+# Per-request query state
+#
+# Created once per /chat request and handed to everything that
+# needs the query's embedding or token analysis (semantic cache
+# lookup, hybrid retrieval, cache save), so each distinct query
+# text is embedded once per request. A rewritten query on retry
+# is a different text and gets its own entry.
+# ----------------------------------------------------------
+
+
+class RequestContext:
+
+    def __init__(self, query: str, embedder: Optional[BaseEmbedder] = None):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.query = (query or "").strip()
+
+        self._embedder = embedder
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._features: Dict[str, QueryFeatures] = {}
+        self._lock = threading.Lock()
+
+        # backend embed calls made on behalf of this request
+        self.embed_calls = 0
+
+    @property
+    def embedder(self) -> BaseEmbedder:
+        if self._embedder is None:
+            from pipeline.providers.embeddings.embedder_factory import get_embedder
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def embedding(self, text: Optional[str] = None) -> np.ndarray:
+        """1-D float32 embedding of `text` (default: the request query)."""
+        text = self.query if text is None else text.strip()
+
+        # held across the call: concurrent lanes wait for the first
+        # embed instead of issuing their own
+        with self._lock:
+            vector = self._embeddings.get(text)
+            if vector is None:
+                vector = self.embedder.embed([text])[0]
+                self._embeddings[text] = vector
+                self.embed_calls += 1
+                metrics.inc("query_embed_calls")
+            return vector
+
+    def features(self, text: Optional[str] = None) -> QueryFeatures:
+        text = self.query if text is None else text.strip()
+
+        with self._lock:
+            features = self._features.get(text)
+            if features is None:
+                features = QueryFeatures(text)
+                self._features[text] = features
+            return features
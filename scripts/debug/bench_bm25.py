@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import random
+import argparse
+from itertools import accumulate
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from pipeline.providers.retrievers.bm25_index import BM25Index
+
+
+# --------------------------------------------------
+# Synthetic Zipf corpus → BM25 query counters
+# Compares BlockMax-WAND against exhaustive postings
+# traversal on the same index.
+# --------------------------------------------------
+
+def build_corpus(index, num_docs, vocab_size, doc_len, batch=10_000, seed=7):
+    rng = random.Random(seed)
+    vocab = [f"t{i}" for i in range(vocab_size)]
+    cum_weights = list(accumulate(1.0 / (i + 1) for i in range(vocab_size)))
+
+    for start in range(0, num_docs, batch):
+        n = min(batch, num_docs - start)
+        index = index.with_documents([
+            rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(doc_len // 2, doc_len * 2))
+            for _ in range(n)
+        ])
+
+    return index, vocab, cum_weights
+
+
+def run_queries(index, queries, k, prune):
+    totals = {"postings_total": 0, "postings_scanned": 0, "docs_scored": 0}
+    start = time.perf_counter()
+
+    for tokens in queries:
+        stats = {}
+        index.top_k(tokens, k, prune=prune, stats=stats)
+        for key in totals:
+            totals[key] += stats[key]
+
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return elapsed_ms, {key: v / len(queries) for key, v in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--doc-len", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    index = BM25Index()
+
+    start = time.perf_counter()
+    index, vocab, cum_weights = build_corpus(index, args.docs, args.vocab, args.doc_len)
+    print(f"Indexed {index.num_docs} docs in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(11)
+    queries = [
+        rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(2, 5))
+        for _ in range(args.queries)
+    ]
+
+    for label, prune in [("exhaustive", False), ("blockmax-wand", True)]:
+        ms, avg = run_queries(index, queries, args.k, prune)
+        print(
+            f"{label:14s} | {ms:8.2f} ms/query"
+            f" | postings scanned {avg['postings_scanned']:10.0f}"
+            f" / {avg['postings_total']:10.0f}"
+            f" | docs scored {avg['docs_scored']:10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from pipeline.providers.embeddings.local_embedder import LocalEmbedder, LOCAL_EMBEDDING_MODEL_DIR
+
+
+# --------------------------------------------------
+# Query-embedding latency: local in-process model vs
+# the Hugging Face HTTP backend.
+#
+#   --fixture   build a tiny random bge-shaped model (2 layers,
+#               384 dims) in a temp dir, so the local path can be
+#               exercised offline without downloading weights;
+#               written as an ST model dir and as model.onnx +
+#               tokenizer.json, so both runtimes load it
+#   --runtime   sentence-transformers | onnx | all (all also
+#               checks that the runtimes agree on the same model)
+#
+# Every run checks the vectors: (n, 384), float32, unit norm.
+#   --http      also measure BGEEmbedder (needs HF_API_TOKEN)
+# --------------------------------------------------
+
+WORDS = (
+    "revenue policy leave quarterly report employee benefits travel expense "
+    "chart summary table total growth region product onboarding security"
+).split()
+
+
+def build_fixture_model(path: str, dim: int = 384):
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(set(WORDS))
+    vocab_file = os.path.join(path, "vocab.txt")
+
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab))
+
+    tokenizer = BertTokenizerFast(vocab_file=vocab_file, do_lower_case=True)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=dim,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=dim * 2,
+        max_position_embeddings=512,
+    )
+
+    BertModel(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+    transformer = models.Transformer(path, max_seq_length=512)
+    pooling = models.Pooling(dim, pooling_mode="cls")
+
+    SentenceTransformer(modules=[transformer, pooling, models.Normalize()]).save(path)
+
+    export_onnx(path)
+
+
+def export_onnx(path: str):
+    import torch
+    from transformers import AutoTokenizer, BertModel
+
+    model = BertModel.from_pretrained(path).eval()
+    inputs = AutoTokenizer.from_pretrained(path)(["revenue policy"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {"batch": 0, "seq": 1}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(inputs[name] for name in names),
+            os.path.join(path, "model.onnx"),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "seq"} for name in names + ["last_hidden_state"]},
+            opset_version=17,
+        )
+
+
+def make_queries(n: int, seed: int = 5):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(6, 12))) for _ in range(n)]
+
+
+def check_vectors(label, vectors, n: int, dim: int = 384):
+    vectors = np.asarray(vectors)
+    norms = np.linalg.norm(vectors, axis=1)
+
+    problems = []
+    if vectors.shape != (n, dim):
+        problems.append(f"shape {vectors.shape}, expected {(n, dim)}")
+    if vectors.dtype != np.float32:
+        problems.append(f"dtype {vectors.dtype}, expected float32")
+    if not np.allclose(norms, 1.0, atol=1e-4):
+        problems.append(f"norms in [{norms.min():.5f}, {norms.max():.5f}], expected 1")
+
+    if problems:
+        raise SystemExit(f"{label}: " + "; ".join(problems))
+
+
+def bench(label, embedder, queries, batch):
+    # warm-up (model load / connection setup)
+    embedder.embed(queries[:1])
+
+    latencies = []
+
+    for query in queries:
+        start = time.perf_counter()
+        embedder.embed([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+
+    start = time.perf_counter()
+    vectors = embedder.embed(batch)
+    elapsed = time.perf_counter() - start
+
+    check_vectors(label, vectors, len(batch))
+
+    print(
+        f"{label:8s} | single query p50 {statistics.median(latencies):8.2f} ms"
+        f" | p95 {p95:8.2f} ms"
+        f" | batch of {len(batch)}: {len(batch) / elapsed:8.1f} texts/s"
+        f" | dim {len(vectors[0])}"
+    )
+
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default=LOCAL_EMBEDDING_MODEL_DIR)
+    parser.add_argument("--runtime", default="sentence-transformers", choices=["sentence-transformers", "onnx", "all"])
+    parser.add_argument("--fixture", action="store_true")
+    parser.add_argument("--http", action="store_true")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    batch = make_queries(args.batch, seed=9)
+
+    model_dir = args.model_dir
+
+    if args.fixture:
+        model_dir = tempfile.mkdtemp(prefix="bge-fixture-")
+        build_fixture_model(model_dir)
+        print(f"Fixture model written to {model_dir}")
+
+    runtimes = ["sentence-transformers", "onnx"] if args.runtime == "all" else [args.runtime]
+
+    results = {
+        runtime: bench("st" if runtime == "sentence-transformers" else runtime, LocalEmbedder(model_dir=model_dir, runtime=runtime), queries, batch)
+        for runtime in runtimes
+    }
+
+    if len(results) > 1:
+        st, onnx = results["sentence-transformers"], results["onnx"]
+        cosine = np.sum(st * onnx, axis=1)
+        print(f"runtimes agree: min cosine {cosine.min():.6f}")
+        if cosine.min() < 0.999:
+            raise SystemExit("sentence-transformers and onnx vectors differ")
+
+    if args.http:
+        from pipeline.providers.embeddings.bge_embedder import BGEEmbedder
+        bench("http", BGEEmbedder(), queries, batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import tracemalloc
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+# --------------------------------------------------
+# Embedding representation: lists of Python floats
+# (before) vs contiguous float32 arrays (after).
+#
+#   memory   bytes held by N embeddings
+#   decode   JSON wire payload → in-memory batch
+#   cosine   one query against N cached embeddings
+#   encode   in-memory batch → JSON-ready lists (wire)
+# --------------------------------------------------
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def held_bytes(build):
+    tracemalloc.start()
+    value = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, value
+
+
+def cosine_lists(query, rows):
+    # pre-change session_manager._cosine_similarity, once per row
+    norm_q = math.sqrt(sum(x * x for x in query))
+    scores = []
+    for row in rows:
+        dot = sum(x * y for x, y in zip(query, row))
+        norm_r = math.sqrt(sum(y * y for y in row))
+        scores.append(dot / (norm_q * norm_r))
+    return scores
+
+
+def cosine_array(query, matrix):
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return (matrix @ query) / norms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    payload = json.dumps([
+        [rng.uniform(-1, 1) for _ in range(args.dim)]
+        for _ in range(args.n)
+    ])
+
+    list_bytes, rows = held_bytes(lambda: json.loads(payload))
+    array_bytes, matrix = held_bytes(lambda: np.asarray(json.loads(payload), dtype=np.float32))
+
+    decode_lists, _ = timed(lambda: json.loads(payload), repeat=3)
+    decode_array, _ = timed(lambda: np.asarray(json.loads(payload), dtype=np.float32), repeat=3)
+
+    query_list = rows[0]
+    query_array = matrix[0]
+
+    cosine_before, _ = timed(lambda: cosine_lists(query_list, rows), repeat=1)
+    cosine_after, _ = timed(lambda: cosine_array(query_array, matrix))
+
+    encode_before, _ = timed(lambda: [list(row) for row in rows], repeat=3)
+    encode_after, _ = timed(lambda: matrix.tolist(), repeat=3)
+
+    print(f"{args.n} embeddings x {args.dim} dims")
+    print(f"{'':10s} | {'lists (before)':>16s} | {'float32 (after)':>16s}")
+    print(f"{'memory':10s} | {list_bytes / 1e6:13.1f} MB | {array_bytes / 1e6:13.1f} MB"
+          f"   ({list_bytes / max(args.n, 1) / 1e3:.1f} KB → {matrix.nbytes / max(args.n, 1) / 1e3:.1f} KB per vector)")
+    print(f"{'decode':10s} | {decode_lists:13.1f} ms | {decode_array:13.1f} ms   (array includes the json parse)")
+    print(f"{'cosine':10s} | {cosine_before:13.1f} ms | {cosine_after:13.1f} ms")
+    print(f"{'to wire':10s} | {encode_before:13.1f} ms | {encode_after:13.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
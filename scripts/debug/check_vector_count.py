@@ -1,5 +1,4 @@
 from pipeline.embedding.vector_store import VectorStore
 
 store = VectorStore()
-print("Vector count:", store.count())
-
+print("Vector count:", store.cached_count())
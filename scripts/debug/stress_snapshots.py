@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from pipeline.providers.retrievers.bm25_index import BM25Index
+from pipeline.providers.retrievers.snapshot import SnapshotHolder
+
+
+# --------------------------------------------------
+# Concurrent writers / readers over BM25 snapshots
+#
+# Every write adds (or deletes) one whole file of BATCH chunks,
+# so any snapshot a reader can observe must contain whole files
+# only. Readers check that on every query; a torn read shows up
+# as a partial file, a match count that disagrees with the
+# snapshot's own stats or a stored document from another file.
+# --------------------------------------------------
+
+def make_file(file_id, batch, rng):
+    tokens, documents = [], []
+
+    for chunk_no in range(batch):
+        words = ["common", file_id] + [f"w{rng.randint(0, 200)}" for _ in range(rng.randint(3, 30))]
+        tokens.append(words)
+        documents.append((" ".join(words), {"file_id": file_id, "chunk": chunk_no}))
+
+    return tokens, documents
+
+
+def writer(holder, stop, batch, counters, writer_id):
+    rng = random.Random(writer_id)
+    file_no = 0
+
+    while not stop.is_set():
+
+        if file_no > 5 and rng.random() < 0.3:
+            victim = f"w{writer_id}-file-{rng.randrange(file_no)}"
+            with holder.writer():
+                index, _ = holder.current().with_file_deleted(victim)
+                holder.publish(index)
+            counters["deletes"] += 1
+            continue
+
+        # built outside the lock, like BM25Retriever.add_chunks
+        tokens, documents = make_file(f"w{writer_id}-file-{file_no}", batch, rng)
+        holder.update(lambda index: index.with_documents(tokens, documents))
+
+        file_no += 1
+        counters["writes"] += 1
+
+
+def check(index, batch):
+    live = index.num_docs - len(index.deleted)
+
+    if index.num_docs % batch or len(index.deleted) % batch:
+        return f"partial file: num_docs={index.num_docs} deleted={len(index.deleted)}"
+
+    hits = index.top_k(["common"], index.num_docs + 1)
+
+    if len(hits) != live:
+        return f"'common' matched {len(hits)} docs, snapshot has {live} live"
+
+    per_file = {}
+
+    for doc_id, _ in hits:
+        document, metadata = index.get_document(doc_id)
+        file_id = metadata.get("file_id")
+        if file_id is None or file_id not in document:
+            return f"doc {doc_id} stored document does not match its metadata"
+        per_file[file_id] = per_file.get(file_id, 0) + 1
+
+    for file_id, count in per_file.items():
+        if count != batch:
+            return f"{file_id} visible with {count}/{batch} chunks"
+
+    return None
+
+
+def reader(holder, stop, batch, counters, errors):
+    while not stop.is_set():
+        index = holder.current()
+        error = check(index, batch)
+        counters["reads"] += 1
+        if error:
+            errors.append(error)
+            stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    # let threads switch mid-update as often as possible
+    sys.setswitchinterval(1e-5)
+
+    holder = SnapshotHolder(BM25Index())
+    stop = threading.Event()
+    counters = {"writes": 0, "deletes": 0, "reads": 0}
+    errors = []
+
+    threads = [
+        threading.Thread(target=writer, args=(holder, stop, args.batch, counters, writer_id))
+        for writer_id in range(args.writers)
+    ] + [
+        threading.Thread(target=reader, args=(holder, stop, args.batch, counters, errors))
+        for _ in range(args.readers)
+    ]
+
+    for t in threads:
+        t.start()
+
+    time.sleep(args.seconds)
+    stop.set()
+
+    for t in threads:
+        t.join()
+
+    index = holder.current()
+    print(
+        f"writes={counters['writes']} deletes={counters['deletes']} reads={counters['reads']} "
+        f"| final docs={index.num_docs} deleted={len(index.deleted)} "
+        f"segments={len(index.segments)}"
+    )
+
+    if errors:
+        print(f"TORN READ: {errors[0]}")
+        sys.exit(1)
+
+    print("OK: no torn reads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+# --------------------------------------------------
+# One-off: rebuild doc_frequency from the full messages history.
+#
+# Counts are overwritten, not added to, so the job can be re-run.
+# Run it with the API stopped (or before first deploying the
+# aggregate): increments queued by a live API while it runs would
+# be overwritten.
+# --------------------------------------------------
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, "..", ".."))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "backend")
+
+for _path in [PROJECT_ROOT, BACKEND_DIR]:
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from session_manager import scan_doc_frequency, store
+
+BATCH_SIZE = 500
+
+
+def backfill_doc_frequency() -> int:
+    freq = scan_doc_frequency()
+
+    rows = [
+        {
+            "file_name":  name,
+            "url":        data["url"],
+            "count":      data["count"],
+            "session_id": data["session_id"],
+        }
+        for name, data in freq.items()
+    ]
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        store.upsert("doc_frequency", rows[start:start + BATCH_SIZE])
+
+    return len(rows)
+
+
+if __name__ == "__main__":
+    n = backfill_doc_frequency()
+    print(f"doc_frequency backfilled: {n} documents")
@@ -0,0 +1,103 @@
+-- --------------------------------------------------
+-- Session store objects for SESSION_STORE=supabase.
+--
+-- Run once in the Supabase SQL editor (safe to re-run), then
+-- backfill the aggregate from existing history:
+--
+--   python scripts/run/backfill_doc_frequency.py
+--
+-- Without these the API still works: SupabaseStore falls back
+-- to client-side read-modify-write increments, /frequent_docs to
+-- a full scan of `messages`, and the cache retention sweep to
+-- paging the whole cache table.
+-- --------------------------------------------------
+
+
+-- /frequent_docs aggregate: one row per document, incremented
+-- for every source of every message written.
+create table if not exists doc_frequency (
+    file_name  text primary key,
+    url        text,
+    count      bigint not null default 0,
+    session_id text
+);
+
+create index if not exists idx_doc_frequency_count on doc_frequency (count desc);
+
+
+-- Atomic counter update behind SupabaseStore.increment()
+-- (sessions.message_count, cache.hit_count, doc_frequency.count).
+-- Arguments are jsonb objects of column → value, typed through
+-- the table's row type. Identifiers go through %I.
+create or replace function increment_column(
+    p_table    text,
+    p_filters  jsonb,
+    p_column   text,
+    p_amount   bigint,
+    p_values   jsonb default '{}'::jsonb,
+    p_defaults jsonb default null
+) returns void
+language plpgsql
+as $$
+declare
+    v_row      jsonb := p_filters || coalesce(p_defaults, '{}'::jsonb) || p_values
+                        || jsonb_build_object(p_column, p_amount);
+    v_cols     text;
+    v_keys     text;
+    v_where    text;
+    v_set      text;
+begin
+    select string_agg(format('%I', k), ', ') into v_keys from jsonb_object_keys(p_filters) k;
+    select string_agg(format('t.%I = r.%I', k, k), ' and ') into v_where from jsonb_object_keys(p_filters) k;
+
+    select string_agg(format('%I = r.%I', k, k), ', ') into v_set
+    from jsonb_object_keys(p_values) k;
+
+    if p_defaults is null then
+        execute format(
+            'update %I t set %I = coalesce(t.%I, 0) + $1%s
+             from jsonb_populate_record(null::%I, $2) r where %s',
+            p_table, p_column, p_column,
+            coalesce(', ' || v_set, ''),
+            p_table, v_where
+        ) using p_amount, p_filters || p_values;
+    else
+        select string_agg(format('%I', k), ', ') into v_cols from jsonb_object_keys(v_row) k;
+        select string_agg(format('%I = excluded.%I', k, k), ', ') into v_set
+        from jsonb_object_keys(p_values) k;
+
+        execute format(
+            'insert into %I as t (%s) select %s from jsonb_populate_record(null::%I, $1)
+             on conflict (%s) do update set %I = coalesce(t.%I, 0) + excluded.%I%s',
+            p_table, v_cols, v_cols, p_table,
+            v_keys, p_column, p_column, p_column,
+            coalesce(', ' || v_set, '')
+        ) using v_row;
+    end if;
+end;
+$$;
+
+
+-- Per-session totals behind SupabaseStore.cache_usage(), the
+-- starting point of every answer-cache retention sweep (works
+-- whether saved_at is text or timestamptz).
+create or replace function cache_usage()
+returns table (
+    session_id       text,
+    entries          bigint,
+    bytes            bigint,
+    oldest_saved_at  timestamptz,
+    missing_saved_at bigint
+)
+language sql stable
+as $$
+    select session_id,
+           count(*),
+           sum(octet_length(coalesce(query, ''))
+               + octet_length(coalesce(answer, ''))
+               + octet_length(coalesce(sources::text, ''))),
+           min(saved_at::timestamptz),
+           count(*) filter (where saved_at is null)
+    from cache
+    group by session_id
+$$;